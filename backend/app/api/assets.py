@@ -2,20 +2,21 @@
 Assets API endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List, Optional
 from uuid import UUID
-import aiofiles
-import os
+from datetime import datetime
 from pathlib import Path
 
 from app.core.database import get_db
 from app.core.security import get_current_user
 from app.core.config import settings
 from app.models.asset import Asset, AssetType
-from pydantic import BaseModel
+from app.services.storage.asset_store import asset_store, UploadTooLarge
+from app.services.storage.derivatives import derivative_pipeline
+from pydantic import AliasChoices, BaseModel, Field
 
 router = APIRouter()
 
@@ -32,10 +33,11 @@ class AssetResponse(BaseModel):
     thumbnail_url: Optional[str]
     size: int
     mime_type: str
-    metadata: dict
+    metadata: dict = Field(validation_alias=AliasChoices('meta', 'metadata'))
     tags: List[str]
+    content_hash: Optional[str] = None
     uploaded_by: UUID
-    uploaded_at: str
+    uploaded_at: datetime
 
     class Config:
         from_attributes = True
@@ -47,6 +49,7 @@ class AssetResponse(BaseModel):
 
 @router.post("/upload", response_model=AssetResponse, status_code=status.HTTP_201_CREATED)
 async def upload_asset(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     asset_type: AssetType = Query(AssetType.IMAGE),
     tags: List[str] = Query([]),
@@ -68,42 +71,29 @@ async def upload_asset(
             detail=f"Invalid file type for {asset_type}"
         )
 
-    # Read file
-    file_content = await file.read()
-    file_size = len(file_content)
-
-    # Check size limit
+    # Stream to disk, checking the size limit as chunks arrive
     max_size = settings.MAX_IMAGE_SIZE_MB * 1024 * 1024
-    if file_size > max_size:
+    try:
+        staged = await asset_store.stage(file, max_size)
+    except UploadTooLarge:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File too large. Max size: {settings.MAX_IMAGE_SIZE_MB}MB"
         )
 
-    # Save file
-    if settings.STORAGE_TYPE == 'local':
-        # Save to local storage
-        storage_path = Path(settings.LOCAL_STORAGE_PATH)
-        storage_path.mkdir(parents=True, exist_ok=True)
-
-        file_path = storage_path / f"{current_user['id']}_{file.filename}"
-
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(file_content)
-
-        file_url = f"/storage/{file_path.name}"
-
-    else:
-        # TODO: Upload to S3/MinIO
-        file_url = ""
+    # Identical content is stored once and shared between assets
+    blob = await asset_store.commit(db, staged, file.content_type)
+    content_hash = blob.content_hash
+    file_url = asset_store.blob_url(content_hash)
 
     # Create asset record
     asset = Asset(
         name=file.filename,
         type=asset_type,
         url=file_url,
-        size=file_size,
+        size=staged.size,
         mime_type=file.content_type,
+        content_hash=content_hash,
         tags=tags,
         uploaded_by=current_user["id"],
     )
@@ -112,6 +102,13 @@ async def upload_asset(
     await db.commit()
     await db.refresh(asset)
 
+    # Thumbnail and render-ready variants are generated after the response
+    if derivative_pipeline.wants(asset):
+        background_tasks.add_task(
+            derivative_pipeline.process,
+            asset.id, asset_store.blob_key(content_hash), content_hash,
+        )
+
     return asset
 
 
@@ -177,7 +174,11 @@ async def delete_asset(
         raise HTTPException(status_code=404, detail="Asset not found")
 
     # Delete file
-    if settings.STORAGE_TYPE == 'local':
+    orphaned = False
+    if asset.content_hash:
+        orphaned = await asset_store.release(db, asset.content_hash)
+    elif settings.STORAGE_TYPE == 'local':
+        # Uploaded before content-addressed storage
         file_path = Path(settings.LOCAL_STORAGE_PATH) / asset.url.split('/')[-1]
         if file_path.exists():
             file_path.unlink()
@@ -186,4 +187,8 @@ async def delete_asset(
     await db.delete(asset)
     await db.commit()
 
+    # The file goes only once no committed row references it
+    if orphaned:
+        await asset_store.delete_file(db, asset.content_hash)
+
     return None
@@ -5,22 +5,37 @@ Authentication API endpoints
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
+from typing import Optional
+from uuid import UUID
 
 from app.core.database import get_db
 from app.core.security import (
-    verify_password,
-    get_password_hash,
+    password_hasher,
+    PasswordHashingBusy,
     create_access_token,
     create_refresh_token,
-    get_current_user
+    decode_token,
+    get_current_user,
+    revoke_token,
+    security,
 )
 from app.models.user import User, UserRole
+from app.services.cache.principal_cache import principal_cache
 
 router = APIRouter()
 
 
+def _busy(e: PasswordHashingBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": "1"},
+    )
+
+
 # ============================================================================
 # SCHEMAS
 # ============================================================================
@@ -36,6 +51,14 @@ class LoginRequest(BaseModel):
     password: str
 
 
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+
+class RoleUpdateRequest(BaseModel):
+    role: UserRole
+
+
 class TokenResponse(BaseModel):
     access_token: str
     refresh_token: str
@@ -43,12 +66,12 @@ class TokenResponse(BaseModel):
 
 
 class UserResponse(BaseModel):
-    id: str
+    id: UUID
     name: str
     email: str
     role: UserRole
     avatar: str | None = None
-    created_at: str
+    created_at: datetime
 
     class Config:
         from_attributes = True
@@ -77,11 +100,16 @@ async def register(
             detail="Email already registered"
         )
 
+    try:
+        hashed_password = await password_hasher.hash(data.password)
+    except PasswordHashingBusy as e:
+        raise _busy(e)
+
     # Create user
     user = User(
         name=data.name,
         email=data.email,
-        hashed_password=get_password_hash(data.password),
+        hashed_password=hashed_password,
         role=UserRole.EDITOR,
     )
 
@@ -113,12 +141,23 @@ async def login(
     )
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(data.password, user.hashed_password):
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await password_hasher.verify_and_update(data.password, user.hashed_password)
+        except PasswordHashingBusy as e:
+            raise _busy(e)
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
 
+    # Upgrade hashes made with a previous cost
+    if new_hash:
+        user.hashed_password = new_hash
+
     # Update last login
     user.last_login_at = datetime.utcnow()
     await db.commit()
@@ -150,3 +189,49 @@ async def get_current_user_info(
         raise HTTPException(status_code=404, detail="User not found")
 
     return user
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    data: Optional[LogoutRequest] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: dict = Depends(get_current_user)
+):
+    """Revoke the access token, and the refresh token when given"""
+
+    await revoke_token(credentials.credentials)
+
+    if data and data.refresh_token:
+        if decode_token(data.refresh_token).get("sub") != current_user["id"]:
+            raise HTTPException(status_code=400, detail="Refresh token belongs to another user")
+        await revoke_token(data.refresh_token)
+
+
+@router.patch("/users/{user_id}/role", response_model=UserResponse)
+async def update_user_role(
+    user_id: UUID,
+    data: RoleUpdateRequest,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Change a user's role (admins only); takes effect on the next request"""
+
+    if current_user["role"] != UserRole.ADMIN.value:
+        raise HTTPException(status_code=403, detail="Admin role required")
+
+    result = await db.execute(
+        select(User).where(User.id == user_id)
+    )
+    user = result.scalar_one_or_none()
+
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user.role = data.role
+    await db.commit()
+    await db.refresh(user)
+
+    # Cached principals still carry the old role
+    await principal_cache.invalidate_user(user.id)
+
+    return user
@@ -2,15 +2,26 @@
 Render API endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
 from uuid import UUID
+import base64
+import json
 
+from app.core.config import settings
+from app.core.database import get_db
 from app.core.security import get_current_user
+from app.core.etag import make_etag, etag_matches
+from app.services.cache.render_cache import render_cache, render_key
 from app.services.rendering.pdf_renderer import PDFRenderer
+from app.services.rendering.compiled_templates import compiled_templates
+from app.services.rendering.render_stats import render_stats
 from app.services.rendering.email_renderer import EmailRenderer
+from app.services.rendering.profiler import RenderProfile, output_options, profile_requested
 
 router = APIRouter()
 
@@ -25,9 +36,90 @@ class RenderPDFRequest(BaseModel):
     options: Dict[str, Any] = {}
 
 
+class RenderDataRequest(BaseModel):
+    data: Dict[str, Any] = {}
+    options: Dict[str, Any] = {}
+
+
 class RenderEmailRequest(BaseModel):
     template_data: Dict[str, Any]
     data: Dict[str, Any] = {}
+    options: Dict[str, Any] = {}
+
+
+# ============================================================================
+# RESULT CACHE
+# ============================================================================
+
+def _result_key(kind: str, template: Any, data: Dict[str, Any], options: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Result cache key of a render, None when its result is not cached"""
+    if not render_cache.enabled:
+        return None
+    if kind == "pdf" and not options.get('deterministic', settings.PDF_DETERMINISTIC):
+        # Timestamps and document ID change on every render
+        return None
+    return render_key(kind, template, data, output_options(options) if options is not None else None)
+
+
+def _cache_headers(key: Optional[str]) -> Dict[str, str]:
+    """ETag headers for a cached render"""
+    if key is None:
+        return {}
+    return {"ETag": make_etag(key), "Cache-Control": "private, no-cache"}
+
+
+async def _cached_response(
+    key: Optional[str],
+    if_none_match: Optional[str],
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[Response]:
+    """304 or cached result for a render key, before any parsing or rendering"""
+    if key is None:
+        return None
+
+    headers = {**(headers or {}), **_cache_headers(key)}
+
+    # File access runs in the thread pool, off the event loop
+    if etag_matches(if_none_match, headers["ETag"]):
+        if await run_in_threadpool(render_cache.touch, key):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return None
+
+    cached = await run_in_threadpool(render_cache.get, key)
+    if cached is None:
+        return None
+    return Response(content=cached, media_type=media_type, headers=headers)
+
+
+async def _store_result(key: Optional[str], value: bytes):
+    if key is not None:
+        await run_in_threadpool(render_cache.set, key, value)
+
+
+# ============================================================================
+# PROFILING
+# ============================================================================
+
+def _profile(options: Dict[str, Any]) -> Optional[RenderProfile]:
+    """Profile for a render that asks for one with options.profile"""
+    if not profile_requested(options):
+        return None
+    try:
+        return RenderProfile(options.get('profile_top', 10))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="profile_top must be an integer")
+
+
+def _profiled_pdf_response(pdf_bytes: bytes, report: Dict[str, Any], headers: Dict[str, str]) -> Response:
+    """Profiled renders return the PDF base64-encoded next to its profile"""
+    body = json.dumps({
+        "success": True,
+        "pdf": base64.b64encode(pdf_bytes).decode('ascii'),
+        "profile": report,
+    }).encode('utf-8')
+    headers = {k: v for k, v in headers.items() if k != "Content-Disposition"}
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 # ============================================================================
@@ -37,25 +129,50 @@ class RenderEmailRequest(BaseModel):
 @router.post("/pdf")
 async def render_pdf(
     request: RenderPDFRequest,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
-    """Render template to PDF"""
+    """
+    Render template to PDF
+
+    With options.profile the cache is bypassed and the response is JSON
+    with the PDF and a time and size breakdown per page and element.
+    """
+    key = _result_key("pdf", request.template_xml, request.data, request.options)
+    headers = {"Content-Disposition": "attachment; filename=template.pdf"}
+    profile = _profile(request.options)
+
+    if profile is None:
+        cached = await _cached_response(key, if_none_match, "application/pdf", headers)
+        if cached is not None:
+            return cached
+
     try:
         renderer = PDFRenderer()
-        pdf_bytes = renderer.render(
+        if profile is not None:
+            profile.attach_pdf(renderer)
+        # Images may be fetched from object storage while drawing
+        pdf_bytes = await run_in_threadpool(
+            renderer.render,
             request.template_xml,
             request.data,
             request.options
         )
 
+        await _store_result(key, pdf_bytes)
+
+        if profile is not None:
+            return _profiled_pdf_response(pdf_bytes, profile.report(**renderer.stats), headers)
+
         return Response(
             content=pdf_bytes,
             media_type="application/pdf",
-            headers={
-                "Content-Disposition": "attachment; filename=template.pdf"
-            }
+            headers={**headers, **_cache_headers(key)}
         )
 
+    except ValueError as e:
+        # Invalid render options
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -63,24 +180,149 @@ async def render_pdf(
         )
 
 
+@router.post("/pdf/{template_id}")
+async def render_stored_pdf(
+    template_id: UUID,
+    request: RenderDataRequest,
+    version: Optional[int] = Query(None, ge=1),
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Render a stored template to PDF
+
+    Only the data record travels with the request; the template is resolved
+    by id and version (current when omitted) from the compiled template cache.
+    """
+    try:
+        version, current_version = await compiled_templates.resolve(db, template_id, current_user["id"], version)
+    except LookupError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    key = _result_key("pdf", [str(template_id), version], request.data, request.options)
+    headers = {
+        "Content-Disposition": f"attachment; filename={template_id}.pdf",
+        "X-Template-Version": str(version),
+    }
+    profile = _profile(request.options)
+
+    if profile is None:
+        cached = await _cached_response(key, if_none_match, "application/pdf", headers)
+        if cached is not None:
+            return cached
+
+    try:
+        template = await compiled_templates.get(db, template_id, version, current_version)
+    except LookupError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    try:
+        renderer = PDFRenderer()
+        if profile is not None:
+            profile.attach_pdf(renderer)
+        pdf_bytes = await run_in_threadpool(
+            renderer.render_compiled,
+            template,
+            request.data,
+            request.options
+        )
+
+    except ValueError as e:
+        # Invalid render options
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error rendering PDF: {str(e)}"
+        )
+
+    await _store_result(key, pdf_bytes)
+    render_stats.record(template_id, renderer.stats)
+
+    if profile is not None:
+        return _profiled_pdf_response(pdf_bytes, profile.report(**renderer.stats), headers)
+
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={
+            **headers,
+            **_cache_headers(key),
+            "X-PDF-Bytes-Saved": str(renderer.stats['bytes_saved']),
+        }
+    )
+
+
+@router.get("/pdf/{template_id}/stats")
+async def get_render_stats(
+    template_id: UUID,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    PDF size statistics of a template, summed over its renders in this process
+
+    bytes_saved counts downsampled image bytes, image bytes reused
+    instead of embedded again, and page stream compression.
+    """
+    try:
+        await compiled_templates.resolve(db, template_id, current_user["id"])
+    except LookupError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return {"template_id": template_id, **render_stats.get(template_id)}
+
+
 @router.post("/email")
 async def render_email(
     request: RenderEmailRequest,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
-    """Render template to Email HTML"""
+    """
+    Render template to Email HTML
+
+    With options.profile the cache is bypassed and the response carries a
+    'profile' with the time per stage and per element.
+    """
+    key = _result_key("email", request.template_data, request.data, None)
+    profile = _profile(request.options)
+
+    if profile is None:
+        cached = await _cached_response(key, if_none_match, "application/json")
+        if cached is not None:
+            return cached
+
     try:
         renderer = EmailRenderer()
+        if profile is not None:
+            profile.attach_email(renderer)
         result = renderer.render(
             request.template_data,
             request.data
         )
 
-        return {
+        payload = {
             "success": True,
             "html": result['html'],
             "text": result['text']
         }
+        body = json.dumps(payload).encode('utf-8')
+
+        await _store_result(key, body)
+
+        if profile is not None:
+            payload["profile"] = profile.report(html_bytes=len(result['html'].encode('utf-8')))
+            return Response(content=json.dumps(payload).encode('utf-8'), media_type="application/json")
+
+        return Response(content=body, media_type="application/json", headers=_cache_headers(key))
 
     except Exception as e:
         raise HTTPException(
@@ -92,29 +334,43 @@ async def render_email(
 @router.post("/preview")
 async def generate_preview(
     request: RenderPDFRequest,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
     """Generate preview image of template"""
-    try:
-        # Use PDF renderer with lower DPI for preview
-        options = request.options.copy()
-        options['dpi'] = 150  # Lower DPI for faster preview
+    # Use PDF renderer with lower DPI for preview
+    options = request.options.copy()
+    options['dpi'] = 150  # Lower DPI for faster preview
+
+    key = _result_key("pdf", request.template_xml, request.data, options)
 
+    cached = await _cached_response(key, if_none_match, "application/pdf")
+    if cached is not None:
+        return cached
+
+    try:
         renderer = PDFRenderer()
-        pdf_bytes = renderer.render(
+        pdf_bytes = await run_in_threadpool(
+            renderer.render,
             request.template_xml,
             request.data,
             options
         )
 
+        await _store_result(key, pdf_bytes)
+
         # TODO: Convert PDF to PNG for preview
         # For now, return PDF
 
         return Response(
             content=pdf_bytes,
-            media_type="application/pdf"
+            media_type="application/pdf",
+            headers=_cache_headers(key)
         )
 
+    except ValueError as e:
+        # Invalid render options
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
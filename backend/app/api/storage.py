@@ -0,0 +1,91 @@
+"""
+Storage serving endpoints
+"""
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+import mimetypes
+import os
+import re
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.database import get_db
+from app.core.etag import make_etag
+from app.services.storage.asset_store import asset_store
+from app.services.storage.backends import storage_backend
+from app.services.storage.file_server import (
+    StoredFileResponse,
+    ACTIVE_MEDIA_TYPES,
+    IMMUTABLE_CACHE_CONTROL,
+    MUTABLE_CACHE_CONTROL,
+    SANDBOX_CSP,
+)
+
+router = APIRouter()
+
+# ab/cd/<sha256>
+BLOB_PATH = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/(?P<hash>[0-9a-f]{64})$')
+
+# derived/ab/cd/<sha256>/<variant file>
+DERIVED_PATH = re.compile(r'^derived/[0-9a-f]{2}/[0-9a-f]{2}/(?P<hash>[0-9a-f]{64})/(?P<name>[a-z]+-\d+x\d+)\.(?:jpg|png)$')
+
+
+# ============================================================================
+# ENDPOINTS
+# ============================================================================
+
+@router.api_route("/{file_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_file(
+    file_path: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Serve a stored file
+
+    Content-addressed blobs and their variants get strong ETags from the
+    content hash and are cacheable forever; files stored before
+    content-addressing are revalidated. Files are served from the API
+    origin without authentication, so SVG and other active content is
+    sandboxed.
+    """
+    if file_path.startswith('tmp/'):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    try:
+        # Remote backends fetch into their local cache on first access
+        path = await run_in_threadpool(storage_backend.local_path, file_path)
+        stat_result = await run_in_threadpool(os.stat, path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    blob = BLOB_PATH.match(file_path)
+    derived = DERIVED_PATH.match(file_path)
+
+    if blob:
+        media_type = await asset_store.mime_type(db, blob['hash'])
+        etag = make_etag(blob['hash'])
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    elif derived:
+        media_type = None
+        etag = make_etag(derived['hash'], derived['name'])
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        media_type = None
+        etag = make_etag(int(stat_result.st_mtime), stat_result.st_size)
+        cache_control = MUTABLE_CACHE_CONTROL
+
+    media_type = media_type or mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+
+    headers = {'x-content-type-options': 'nosniff'}
+    if media_type.split(';', 1)[0].strip().lower() in ACTIVE_MEDIA_TYPES:
+        headers['content-security-policy'] = SANDBOX_CSP
+
+    return StoredFileResponse(
+        path,
+        stat_result,
+        media_type=media_type,
+        etag=etag,
+        cache_control=cache_control,
+        headers=headers,
+    )
@@ -2,16 +2,30 @@
 Templates API endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List, Optional
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.orm import load_only
+from typing import List, Optional, Tuple, Dict, Any
 from uuid import UUID
+from datetime import datetime
+import base64
+import jsonpatch
+import jsonpointer
 
 from app.core.database import get_db
 from app.core.security import get_current_user
+from app.core.etag import make_etag, etag_matches
+from app.services.cache.export_cache import export_cache
+from app.services.cache.template_cache import template_cache
+from app.services.search.template_search import TemplateSearch
+from app.services.rendering.compiled_templates import compiled_templates
+from app.services.rendering.render_stats import render_stats
+from app.services.versioning.version_store import VersionStore, field_attribute, snapshot_document
 from app.models.template import Template, TemplateType
-from pydantic import BaseModel
+from pydantic import AliasChoices, BaseModel, Field
 
 router = APIRouter()
 
@@ -43,6 +57,17 @@ class TemplateUpdate(BaseModel):
     tags: Optional[List[str]] = None
 
 
+class TemplatePatch(BaseModel):
+    version: int  # version the operations were computed against
+    operations: List[Dict[str, Any]]
+
+
+class TemplatePatchResponse(BaseModel):
+    id: UUID
+    version: int
+    updated_at: datetime
+
+
 class TemplateResponse(BaseModel):
     id: UUID
     name: str
@@ -52,18 +77,99 @@ class TemplateResponse(BaseModel):
     page_size: Optional[dict]
     variables: List[dict]
     styles: List[dict]
-    metadata: dict
+    metadata: dict = Field(validation_alias=AliasChoices('meta', 'metadata'))
     tags: List[str]
     owner_id: UUID
     thumbnail_url: Optional[str]
     version: int
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class TemplateSummary(BaseModel):
+    id: UUID
+    name: str
+    description: Optional[str]
+    type: TemplateType
+    tags: List[str]
+    thumbnail_url: Optional[str]
+    version: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class TemplateSearchResult(TemplateSummary):
+    rank: float
+
+
+class TemplateSummaryPage(BaseModel):
+    items: List[TemplateSummary]
+    next_cursor: Optional[str] = None
+
+
+class TemplateVersionResponse(BaseModel):
+    version: int
+    base_version: int
+    is_snapshot: bool
+    size: int
+    comment: Optional[str]
+    created_by: UUID
+    created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class TemplateVersionDocument(BaseModel):
+    version: int
+    document: Dict[str, Any]
+
+
+class TemplateVersionDiff(BaseModel):
+    from_version: int
+    to_version: int
+    operations: List[Dict[str, Any]]
+
+
+# Template fields that JSON Patch operations may address, e.g. /content/pages/0
+PATCHABLE_FIELDS = ('name', 'description', 'content', 'page_size', 'variables', 'styles', 'metadata', 'tags')
+
+# Columns loaded for summaries; content and other JSON blobs stay deferred
+SUMMARY_COLUMNS = (
+    Template.id,
+    Template.name,
+    Template.description,
+    Template.type,
+    Template.tags,
+    Template.thumbnail_url,
+    Template.version,
+    Template.created_at,
+    Template.updated_at,
+)
+
+
+def _encode_cursor(template: Template) -> str:
+    """Encode the (updated_at, id) keyset position of a template"""
+    raw = f"{template.updated_at.isoformat()}|{template.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decode a cursor produced by _encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, template_id = raw.split('|')
+        return datetime.fromisoformat(updated_at), UUID(template_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 # ============================================================================
 # ENDPOINTS
 # ============================================================================
@@ -83,7 +189,7 @@ async def create_template(
         page_size=template_data.page_size,
         variables=template_data.variables,
         styles=template_data.styles,
-        metadata=template_data.metadata,
+        meta=template_data.metadata,
         tags=template_data.tags,
         owner_id=current_user["id"],
     )
@@ -105,14 +211,22 @@ async def list_templates(
     db: AsyncSession = Depends(get_db)
 ):
     """List templates"""
+    if search:
+        # Ranked, index-backed search instead of an unindexable ILIKE
+        results = await TemplateSearch(db).search(
+            current_user["id"],
+            query=search,
+            type=type,
+            limit=limit,
+            offset=skip,
+        )
+        return [template for template, _ in results]
+
     query = select(Template).where(Template.owner_id == current_user["id"])
 
     if type:
         query = query.where(Template.type == type)
 
-    if search:
-        query = query.where(Template.name.ilike(f"%{search}%"))
-
     query = query.offset(skip).limit(limit).order_by(Template.updated_at.desc())
 
     result = await db.execute(query)
@@ -121,6 +235,80 @@ async def list_templates(
     return templates
 
 
+@router.get("/search", response_model=List[TemplateSearchResult])
+async def search_templates(
+    q: Optional[str] = None,
+    tags: List[str] = Query([]),
+    type: Optional[TemplateType] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Search templates by name, description, tags and variable names
+
+    Results are ranked best match first; every tag in tags must be present.
+    """
+    results = await TemplateSearch(db).search(
+        current_user["id"],
+        query=q,
+        tags=tags,
+        type=type,
+        limit=limit,
+        offset=skip,
+        columns=SUMMARY_COLUMNS,
+    )
+
+    return [
+        TemplateSearchResult(**TemplateSummary.model_validate(template).model_dump(), rank=rank)
+        for template, rank in results
+    ]
+
+
+@router.get("/summary", response_model=TemplateSummaryPage)
+async def list_template_summaries(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    type: Optional[TemplateType] = None,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    List template summaries (no content) with keyset pagination
+
+    Pages are ordered by (updated_at, id) descending; pass next_cursor from
+    the previous page to continue, so deep pages cost the same as the first.
+    """
+    query = (
+        select(Template)
+        .options(load_only(*SUMMARY_COLUMNS))
+        .where(Template.owner_id == current_user["id"])
+    )
+
+    if type:
+        query = query.where(Template.type == type)
+
+    if cursor:
+        updated_at, last_id = _decode_cursor(cursor)
+        query = query.where(
+            tuple_(Template.updated_at, Template.id) < tuple_(updated_at, last_id)
+        )
+
+    # Fetch one extra row to know whether another page exists
+    query = query.order_by(Template.updated_at.desc(), Template.id.desc()).limit(limit + 1)
+
+    result = await db.execute(query)
+    templates = result.scalars().all()
+
+    next_cursor = None
+    if len(templates) > limit:
+        templates = templates[:limit]
+        next_cursor = _encode_cursor(templates[-1])
+
+    return {"items": templates, "next_cursor": next_cursor}
+
+
 @router.get("/{template_id}", response_model=TemplateResponse)
 async def get_template(
     template_id: UUID,
@@ -128,15 +316,18 @@ async def get_template(
     db: AsyncSession = Depends(get_db)
 ):
     """Get template by ID"""
-    result = await db.execute(
-        select(Template).where(
-            Template.id == template_id,
-            Template.owner_id == current_user["id"]
-        )
-    )
-    template = result.scalar_one_or_none()
+    async def load():
+        result = await db.execute(select(Template).where(Template.id == template_id))
+        return result.scalar_one_or_none()
 
-    if not template:
+    # Rows are cached per template, so ownership is checked on the cached copy
+    template = await template_cache.get_row_or_load(template_id, load)
+
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    owner_id = template["owner_id"] if isinstance(template, dict) else template.owner_id
+    if str(owner_id) != str(current_user["id"]):
         raise HTTPException(status_code=404, detail="Template not found")
 
     return template
@@ -151,27 +342,112 @@ async def update_template(
 ):
     """Update template"""
     result = await db.execute(
-        select(Template).where(
+        select(Template)
+        .where(
             Template.id == template_id,
             Template.owner_id == current_user["id"]
         )
+        .with_for_update()
     )
     template = result.scalar_one_or_none()
 
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
 
+    previous = snapshot_document(template)
+
     # Update fields
     update_data = template_data.model_dump(exclude_unset=True)
     for field, value in update_data.items():
-        setattr(template, field, value)
+        setattr(template, field_attribute(field), value)
 
     # Increment version
     template.version += 1
 
+    await VersionStore(db).record(template, previous, current_user["id"])
     await db.commit()
     await db.refresh(template)
 
+    export_cache.invalidate(template.id)
+    await template_cache.invalidate(template.id, template.version)
+
+    return template
+
+
+@router.patch("/{template_id}", response_model=TemplatePatchResponse)
+async def patch_template(
+    template_id: UUID,
+    patch: TemplatePatch,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Apply RFC 6902 JSON Patch operations to a template
+
+    Paths address template fields, e.g. /content/pages/0/elements/3/position.
+    The request fails with 409 if the template is no longer at the given
+    version or a test operation fails. Only the version is returned, so
+    autosave traffic scales with the size of the edit.
+    """
+    fields = set()
+    for operation in patch.operations:
+        for key in ('path', 'from'):
+            if key in operation:
+                field = str(operation[key]).lstrip('/').split('/', 1)[0]
+                if field not in PATCHABLE_FIELDS:
+                    raise HTTPException(
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        detail=f"Cannot patch path {operation[key]}"
+                    )
+                fields.add(field)
+
+    result = await db.execute(
+        select(Template)
+        .where(
+            Template.id == template_id,
+            Template.owner_id == current_user["id"]
+        )
+        .with_for_update()
+    )
+    template = result.scalar_one_or_none()
+
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    if template.version != patch.version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Template is at version {template.version}, patch is for version {patch.version}"
+        )
+
+    previous = snapshot_document(template)
+
+    # Only the addressed fields are copied and patched
+    document = {field: getattr(template, field_attribute(field)) for field in fields}
+    try:
+        patched = jsonpatch.apply_patch(document, patch.operations)
+    except jsonpatch.JsonPatchTestFailed as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except (jsonpatch.JsonPatchException, jsonpointer.JsonPointerException) as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    for field in fields:
+        if field not in patched:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Cannot remove field {field}"
+            )
+        setattr(template, field_attribute(field), patched[field])
+
+    template.version += 1
+
+    await VersionStore(db).record(template, previous, current_user["id"])
+    await db.commit()
+    await db.refresh(template)
+
+    export_cache.invalidate(template.id)
+    await template_cache.invalidate(template.id, template.version)
+
     return template
 
 
@@ -196,9 +472,123 @@ async def delete_template(
     await db.delete(template)
     await db.commit()
 
+    export_cache.invalidate(template_id)
+    await template_cache.invalidate(template_id, compiled=True)
+    compiled_templates.invalidate(template_id)
+    render_stats.invalidate(template_id)
+
     return None
 
 
+# ============================================================================
+# VERSION HISTORY
+# ============================================================================
+
+async def _check_template_access(template_id: UUID, current_user: dict, db: AsyncSession) -> None:
+    """Raise 404 unless the template exists and belongs to the user"""
+    result = await db.execute(
+        select(Template.id).where(
+            Template.id == template_id,
+            Template.owner_id == current_user["id"]
+        )
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+
+@router.get("/{template_id}/versions", response_model=List[TemplateVersionResponse])
+async def list_template_versions(
+    template_id: UUID,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """List stored versions of a template, newest first"""
+    await _check_template_access(template_id, current_user, db)
+    return await VersionStore(db).list_versions(template_id, limit=limit, offset=skip)
+
+
+@router.get("/{template_id}/versions/diff", response_model=TemplateVersionDiff)
+async def diff_template_versions(
+    template_id: UUID,
+    from_version: int = Query(..., ge=1),
+    to_version: int = Query(..., ge=1),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """JSON Patch operations that turn from_version into to_version"""
+    await _check_template_access(template_id, current_user, db)
+
+    try:
+        operations = await VersionStore(db).diff(template_id, from_version, to_version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return TemplateVersionDiff(from_version=from_version, to_version=to_version, operations=operations)
+
+
+@router.get("/{template_id}/versions/{version}", response_model=TemplateVersionDocument)
+async def get_template_version(
+    template_id: UUID,
+    version: int,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the template fields as they were at a version"""
+    await _check_template_access(template_id, current_user, db)
+
+    try:
+        document = await VersionStore(db).materialize(template_id, version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return TemplateVersionDocument(version=version, document=document)
+
+
+@router.post("/{template_id}/versions/{version}/restore", response_model=TemplateResponse)
+async def restore_template_version(
+    template_id: UUID,
+    version: int,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Restore a version as a new version of the template"""
+    result = await db.execute(
+        select(Template)
+        .where(
+            Template.id == template_id,
+            Template.owner_id == current_user["id"]
+        )
+        .with_for_update()
+    )
+    template = result.scalar_one_or_none()
+
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    store = VersionStore(db)
+    try:
+        document = await store.materialize(template_id, version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    previous = snapshot_document(template)
+    for field, value in document.items():
+        setattr(template, field_attribute(field), value)
+
+    template.version += 1
+
+    await store.record(template, previous, current_user["id"], comment=f"Restored version {version}")
+    await db.commit()
+    await db.refresh(template)
+
+    export_cache.invalidate(template.id)
+    await template_cache.invalidate(template.id, template.version)
+
+    return template
+
+
 @router.post("/{template_id}/duplicate", response_model=TemplateResponse)
 async def duplicate_template(
     template_id: UUID,
@@ -226,7 +616,7 @@ async def duplicate_template(
         page_size=template.page_size,
         variables=template.variables,
         styles=template.styles,
-        metadata=template.metadata,
+        meta=template.meta,
         tags=template.tags,
         owner_id=current_user["id"],
     )
@@ -235,6 +625,9 @@ async def duplicate_template(
     await db.commit()
     await db.refresh(new_template)
 
+    # The copy is usually opened in the editor right away
+    await template_cache.set_row(new_template)
+
     return new_template
 
 
@@ -242,29 +635,82 @@ async def duplicate_template(
 async def export_template(
     template_id: UUID,
     format: str = Query("xml", regex="^(xml|json)$"),
+    pretty: bool = Query(True),
+    stream: bool = Query(False),
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Export template as XML or JSON"""
+    """
+    Export template as XML or JSON
+
+    With stream=true the XML document itself is streamed as an attachment
+    instead of being wrapped in a JSON envelope. Responses carry an ETag
+    derived from the template version; a matching If-None-Match returns 304
+    without loading the content, and envelopes are cached per version.
+    """
     result = await db.execute(
-        select(Template).where(
+        select(Template.version).where(
             Template.id == template_id,
             Template.owner_id == current_user["id"]
         )
     )
-    template = result.scalar_one_or_none()
+    version = result.scalar_one_or_none()
 
-    if not template:
+    if version is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    variant = ("stream" if stream else "envelope", "pretty" if pretty else "compact")
+    etag = make_etag(template_id, version, format, *variant)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    cache_key = (template_id, version, format, *variant)
+    cached = export_cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json", headers=headers)
+
+    result = await db.execute(
+        select(Template.content, Template.version).where(
+            Template.id == template_id,
+            Template.owner_id == current_user["id"]
+        )
+    )
+    row = result.one_or_none()
+
+    if row is None:
         raise HTTPException(status_code=404, detail="Template not found")
 
+    content, version = row
+    if version != cache_key[1]:
+        # Updated between the two queries: describe what is actually returned
+        etag = make_etag(template_id, version, format, *variant)
+        headers["ETag"] = etag
+        cache_key = (template_id, version, format, *variant)
+
     if format == "xml":
-        # TODO: Convert to XML
         from app.services.xml.xml_generator import XMLGenerator
         generator = XMLGenerator()
-        xml_string = generator.generate(template.content)
-        return {"format": "xml", "data": xml_string}
+
+        if stream:
+            return StreamingResponse(
+                generator.iter_chunks(content, pretty_print=pretty),
+                media_type="application/xml",
+                headers={
+                    **headers,
+                    "Content-Disposition": f"attachment; filename={template_id}.xml"
+                }
+            )
+
+        xml_string = generator.generate(content, pretty_print=pretty)
+        response = JSONResponse({"format": "xml", "data": xml_string}, headers=headers)
     else:
-        return {"format": "json", "data": template.content}
+        response = JSONResponse({"format": "json", "data": content}, headers=headers)
+
+    export_cache.set(cache_key, response.body)
+    return response
 
 
 @router.post("/import")
@@ -296,3 +742,34 @@ async def import_template(
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid XML: {str(e)}")
+
+
+@router.post("/import/file")
+async def import_template_file(
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Import template from an uploaded XML file using the streaming parser"""
+    from app.services.xml.xml_parser import XMLParser
+
+    parser = XMLParser()
+    try:
+        # The upload is spooled to disk, so parse it incrementally off the event loop
+        parsed = await run_in_threadpool(parser.parse_stream, file.file)
+
+        template = Template(
+            name=parsed.get('layout_name', 'Imported Template'),
+            type=TemplateType.PDF,  # Default to PDF
+            content=parsed,
+            owner_id=current_user["id"],
+        )
+
+        db.add(template)
+        await db.commit()
+        await db.refresh(template)
+
+        return template
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid XML: {str(e)}")
@@ -27,12 +27,34 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_MAX_CONNECTIONS: int = 10
+    REDIS_SOCKET_TIMEOUT: float = 1.0
+
+    # Cache
+    EXPORT_CACHE_MAX_MB: int = 64
+    TEMPLATE_CACHE_TTL: int = 300  # Seconds
+    COMPILED_TEMPLATE_CACHE_SIZE: int = 128  # Templates per process
+    RENDER_CACHE_ENABLED: bool = False
+    RENDER_CACHE_DIR: str = "./cache/renders"
+    RENDER_CACHE_MAX_MB: int = 512
+
+    # Content storage
+    CONTENT_COMPRESSION: str = "none"  # none, zlib, zstd
+    CONTENT_COMPRESSION_LEVEL: Optional[int] = None
+    CONTENT_DICTIONARIES: str = ""  # Comma-separated; the first one is used for writing
+
+    # Versioning
+    VERSION_SNAPSHOT_INTERVAL: int = 20  # Full snapshot every N versions
 
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    PASSWORD_BCRYPT_ROUNDS: int = 12  # bcrypt cost; existing hashes are upgraded on login
+    PASSWORD_HASH_WORKERS: int = 2  # Threads hashing passwords concurrently
+    PASSWORD_HASH_QUEUE: int = 32  # Hashes waiting for a thread before logins get 503
+    AUTH_CACHE_TTL: int = 60  # Seconds a verified token's user is reused without a lookup
+    AUTH_CACHE_MAX_ENTRIES: int = 10000  # Tokens cached per process
 
     # CORS
     CORS_ORIGINS: str = "http://localhost:3000"
@@ -47,7 +69,16 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
     AWS_REGION: str = "us-east-1"
     AWS_ENDPOINT_URL: Optional[str] = None
-    LOCAL_STORAGE_PATH: str = "./storage"
+    LOCAL_STORAGE_PATH: str = "./storage"  # Local files, or upload scratch space for s3/minio
+    STORAGE_CACHE_DIR: str = "./storage-cache"  # Read-through cache of s3/minio objects
+    STORAGE_CACHE_MAX_MB: int = 1024
+    STORAGE_MULTIPART_THRESHOLD_MB: int = 8  # Uploads above this size use multipart
+    STORAGE_MULTIPART_CHUNK_MB: int = 8
+    STORAGE_MAX_CONCURRENCY: int = 8  # Parallel part transfers per file
+    STORAGE_EMPTY_LISTING_TTL: int = 300  # Seconds an empty s3/minio listing (no image variants yet) is reused
+    THUMBNAIL_SIZE: int = 256  # Longest edge of asset thumbnails, in pixels
+    DERIVATIVE_PRINT_INCHES: float = 11.7  # Longest printed edge preview/export variants cover (A4)
+    DERIVATIVE_WORKERS: int = 2  # Processes generating asset variants
 
     # Celery
     CELERY_BROKER_URL: str = "redis://localhost:6379/1"
@@ -59,6 +90,10 @@ class Settings(BaseSettings):
     RENDER_TIMEOUT: int = 60
     PREVIEW_DPI: int = 150
     EXPORT_DPI: int = 300
+    PDF_DETERMINISTIC: bool = True  # Fixed timestamps and document ID
+    PDF_COMPRESSION_LEVEL: int = 6  # zlib level for page streams, 0 disables
+    PDF_RECOMPRESS_IMAGES: bool = True  # Downsample images to the render DPI
+    PDF_IMAGE_QUALITY: int = 85  # JPEG quality for recompressed images
 
     # Limits
     MAX_ELEMENTS_PER_TEMPLATE: int = 1000
@@ -68,11 +103,22 @@ class Settings(BaseSettings):
     # WebSocket
     WEBSOCKET_PING_INTERVAL: int = 25
     WEBSOCKET_PING_TIMEOUT: int = 10
+    WEBSOCKET_TICK_MS: int = 50  # Interval of batched cursor/change broadcasts per room
+    WEBSOCKET_MESSAGE_QUEUE: bool = True  # Fan out room events through Redis (required with WORKERS > 1)
+    WEBSOCKET_PRESENCE_TTL: int = 30  # Seconds before a dead worker's editors leave presence
+    WEBSOCKET_MSGPACK: bool = True  # Offer the binary wire format to connections that request it
+    WEBSOCKET_CURSOR_PRECISION: float = 0.1  # Cursor quantum of the binary format, in template units
+    COLLAB_FLUSH_INTERVAL: int = 10  # Seconds between saves of collaboratively edited templates
+    COLLAB_STATE_TTL: int = 86400  # Seconds an idle room's operation log is kept in Redis
 
     # Logging
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "json"
 
+    # Metrics
+    METRICS_ENABLED: bool = True  # Serve /metrics in the Prometheus text format
+    PROMETHEUS_MULTIPROC_DIR: Optional[str] = None  # Shared by all workers; emptied on start
+
     class Config:
         env_file = ".env"
         case_sensitive = True
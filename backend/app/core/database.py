@@ -7,6 +7,13 @@ from sqlalchemy.orm import declarative_base
 from typing import AsyncGenerator
 
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+
+# Pool sizing; SQLite (local testing) runs without a sized pool
+pool_options = {} if settings.DATABASE_URL.startswith('sqlite') else {
+    'pool_size': 10,
+    'max_overflow': 20,
+}
 
 # Create async engine
 engine = create_async_engine(
@@ -14,9 +21,9 @@ engine = create_async_engine(
     echo=settings.DATABASE_ECHO,
     future=True,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
+    **pool_options,
 )
+instrument_engine(engine)
 
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
@@ -0,0 +1,22 @@
+"""
+HTTP entity tag helpers for conditional requests
+"""
+
+from typing import Any, Optional
+
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from the values that identify a representation"""
+    return '"' + '-'.join(str(part) for part in parts) + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == '*':
+        return True
+
+    candidates = (tag.strip() for tag in if_none_match.split(','))
+    return any(tag.removeprefix('W/') == etag.removeprefix('W/') for tag in candidates)
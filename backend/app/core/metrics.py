@@ -0,0 +1,160 @@
+"""
+Prometheus metrics for render, parse, database and cache hot paths
+"""
+
+import os
+import shutil
+import time
+import logging
+
+from app.core.config import settings
+
+# prometheus_client picks its value storage on import: the directory must
+# be in the environment before the first import anywhere in the process
+if settings.PROMETHEUS_MULTIPROC_DIR:
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', settings.PROMETHEUS_MULTIPROC_DIR)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+logger = logging.getLogger(__name__)
+
+# Buckets for in-process work, from sub-millisecond elements to long renders
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+RENDER_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Statement keywords kept as the operation label; anything else is 'other'
+QUERY_OPERATIONS = ('select', 'insert', 'update', 'delete')
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+XML_PARSE_SECONDS = Histogram(
+    'xml_parse_seconds', 'XMLParser parse time', ['method'], buckets=RENDER_BUCKETS,
+)
+
+PDF_RENDER_SECONDS = Histogram(
+    'pdf_render_seconds', 'PDFRenderer time per document', buckets=RENDER_BUCKETS,
+)
+PDF_PAGE_SECONDS = Histogram(
+    'pdf_render_page_seconds', 'PDFRenderer time per page', buckets=RENDER_BUCKETS,
+)
+PDF_ELEMENT_SECONDS = Histogram(
+    'pdf_render_element_seconds', 'PDFRenderer time per element', ['type'], buckets=FAST_BUCKETS,
+)
+PDF_ASSET_SECONDS = Histogram(
+    'pdf_render_asset_seconds', 'Barcode generation and image loading time', ['kind'], buckets=FAST_BUCKETS,
+)
+
+EMAIL_RENDER_SECONDS = Histogram(
+    'email_render_seconds', 'EmailRenderer time, in total and inlining CSS', ['stage'], buckets=RENDER_BUCKETS,
+)
+
+DB_QUERY_SECONDS = Histogram(
+    'db_query_seconds', 'Database statement latency', ['operation'], buckets=FAST_BUCKETS,
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections', 'Database connections checked out of the pool',
+    multiprocess_mode='livesum',
+)
+DB_POOL_SIZE = Gauge(
+    'db_pool_size', 'Database connections the pools may open',
+    multiprocess_mode='livesum',
+)
+PASSWORD_HASH_PENDING = Gauge(
+    'password_hash_pending', 'Password hashes running or waiting for a thread',
+    multiprocess_mode='livesum',
+)
+
+CACHE_LOOKUPS = Counter(
+    'cache_lookups_total', 'Cache lookups by cache and result (hit or miss)', ['cache', 'result'],
+)
+
+
+def cache_lookup(cache: str, hit: bool):
+    """Count a cache lookup; the hit rate is rate(hit) / rate(all)"""
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+# ============================================================================
+# DATABASE
+# ============================================================================
+
+def instrument_engine(engine):
+    """Time statements and track pool usage of an async engine"""
+    from sqlalchemy import event
+
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_start'].pop()
+        operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ''
+        DB_QUERY_SECONDS.labels(operation if operation in QUERY_OPERATIONS else 'other').observe(
+            time.perf_counter() - started
+        )
+
+    @event.listens_for(sync_engine, 'handle_error')
+    def _error(context):
+        starts = context.connection.info.get('query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    @event.listens_for(sync_engine.pool, 'checkout')
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CONNECTIONS.inc()
+
+    @event.listens_for(sync_engine.pool, 'checkin')
+    def _checkin(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS.dec()
+
+    pool = sync_engine.pool
+    if hasattr(pool, 'size') and hasattr(pool, '_max_overflow'):
+        DB_POOL_SIZE.set(pool.size() + max(pool._max_overflow, 0))
+
+
+# ============================================================================
+# EXPOSITION
+# ============================================================================
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def reset_multiprocess_dir():
+    """Empty the metrics directory; run once before the workers start"""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not directory:
+        return
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def mark_process_dead():
+    """Drop this worker's live gauges when it exits"""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_latest() -> bytes:
+    """Metrics in the Prometheus text format, aggregated over every worker"""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,61 @@
+"""
+ASGI middleware
+"""
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+# Media types that are already compressed; gzip only costs CPU on them
+COMPRESSED_TYPES = frozenset({
+    'image/jpeg',
+    'image/png',
+    'image/gif',
+    'image/webp',
+    'image/avif',
+    'font/woff',
+    'font/woff2',
+    'application/pdf',
+    'application/zip',
+    'application/gzip',
+    'application/zstd',
+})
+
+
+class _SelectiveGZipResponder(GZipResponder):
+    passthrough = False
+
+    async def send_with_gzip(self, message: Message):
+        message_type = message['type']
+        if message_type == 'http.response.start':
+            headers = Headers(raw=message['headers'])
+            media_type = headers.get('content-type', '').split(';')[0].strip().lower()
+            # Partial content must reach the client byte for byte
+            self.passthrough = media_type in COMPRESSED_TYPES or 'content-range' in headers
+            if self.passthrough:
+                await self.send(message)
+                return
+        elif message_type != 'http.response.body' and not self.passthrough:
+            # Zero-copy and pathsend bodies cannot be compressed
+            self.passthrough = True
+            await self.send(self.initial_message)
+
+        if self.passthrough:
+            await self.send(message)
+        else:
+            await super().send_with_gzip(message)
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves already-compressed and ranged responses alone"""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] == 'http':
+            headers = Headers(scope=scope)
+            if 'gzip' in headers.get('Accept-Encoding', ''):
+                responder = _SelectiveGZipResponder(
+                    self.app, self.minimum_size, compresslevel=self.compresslevel
+                )
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
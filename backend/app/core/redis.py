@@ -0,0 +1,57 @@
+"""
+Redis connection management
+"""
+
+from typing import Optional
+import logging
+
+from redis.asyncio import ConnectionPool, Redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ConnectionPool] = None
+_client: Optional[Redis] = None
+
+
+def get_redis() -> Redis:
+    """
+    Shared async Redis client
+
+    All callers share one connection pool bounded by REDIS_MAX_CONNECTIONS;
+    the pool is created lazily on first use.
+    """
+    global _pool, _client
+
+    if _client is None:
+        _pool = ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            health_check_interval=30,
+        )
+        _client = Redis(connection_pool=_pool)
+
+    return _client
+
+
+def set_redis(client: Optional[Redis]):
+    """Replace the shared client, e.g. with a fakeredis instance"""
+    global _pool, _client
+    _pool = None
+    _client = client
+
+
+async def close_redis():
+    """Close the shared client and its pool"""
+    global _pool, _client
+
+    if _client is not None:
+        await _client.aclose()
+    if _pool is not None:
+        await _pool.disconnect()
+
+    _pool = None
+    _client = None
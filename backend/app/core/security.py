@@ -2,17 +2,35 @@
 Security utilities for authentication and authorization
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+import asyncio
+import logging
+import uuid
+
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from sqlalchemy import select
+
 from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import PASSWORD_HASH_PENDING
+from app.models.user import User
+from app.services.cache.principal_cache import principal_cache
+
+logger = logging.getLogger(__name__)
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; hashes made with another cost are flagged for update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
 
 # HTTP Bearer for JWT
 security = HTTPBearer()
@@ -28,6 +46,85 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHashingBusy(RuntimeError):
+    """Raised when too many password hashes are already waiting"""
+
+
+class PasswordHasher:
+    """
+    Hasheo de contraseñas fuera del bucle de eventos
+
+    bcrypt takes hundreds of milliseconds of CPU per call; run inline in
+    an async handler it stalls every request and Socket.IO connection of
+    the worker. Hashes run in a small dedicated thread pool (bcrypt
+    releases the GIL) and the number waiting is bounded, so a burst of
+    logins is rejected early instead of queueing without limit.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        return self._pool
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.workers + self.queue_limit:
+            self.rejected += 1
+            raise PasswordHashingBusy("Too many authentication requests, retry shortly")
+
+        self._pending += 1
+        PASSWORD_HASH_PENDING.inc()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self._pending -= 1
+            PASSWORD_HASH_PENDING.dec()
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password
+
+        Raises:
+            PasswordHashingBusy: If the queue is full
+        """
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password, with a new hash when the stored one uses another cost
+
+        Raises:
+            PasswordHashingBusy: If the queue is full
+        """
+        valid, new_hash = await self._run(pwd_context.verify_and_update, password, hashed_password)
+        if new_hash is not None:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'pending': self._pending,
+            'rejected': self.rejected,
+            'rehashed': self.rehashed,
+        }
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -37,7 +134,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    to_encode.update({"exp": expire, "type": "access"})
+    to_encode.update({"exp": expire, "type": "access", "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
     return encoded_jwt
@@ -48,37 +145,83 @@ def create_refresh_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
 
-    to_encode.update({"exp": expire, "type": "refresh"})
+    to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
     return encoded_jwt
 
 
+def _credentials_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
 def decode_token(token: str) -> dict:
     """Decode and verify JWT token"""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         return payload
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
+        raise _credentials_error()
+
+
+async def revoke_token(token: str) -> dict:
+    """Revoke a token until it expires; returns its payload"""
+    payload = decode_token(token)
+    if payload.get("jti"):
+        await principal_cache.revoke(payload["jti"], payload["exp"])
+    return payload
+
+
+async def _load_principal(user_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        user_uuid = UUID(user_id)
+    except ValueError:
+        return None
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(User.id, User.email, User.name, User.role).where(User.id == user_uuid)
         )
+        row = result.one_or_none()
+
+    if row is None:
+        return None
+    return {"id": str(row.id), "email": row.email, "name": row.name, "role": row.role.value}
 
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get current authenticated user from JWT token"""
-    token = credentials.credentials
-    payload = decode_token(token)
+    """
+    Get current authenticated user from JWT token
+
+    Verified tokens are cached with the user they resolve to, so most
+    requests skip both the signature check and the database.
+    """
+    return await authenticate_token(credentials.credentials)
+
 
+async def authenticate_token(token: str) -> Dict[str, Any]:
+    """
+    User an access token belongs to
+
+    Raises:
+        HTTPException: 401 if the token is invalid, expired, revoked or not an access token
+    """
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = decode_token(token)
     user_id: str = payload.get("sub")
-    if user_id is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-        )
+    if user_id is None or payload.get("type") != "access" or principal_cache.is_revoked(payload.get("jti")):
+        raise _credentials_error()
+
+    principal = await _load_principal(user_id)
+    if principal is None:
+        raise _credentials_error()
 
-    # TODO: Get user from database
-    # For now, return user_id
-    return {"id": user_id, "email": payload.get("email")}
+    principal_cache.set(token, payload.get("jti"), principal, payload["exp"])
+    return principal
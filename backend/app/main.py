@@ -3,29 +3,49 @@ Universal Template Builder - Main Application
 FastAPI entry point
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
+from typing import Optional
 import socketio
 
 from app.core.config import settings
 from app.core.database import engine, Base
-from app.api import api_router
+from app.api import api_router, storage
 from app.core.logging import setup_logging
+from app.core.metrics import CONTENT_TYPE_LATEST, mark_process_dead, render_latest, reset_multiprocess_dir
+from app.core.middleware import SelectiveGZipMiddleware
+from app.core.redis import close_redis
+from app.core.security import authenticate_token, password_hasher
+from app.services.cache.export_cache import export_cache
+from app.services.cache.principal_cache import principal_cache
+from app.services.cache.render_cache import render_cache
+from app.services.cache.template_cache import template_cache
+from app.services.compression.migrate import check_columns
+from app.services.realtime.coalescer import RoomCoalescer
+from app.services.realtime.documents import collab_documents
+from app.services.realtime.presence import room_presence
+from app.services.realtime.wire import ENCODINGS, encoding_room, is_encoding_room, wire_codec
+from app.services.storage.backends import storage_backend
+from app.services.storage.derivatives import derivative_pipeline
 
 # Setup logging
 logger = setup_logging()
 
-# Socket.IO setup
+# Socket.IO setup; with a message queue, room events reach clients on every worker
+client_manager = socketio.AsyncRedisManager(settings.REDIS_URL) if settings.WEBSOCKET_MESSAGE_QUEUE else None
+
 sio = socketio.AsyncServer(
     async_mode='asgi',
+    client_manager=client_manager,
     cors_allowed_origins=settings.CORS_ORIGINS.split(','),
     ping_interval=settings.WEBSOCKET_PING_INTERVAL,
     ping_timeout=settings.WEBSOCKET_PING_TIMEOUT,
 )
 
+# Cursor moves and changes are batched per room and tick
+room_coalescer = RoomCoalescer(sio, settings.WEBSOCKET_TICK_MS / 1000, wire_codec)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -40,10 +60,26 @@ async def lifespan(app: FastAPI):
         if settings.DEBUG:
             await conn.run_sync(Base.metadata.create_all)
 
+    # Content columns must be binary exactly when compression is on
+    await check_columns(engine)
+
+    principal_cache.start()
+    room_coalescer.start()
+    room_presence.start()
+    collab_documents.start()
+
     yield
 
     # Shutdown
     logger.info("Shutting down Universal Template Builder API")
+    await collab_documents.stop()
+    await room_coalescer.stop()
+    await room_presence.stop()
+    await principal_cache.stop()
+    await close_redis()
+    derivative_pipeline.shutdown()
+    password_hasher.shutdown()
+    mark_process_dead()
 
 
 # Create FastAPI app
@@ -65,12 +101,15 @@ app.add_middleware(
     allow_headers=settings.CORS_HEADERS.split(','),
 )
 
-# GZip Middleware
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# GZip Middleware (skips already-compressed media and byte ranges)
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=1000)
 
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
 
+# Stored assets
+app.include_router(storage.router, prefix="/storage", tags=["storage"])
+
 # Socket.IO app
 socket_app = socketio.ASGIApp(
     sio,
@@ -84,49 +123,107 @@ socket_app = socketio.ASGIApp(
 # ============================================================================
 
 @sio.event
-async def connect(sid, environ):
-    """Handle client connection"""
-    logger.info(f"Client connected: {sid}")
+async def connect(sid, environ, auth=None):
+    """
+    Handle client connection, negotiating the wire format of batches
+
+    Clients authenticate with an access token in the connect payload
+    ({'token': ...}); the user it belongs to is kept in the session and
+    attributes every later event of the connection.
+    """
+    token = auth.get('token') if isinstance(auth, dict) else None
+    if not token:
+        raise socketio.exceptions.ConnectionRefusedError('Authentication required')
+    try:
+        user = await authenticate_token(token)
+    except HTTPException:
+        raise socketio.exceptions.ConnectionRefusedError('Invalid credentials')
+
+    encoding = wire_codec.negotiate(environ, auth)
+    await sio.save_session(sid, {'encoding': encoding, 'user': user})
+    logger.info(f"Client connected: {sid} ({encoding}, user {user['id']})")
 
 
 @sio.event
 async def disconnect(sid):
     """Handle client disconnection"""
+    rooms = [room for room in sio.rooms(sid) if room != sid and not is_encoding_room(room)]
+    for room in rooms:
+        await room_presence.leave(room, sid)
+    room_coalescer.remove(sid)
+
+    # Disconnect handlers run before the connection leaves its rooms
+    for room in rooms:
+        await _release_if_empty(room, leaving=sid)
     logger.info(f"Client disconnected: {sid}")
 
 
 @sio.event
 async def join_template(sid, data):
-    """Join template editing session"""
+    """Join template editing session; only the template's owner may join"""
+    try:
+        data = _event_data(data)
+    except ValueError as e:
+        return {'error': str(e)}
+
     template_id = data.get('templateId')
-    user_id = data.get('userId')
+    if not template_id:
+        return {'error': 'Missing templateId'}
+
+    session = await sio.get_session(sid)
+    user = session['user']
+    user_id = user['id']
 
-    if not template_id or not user_id:
-        return {'error': 'Missing templateId or userId'}
+    # Other users' templates are reported as missing, as in the REST API
+    if not await collab_documents.can_edit(template_id, user_id):
+        return {'error': 'Template not found'}
 
-    # Join room
+    try:
+        document = await collab_documents.join_state(template_id)
+    except LookupError:
+        return {'error': 'Template not found'}
+
+    # Join room, and the sub-room of the connection's wire format
+    encoding = session.get('encoding', 'json')
     await sio.enter_room(sid, template_id)
+    await sio.enter_room(sid, encoding_room(template_id, encoding))
+    await room_presence.join(template_id, sid, user_id, user['name'])
 
     # Notify others
     await sio.emit(
         'user_joined',
-        {'userId': user_id, 'username': data.get('username', 'Anonymous')},
+        {'userId': user_id, 'username': user['name']},
         room=template_id,
         skip_sid=sid
     )
 
     logger.info(f"User {user_id} joined template {template_id}")
-    return {'success': True}
+    return {
+        'success': True,
+        'users': await room_presence.members(template_id),
+        'document': document,
+        'wire': wire_codec.describe(encoding),
+    }
 
 
 @sio.event
 async def leave_template(sid, data):
     """Leave template editing session"""
+    try:
+        data = _event_data(data)
+    except ValueError as e:
+        return {'error': str(e)}
+
     template_id = data.get('templateId')
-    user_id = data.get('userId')
+    user_id = await _session_user_id(sid)
 
-    if template_id:
+    if template_id and template_id in sio.rooms(sid):
         await sio.leave_room(sid, template_id)
+        for encoding in ENCODINGS:
+            await sio.leave_room(sid, encoding_room(template_id, encoding))
+        await room_presence.leave(template_id, sid)
+        room_coalescer.remove(sid, template_id)
+        await _release_if_empty(template_id)
 
         # Notify others
         await sio.emit(
@@ -142,39 +239,84 @@ async def leave_template(sid, data):
 
 @sio.event
 async def template_change(sid, data):
-    """Broadcast template change to all users in room"""
+    """
+    Apply a change (JSON Patch operations on the template content)
+
+    The change gets the room's next sequence number and goes out in the
+    next 'template_changes' batch; the ack carries the sequence number, or
+    an error and the current one when the change no longer applies.
+    """
+    try:
+        data = _event_data(data)
+    except ValueError as e:
+        return {'error': str(e)}
+
     template_id = data.get('templateId')
     change = data.get('change')
-    user_id = data.get('userId')
 
     if not template_id or not change:
         return {'error': 'Missing templateId or change'}
 
-    # Broadcast to all users in room except sender
-    await sio.emit(
-        'template_change',
-        {'change': change, 'userId': user_id},
-        room=template_id,
-        skip_sid=sid
-    )
+    # Membership was granted by join_template after checking ownership
+    if template_id not in sio.rooms(sid):
+        return {'error': 'Not in template room'}
+    user_id = await _session_user_id(sid)
 
-    return {'success': True}
+    try:
+        seq = await collab_documents.apply(template_id, change, user_id)
+    except LookupError:
+        return {'error': 'Template not found'}
+    except ValueError as e:
+        return {'error': str(e), 'seq': await collab_documents.current_seq(template_id)}
+
+    room_coalescer.add_change(template_id, sid, user_id, {'seq': seq, 'ops': change})
+
+    return {'success': True, 'seq': seq}
 
 
 @sio.event
 async def cursor_move(sid, data):
-    """Broadcast cursor position to all users in room"""
+    """Record a cursor position; only the latest per user is sent in 'cursor_updates'"""
+    packed = isinstance(data, (bytes, bytearray))
+    try:
+        data = _event_data(data)
+    except ValueError:
+        return
+
     template_id = data.get('templateId')
-    user_id = data.get('userId')
-    position = data.get('position')
+    position = wire_codec.dequantize(data.get('position')) if packed else data.get('position')
 
-    if template_id and position:
-        await sio.emit(
-            'cursor_update',
-            {'userId': user_id, 'position': position},
-            room=template_id,
-            skip_sid=sid
-        )
+    if template_id and position and template_id in sio.rooms(sid):
+        room_coalescer.add_cursor(template_id, sid, await _session_user_id(sid), position)
+
+
+def _event_data(data) -> dict:
+    """
+    Payload of an incoming event; binary connections may send packed maps
+
+    Raises:
+        ValueError: If the payload cannot be decoded
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return wire_codec.decode(bytes(data))
+    if not isinstance(data, dict):
+        raise ValueError("Payload must be an object")
+    return data
+
+
+async def _session_user_id(sid: str) -> str:
+    """Id of the user a connection authenticated as"""
+    return (await sio.get_session(sid))['user']['id']
+
+
+async def _release_if_empty(template_id: str, leaving: Optional[str] = None):
+    """Flush and unload a room's document once no editor on this worker is in it"""
+    if any(s != leaving for s, _ in sio.manager.get_participants('/', template_id)):
+        return
+    try:
+        await collab_documents.release(template_id)
+    except Exception as e:
+        logger.error(f"Failed to release room {template_id}: {e}")
 
 
 # ============================================================================
@@ -198,12 +340,41 @@ async def health_check():
     return {
         "status": "healthy",
         "version": settings.APP_VERSION,
+        "cache": {
+            "templates": template_cache.stats(),
+            "exports": {
+                "hits": export_cache.hits,
+                "misses": export_cache.misses,
+                "entries": len(export_cache),
+                "bytes": export_cache.size,
+            },
+            "renders": {
+                "enabled": render_cache.enabled,
+                "hits": render_cache.hits,
+                "misses": render_cache.misses,
+                "entries": len(render_cache),
+                "bytes": render_cache.size,
+            },
+        },
+        "storage": storage_backend.stats(),
+        "realtime": {**room_coalescer.stats(), "documents": collab_documents.stats()},
+        "auth": {"principals": principal_cache.stats(), "password_hashing": password_hasher.stats()},
     }
 
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        """Prometheus metrics of every worker"""
+        return Response(render_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 if __name__ == "__main__":
     import uvicorn
 
+    # Metrics files of a previous run would be summed into this one
+    reset_multiprocess_dir()
+
     uvicorn.run(
         "app.main:socket_app",
         host=settings.HOST,
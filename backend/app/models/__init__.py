@@ -4,7 +4,7 @@ Database models
 
 from app.models.user import User
 from app.models.template import Template
-from app.models.asset import Asset
+from app.models.asset import Asset, AssetBlob
 from app.models.version import TemplateVersion
 
-__all__ = ['User', 'Template', 'Asset', 'TemplateVersion']
+__all__ = ['User', 'Template', 'Asset', 'AssetBlob', 'TemplateVersion']
@@ -33,8 +33,12 @@ class Asset(Base):
     size = Column(Integer, nullable=False)  # bytes
     mime_type = Column(String(100), nullable=False)
 
+    # Stored bytes, shared by every asset with the same content
+    content_hash = Column(String(64), ForeignKey('asset_blobs.content_hash'), nullable=True, index=True)
+
     # Metadata
-    metadata = Column(JSON, nullable=True, default=dict)
+    # 'metadata' is reserved on declarative models, so the column is mapped as meta
+    meta = Column('metadata', JSON, nullable=True, default=dict)
     tags = Column(JSON, nullable=True, default=list)
 
     # Owner
@@ -45,3 +49,21 @@ class Asset(Base):
 
     def __repr__(self):
         return f"<Asset {self.name} ({self.type})>"
+
+
+class AssetBlob(Base):
+    """Content-addressed file referenced by one or more assets"""
+
+    __tablename__ = "asset_blobs"
+
+    content_hash = Column(String(64), primary_key=True)  # sha256 hex
+    size = Column(Integer, nullable=False)  # bytes
+    mime_type = Column(String(100), nullable=False)
+
+    # Number of Asset rows pointing at this blob; the file is removed at zero
+    ref_count = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<AssetBlob {self.content_hash[:12]} refs={self.ref_count}>"
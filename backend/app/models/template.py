@@ -2,7 +2,8 @@
 Template model
 """
 
-from sqlalchemy import Column, String, DateTime, Enum as SQLEnum, ForeignKey, Integer, Text, JSON
+from sqlalchemy import Column, String, DateTime, Enum as SQLEnum, ForeignKey, Integer, Text, JSON, Index
+from sqlalchemy import DDL, event, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -10,6 +11,7 @@ import uuid
 import enum
 
 from app.core.database import Base
+from app.models.types import CompressedJSON
 
 
 class TemplateType(str, enum.Enum):
@@ -19,24 +21,50 @@ class TemplateType(str, enum.Enum):
 
 class Template(Base):
     __tablename__ = "templates"
+    __table_args__ = (
+        # Owner listings ordered by recency, also used for keyset pagination
+        Index('ix_templates_owner_updated', 'owner_id', 'updated_at', 'id'),
+        # PostgreSQL search: full-text and trigram over search_text, containment on tags
+        Index(
+            'ix_templates_search_tsv',
+            text("to_tsvector('simple', search_text)"),
+            postgresql_using='gin',
+        ).ddl_if(dialect='postgresql'),
+        Index(
+            'ix_templates_search_trgm',
+            'search_text',
+            postgresql_using='gin',
+            postgresql_ops={'search_text': 'gin_trgm_ops'},
+        ).ddl_if(dialect='postgresql'),
+        Index(
+            'ix_templates_tags',
+            text('(tags::jsonb)'),
+            postgresql_using='gin',
+        ).ddl_if(dialect='postgresql'),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
     type = Column(SQLEnum(TemplateType), nullable=False)
 
-    # JSON content with all elements
-    content = Column(JSON, nullable=False, default=dict)
+    # JSON content with all elements, compressed per CONTENT_COMPRESSION
+    content = Column(CompressedJSON, nullable=False, default=dict)
 
     # Metadata
     page_size = Column(JSON, nullable=True)
     variables = Column(JSON, nullable=True, default=list)
     styles = Column(JSON, nullable=True, default=list)
-    metadata = Column(JSON, nullable=True, default=dict)
+    # 'metadata' is reserved on declarative models, so the column is mapped as meta
+    meta = Column('metadata', JSON, nullable=True, default=dict)
 
     # Tags for categorization
     tags = Column(JSON, nullable=True, default=list)
 
+    # Lowercased name, description, tags and variable names for search,
+    # maintained by build_search_text on every insert/update
+    search_text = Column(Text, nullable=True)
+
     # Owner
     owner_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
 
@@ -52,3 +80,63 @@ class Template(Base):
 
     def __repr__(self):
         return f"<Template {self.name} ({self.type})>"
+
+
+def build_search_text(template: Template) -> str:
+    """Build the searchable document of a template"""
+    parts = [template.name or '', template.description or '']
+    parts.extend(str(tag) for tag in (template.tags or []))
+
+    variables = list(template.variables or [])
+    if isinstance(template.content, dict):
+        variables.extend(template.content.get('variables') or [])
+    parts.extend(
+        str(var.get('name')) for var in variables
+        if isinstance(var, dict) and var.get('name')
+    )
+
+    return ' '.join(part for part in parts if part).lower()
+
+
+@event.listens_for(Template, 'before_insert')
+@event.listens_for(Template, 'before_update')
+def _update_search_text(mapper, connection, target: Template):
+    target.search_text = build_search_text(target)
+
+
+# PostgreSQL: the trigram operator class used by ix_templates_search_trgm
+event.listen(
+    Template.__table__,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'),
+)
+
+# SQLite: external-content FTS5 table kept in sync by triggers
+SQLITE_FTS_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS templates_fts USING fts5(
+        search_text, tags, content='templates', content_rowid='rowid'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS templates_fts_ai AFTER INSERT ON templates BEGIN
+        INSERT INTO templates_fts(rowid, search_text, tags)
+        VALUES (new.rowid, new.search_text, new.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS templates_fts_ad AFTER DELETE ON templates BEGIN
+        INSERT INTO templates_fts(templates_fts, rowid, search_text, tags)
+        VALUES ('delete', old.rowid, old.search_text, old.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS templates_fts_au AFTER UPDATE ON templates BEGIN
+        INSERT INTO templates_fts(templates_fts, rowid, search_text, tags)
+        VALUES ('delete', old.rowid, old.search_text, old.tags);
+        INSERT INTO templates_fts(rowid, search_text, tags)
+        VALUES (new.rowid, new.search_text, new.tags);
+    END""",
+)
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(Template.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+event.listen(
+    Template.__table__,
+    'before_drop',
+    DDL('DROP TABLE IF EXISTS templates_fts').execute_if(dialect='sqlite'),
+)
@@ -0,0 +1,37 @@
+"""
+Custom column types
+"""
+
+from sqlalchemy import JSON, LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+from app.services.compression.content_codec import content_codec
+
+
+class CompressedJSON(TypeDecorator):
+    """
+    JSON value stored through the content codec
+
+    With CONTENT_COMPRESSION=none this is a plain JSON column. With zlib or
+    zstd the column is binary (app.services.compression.migrate --convert)
+    and values are encoded by the codec; reads accept any stored format,
+    including rows written before compression was on.
+    """
+
+    impl = JSON
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if content_codec.compressed:
+            return dialect.type_descriptor(LargeBinary())
+        return dialect.type_descriptor(JSON(none_as_null=True))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not content_codec.compressed:
+            return value
+        return content_codec.encode(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or not content_codec.compressed:
+            return value
+        return content_codec.decode(value)
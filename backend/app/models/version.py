@@ -2,27 +2,42 @@
 Template Version model for version control
 """
 
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, JSON, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Text, LargeBinary, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
 import uuid
 
 from app.core.database import Base
+from app.models.types import CompressedJSON
 
 
 class TemplateVersion(Base):
     __tablename__ = "template_versions"
+    __table_args__ = (
+        UniqueConstraint('template_id', 'version', name='uq_template_versions_template_version'),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     template_id = Column(UUID(as_uuid=True), ForeignKey('templates.id', ondelete='CASCADE'), nullable=False)
 
     version = Column(Integer, nullable=False)
-    content = Column(JSON, nullable=False)
+
+    # Snapshot versions store the full document in content; the rest store a
+    # zlib-compressed JSON Patch from the previous version in delta.
+    # base_version is the snapshot the delta chain starts from.
+    content = Column(CompressedJSON, nullable=True)
+    delta = Column(LargeBinary, nullable=True)
+    base_version = Column(Integer, nullable=False)
+    size = Column(Integer, nullable=False, default=0)  # Bytes of the JSON snapshot or compressed delta
     comment = Column(Text, nullable=True)
 
     # Who created this version
     created_by = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    @property
+    def is_snapshot(self) -> bool:
+        return self.content is not None
+
     def __repr__(self):
         return f"<TemplateVersion {self.template_id} v{self.version}>"
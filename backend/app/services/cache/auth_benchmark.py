@@ -0,0 +1,86 @@
+"""
+Authentication overhead benchmark
+
+Measures the per-request cost of get_current_user against the configured
+database: signature verification alone, verification plus the user
+lookup (a cache miss) and a principal cache hit:
+
+    python -m app.services.cache.auth_benchmark
+    python -m app.services.cache.auth_benchmark --requests 5000
+"""
+
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal, engine
+from app.core.security import create_access_token, decode_token, get_current_user
+from app.models.user import User
+from app.services.cache.principal_cache import principal_cache
+
+
+async def run(requests: int) -> List[Dict[str, Any]]:
+    """
+    Time each authentication path
+
+    Returns:
+        One result dict per path
+    """
+    async with AsyncSessionLocal() as db:
+        user_id = (await db.execute(select(User.id).limit(1))).scalar_one_or_none()
+    if user_id is None:
+        raise LookupError("No users in the database")
+
+    tokens = [create_access_token({"sub": str(user_id)}) for _ in range(requests)]
+
+    async def verify_only(token: str):
+        decode_token(token)
+
+    async def cache_miss(token: str):
+        await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+
+    async def cache_hit(token: str):
+        await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=tokens[0]))
+
+    results = []
+    # Distinct tokens make every cache_miss call a miss
+    for name, call in (('jwt verify', verify_only), ('verify + lookup', cache_miss), ('cache hit', cache_hit)):
+        start = time.perf_counter()
+        for token in tokens:
+            await call(token)
+        elapsed = time.perf_counter() - start
+        results.append({'path': name, 'us_per_request': elapsed * 1e6 / requests})
+
+    return results
+
+
+def report(results: List[Dict[str, Any]]) -> str:
+    """Format results as a table"""
+    lines = [f"{'path':<18}{'us/request':>12}"]
+    for result in results:
+        lines.append(f"{result['path']:<18}{result['us_per_request']:>12.1f}")
+    lines.append(f"cache: {principal_cache.stats()}")
+    return '\n'.join(lines)
+
+
+async def _main(requests: int) -> List[Dict[str, Any]]:
+    try:
+        return await run(requests)
+    finally:
+        await engine.dispose()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark per-request authentication overhead")
+    parser.add_argument('--requests', type=int, default=2000, help="requests per path")
+    args = parser.parse_args(argv)
+
+    print(report(asyncio.run(_main(args.requests))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Export Cache - In-memory LRU cache for generated template exports
+"""
+
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+import threading
+import logging
+
+from app.core.config import settings
+from app.core.metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+class ExportCache:
+    """
+    LRU cache de exportaciones serializadas, limitado por tamaño total en bytes
+
+    Keys start with the template id, followed by the template version and the
+    export variant, so an update naturally misses and old entries age out.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[Hashable, ...], bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[bytes]:
+        """Return cached bytes and mark the entry as recently used"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                cache_lookup('export', False)
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            cache_lookup('export', True)
+            return value
+
+    def set(self, key: Tuple[Hashable, ...], value: bytes):
+        """Store bytes, evicting least recently used entries over the size limit"""
+        if len(value) > self.max_bytes:
+            logger.debug(f"Export of {len(value)} bytes exceeds cache size, not cached")
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+
+            self._entries[key] = value
+            self._size += len(value)
+
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def invalidate(self, template_id: Any):
+        """Drop every cached export of a template"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == template_id]:
+                self._size -= len(self._entries.pop(key))
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size(self) -> int:
+        """Total cached bytes"""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+export_cache = ExportCache(settings.EXPORT_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,195 @@
+"""
+Principal Cache - Verified access tokens, the users they resolve to and revoked tokens
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+import asyncio
+import json
+import threading
+import time
+import logging
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.metrics import cache_lookup
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class PrincipalCache:
+    """
+    Caché de usuarios autenticados por token
+
+    Maps an access token to the principal it resolved to (id, email, name,
+    role) for at most `ttl` seconds and never past the token's expiry, so
+    a cached request skips both the signature check and the user lookup.
+    The number of tokens is bounded by evicting least recently used ones.
+
+    Revoked token ids (jti) are held in a local dict checked on every
+    request, hits included. Revocations and user invalidations (role
+    changes) are written to Redis and published on a channel every worker
+    listens to; revocations are also stored under revoked:{jti} until the
+    token expires so workers that start later load them.
+    """
+
+    def __init__(self, max_entries: int, ttl: int, prefix: str = 'auth'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def _channel(self) -> str:
+        return f"{self.prefix}:invalidations"
+
+    def _revoked_key(self, jti: str) -> str:
+        return f"{self.prefix}:revoked:{jti}"
+
+    # ========================================================================
+    # LOOKUPS
+    # ========================================================================
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Cached principal of a token, None when missing, expired or revoked"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                cache_lookup('principal', False)
+                return None
+
+            expires, jti, principal = entry
+            if expires <= time.time() or self.is_revoked(jti):
+                self._drop(token)
+                self.misses += 1
+                cache_lookup('principal', False)
+                return None
+
+            self._entries.move_to_end(token)
+            self.hits += 1
+            cache_lookup('principal', True)
+            return principal
+
+    def set(self, token: str, jti: str, principal: Dict[str, Any], token_expires: float):
+        """Cache a principal until the TTL or the token's expiry, whichever comes first"""
+        expires = min(time.time() + self.ttl, token_expires)
+        with self._lock:
+            self._drop(token)
+            self._entries[token] = (expires, jti, principal)
+            self._by_user.setdefault(principal['id'], set()).add(token)
+
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        return jti is not None and jti in self._revoked
+
+    def _drop(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._by_user.get(entry[2]['id'])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[entry[2]['id']]
+
+    # ========================================================================
+    # INVALIDATION
+    # ========================================================================
+
+    async def revoke(self, jti: str, token_expires: float):
+        """Reject a token on every worker until it expires"""
+        self._apply({'revoke': jti, 'exp': token_expires})
+        remaining = int(token_expires - time.time()) + 1
+        if remaining <= 0:
+            return
+        try:
+            redis = get_redis()
+            await redis.set(self._revoked_key(jti), int(token_expires), ex=remaining)
+            await redis.publish(self._channel, json.dumps({'revoke': jti, 'exp': token_expires}))
+        except RedisError as e:
+            logger.warning(f"Token revocation not shared with other workers: {e}")
+
+    async def invalidate_user(self, user_id: Any):
+        """Drop cached principals of a user on every worker, e.g. after a role change"""
+        self._apply({'user': str(user_id)})
+        try:
+            await get_redis().publish(self._channel, json.dumps({'user': str(user_id)}))
+        except RedisError as e:
+            logger.warning(f"User invalidation not shared with other workers: {e}")
+
+    def _apply(self, message: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            if 'revoke' in message:
+                self._revoked[message['revoke']] = message['exp']
+                for token, (_, jti, _) in list(self._entries.items()):
+                    if jti == message['revoke']:
+                        self._drop(token)
+                if len(self._revoked) % 1000 == 0:
+                    # Expired tokens fail verification anyway
+                    self._revoked = {j: exp for j, exp in self._revoked.items() if exp > now}
+            if 'user' in message:
+                for token in list(self._by_user.get(message['user'], ())):
+                    self._drop(token)
+
+    async def _load_revoked(self):
+        redis = get_redis()
+        prefix = self._revoked_key('')
+        async for key in redis.scan_iter(match=f"{prefix}*", count=1000):
+            key = key.decode() if isinstance(key, bytes) else key
+            exp = await redis.get(key)
+            if exp is not None:
+                self._apply({'revoke': key[len(prefix):], 'exp': float(exp)})
+
+    async def _listen(self):
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.subscribe(self._channel)
+                # Subscribed first so nothing published meanwhile is missed
+                await self._load_revoked()
+                while True:
+                    # Short polls: a blocking read would hit the pool's socket timeout
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        self._apply(json.loads(message['data']))
+            except RedisError as e:
+                logger.warning(f"Auth invalidation channel lost: {e}")
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(1)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'revoked': len(self._revoked),
+        }
+
+
+principal_cache = PrincipalCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL)
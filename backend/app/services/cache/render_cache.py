@@ -0,0 +1,210 @@
+"""
+Render Cache - Content-addressed on-disk cache for render results
+"""
+
+from collections import OrderedDict
+from typing import Any, Optional
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import logging
+
+from app.core.config import settings
+from app.core.metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Bump when renderer output changes so old results stop matching
+RENDER_CACHE_VERSION = 1
+
+# Seconds between rescans of the shared cache directory
+RESCAN_INTERVAL = 60
+
+
+def render_key(kind: str, template: Any, data: Any, options: Any) -> str:
+    """
+    Canonical hash of render inputs
+
+    Args:
+        kind: Renderer ('pdf', 'email', ...)
+        template: Template identity, e.g. (template_id, version) or the XML itself
+        data: Variable data
+        options: Render options
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps(
+        [RENDER_CACHE_VERSION, kind, template, data, options],
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """
+    Caché en disco de resultados de renderizado, direccionada por contenido
+
+    Files live at <directory>/<key[:2]>/<key>; the total size is bounded by
+    evicting least recently used files. Writes go through a temporary file
+    and an atomic rename, so concurrent workers sharing the directory never
+    read partial results. Reads touch the file, so modification times are
+    the recency shared by every worker. Each process indexes the directory
+    and rescans it every RESCAN_INTERVAL seconds, so files written by other
+    workers count towards the limit: the directory exceeds max_bytes by at
+    most what the workers write between two rescans.
+
+    Methods do blocking file I/O; async callers run them in a thread pool.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, enabled: bool = True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._scanned: Optional[float] = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _scan(self):
+        """Index the files in the directory, least recently used first"""
+        files = []
+        if os.path.isdir(self.directory):
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if name.startswith('.'):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, name, stat.st_size))
+
+        entries = OrderedDict((key, size) for _, key, size in sorted(files))
+        with self._lock:
+            self._entries = entries
+            self._size = sum(entries.values())
+            self._scanned = time.monotonic()
+
+    def _ensure_scanned(self):
+        if self._scanned is None or time.monotonic() - self._scanned > RESCAN_INTERVAL:
+            self._scan()
+
+    def _hit(self, key: str, size: int):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous
+            self._entries[key] = size
+            self._size += size
+            self.hits += 1
+        cache_lookup('render', True)
+
+    def _miss(self, key: str):
+        with self._lock:
+            # Missing here, or evicted by another worker
+            size = self._entries.pop(key, None)
+            if size is not None:
+                self._size -= size
+            self.misses += 1
+        cache_lookup('render', False)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached result for a key, refreshing its recency"""
+        if not self.enabled:
+            return None
+
+        self._ensure_scanned()
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+            os.utime(path)
+        except OSError:
+            self._miss(key)
+            return None
+
+        self._hit(key, len(value))
+        return value
+
+    def touch(self, key: str) -> bool:
+        """Refresh the recency of a cached result without reading it, e.g. to answer 304"""
+        if not self.enabled:
+            return False
+
+        self._ensure_scanned()
+        path = self._path(key)
+        try:
+            os.utime(path)
+            size = os.path.getsize(path)
+        except OSError:
+            self._miss(key)
+            return False
+
+        self._hit(key, size)
+        return True
+
+    def set(self, key: str, value: bytes):
+        """Store a result, evicting least recently used files over the size limit"""
+        if not self.enabled:
+            return
+        if len(value) > self.max_bytes:
+            logger.debug(f"Render result of {len(value)} bytes exceeds cache size, not cached")
+            return
+
+        self._ensure_scanned()
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write render cache entry {key}: {e}")
+            return
+
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous
+            self._entries[key] = len(value)
+            self._size += len(value)
+
+            while self._size > self.max_bytes:
+                oldest, size = self._entries.popitem(last=False)
+                self._size -= size
+                evicted.append(oldest)
+
+        for oldest in evicted:
+            try:
+                os.remove(self._path(oldest))
+            except OSError:
+                pass
+
+    @property
+    def size(self) -> int:
+        """Total cached bytes in the directory as of the last scan and this process's writes"""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+render_cache = RenderCache(
+    settings.RENDER_CACHE_DIR,
+    settings.RENDER_CACHE_MAX_MB * 1024 * 1024,
+    enabled=settings.RENDER_CACHE_ENABLED,
+)
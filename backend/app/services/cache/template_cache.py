@@ -0,0 +1,201 @@
+"""
+Template Cache - Redis read-through cache for template rows and compiled output
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+from datetime import datetime
+from enum import Enum
+import json
+import logging
+
+from redis.exceptions import RedisError, WatchError
+
+from app.core.config import settings
+from app.core.metrics import cache_lookup
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Marker stored as the latest version of a deleted template
+DELETED = b'deleted'
+
+# Template attributes kept in the cached row
+ROW_FIELDS = (
+    'id', 'name', 'description', 'type', 'content', 'page_size', 'variables',
+    'styles', 'meta', 'tags', 'owner_id', 'thumbnail_url', 'version',
+    'created_at', 'updated_at',
+)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+class TemplateCache:
+    """
+    Caché de plantillas en Redis
+
+    Rows are stored under template:{id} and dropped on every write. Writes
+    also record the new version under template:{id}:latest, and a row is
+    only stored while that version has not moved past it, so a reader that
+    loaded a row before a concurrent write cannot cache it afterwards.
+    Compiled artifacts (generated XML, parsed layouts, ...) are keyed by
+    (id, version, kind), so a new version never reads a stale entry; the
+    keys of each template are tracked in a set so delete can drop them.
+    Redis errors are logged and treated as misses, never as failures.
+    """
+
+    def __init__(self, ttl: int, prefix: str = 'template'):
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _row_key(self, template_id: Any) -> str:
+        return f"{self.prefix}:{template_id}"
+
+    def _compiled_key(self, template_id: Any, version: int, kind: str) -> str:
+        return f"{self.prefix}:{template_id}:v{version}:{kind}"
+
+    def _index_key(self, template_id: Any) -> str:
+        return f"{self.prefix}:{template_id}:keys"
+
+    def _latest_key(self, template_id: Any) -> str:
+        return f"{self.prefix}:{template_id}:latest"
+
+    async def get_row(self, template_id: Any) -> Optional[Dict[str, Any]]:
+        """Cached template row as a dict of ROW_FIELDS"""
+        data = await self._get(self._row_key(template_id))
+        return json.loads(data) if data is not None else None
+
+    async def set_row(self, template: Any) -> bool:
+        """
+        Cache a template row unless a newer version was written meanwhile
+
+        Returns:
+            Whether the row was stored
+        """
+        row = {field: getattr(template, field) for field in ROW_FIELDS}
+        data = json.dumps(row, default=_json_default, separators=(',', ':'))
+        latest_key = self._latest_key(template.id)
+        try:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                await pipe.watch(latest_key)
+                latest = await pipe.get(latest_key)
+                if latest == DELETED or (latest is not None and int(latest) > template.version):
+                    return False
+                pipe.multi()
+                pipe.set(self._row_key(template.id), data, ex=self.ttl)
+                await pipe.execute()
+                return True
+        except WatchError:
+            return False
+        except RedisError as e:
+            self._error('set', e)
+            return False
+
+    async def get_row_or_load(
+        self,
+        template_id: Any,
+        load: Callable[[], Awaitable[Any]],
+    ) -> Optional[Any]:
+        """
+        Read-through lookup of a template row
+
+        Returns the cached dict on a hit; on a miss, the result of load()
+        (a Template or None), which is cached when found.
+        """
+        row = await self.get_row(template_id)
+        if row is not None:
+            return row
+
+        template = await load()
+        if template is not None:
+            await self.set_row(template)
+        return template
+
+    async def get_compiled(self, template_id: Any, version: int, kind: str) -> Optional[bytes]:
+        """Cached compiled artifact of a template version"""
+        return await self._get(self._compiled_key(template_id, version, kind))
+
+    async def set_compiled(self, template_id: Any, version: int, kind: str, value: bytes):
+        """Cache a compiled artifact of a template version"""
+        key = self._compiled_key(template_id, version, kind)
+        index = self._index_key(template_id)
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.set(key, value, ex=self.ttl)
+                pipe.sadd(index, key)
+                pipe.expire(index, self.ttl)
+                await pipe.execute()
+        except RedisError as e:
+            self._error('set', e)
+
+    async def invalidate(self, template_id: Any, version: Optional[int] = None, compiled: bool = False):
+        """
+        Drop the cached row of a template after a write
+
+        Args:
+            template_id: Template written
+            version: Version the write committed; older rows are not cached again
+            compiled: The template was deleted; compiled artifacts are
+                version-keyed and only need dropping then
+        """
+        keys = [self._row_key(template_id)]
+        try:
+            redis = get_redis()
+            if compiled:
+                index = self._index_key(template_id)
+                keys.extend(await redis.smembers(index))
+                keys.append(index)
+
+            latest = DELETED if compiled else version
+            async with redis.pipeline(transaction=True) as pipe:
+                if latest is not None:
+                    # Outlives any row a reader could still be about to store
+                    pipe.set(self._latest_key(template_id), latest, ex=self.ttl)
+                pipe.delete(*keys)
+                await pipe.execute()
+        except RedisError as e:
+            self._error('invalidate', e)
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        try:
+            value = await get_redis().get(key)
+        except RedisError as e:
+            self._error('get', e)
+            value = None
+
+        if value is None:
+            self.misses += 1
+            cache_lookup('template', False)
+        else:
+            self.hits += 1
+            cache_lookup('template', True)
+        return value
+
+    def _error(self, operation: str, error: Exception):
+        self.errors += 1
+        logger.warning(f"Template cache {operation} failed: {error}")
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of this process"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': round(self.hit_ratio, 4),
+        }
+
+
+template_cache = TemplateCache(settings.TEMPLATE_CACHE_TTL)
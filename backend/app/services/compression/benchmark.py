@@ -0,0 +1,146 @@
+"""
+Content storage benchmark
+
+Compares plain JSON with the compressed codecs on real template content:
+database file size and per-row write/read latency, measured on a scratch
+SQLite database so runs are repeatable on any machine:
+
+    python -m app.services.compression.benchmark examples/pdf-templates/invoice.xml
+    python -m app.services.compression.benchmark --from-db --rows 2000
+
+Dictionaries are trained on half of the samples and measured on all of
+them, so the figures are not flattered by training on the test set.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from app.services.compression.content_codec import ContentCodec, train_dictionary
+
+
+def _codecs(samples: Sequence[Any]) -> List[Tuple[str, ContentCodec]]:
+    """Codec variants to compare"""
+    training = samples[::2] or samples
+    codecs = [
+        ('json', ContentCodec('none')),
+        ('zlib', ContentCodec('zlib')),
+        ('zlib+trained', ContentCodec('zlib', dictionaries=[train_dictionary(training, 'zlib')])),
+    ]
+
+    try:
+        codecs.append(('zstd', ContentCodec('zstd')))
+        codecs.append(('zstd+trained', ContentCodec('zstd', dictionaries=[train_dictionary(training, 'zstd')])))
+    except Exception as e:
+        # zstd is optional; the trainer also needs enough distinct samples
+        print(f"skipping zstd: {e}")
+
+    return codecs
+
+
+def run(samples: Sequence[Any], rows: int) -> List[Dict[str, Any]]:
+    """
+    Store `rows` rows cycling through the samples with each codec
+
+    Returns:
+        One result dict per codec
+    """
+    results = []
+
+    for name, codec in _codecs(samples):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.db')
+            conn = sqlite3.connect(path)
+            conn.execute('CREATE TABLE templates (id INTEGER PRIMARY KEY, content BLOB NOT NULL)')
+
+            start = time.perf_counter()
+            for i in range(rows):
+                conn.execute('INSERT INTO templates (id, content) VALUES (?, ?)', (i, codec.encode(samples[i % len(samples)])))
+            conn.commit()
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for (content,) in conn.execute('SELECT content FROM templates'):
+                codec.decode(content)
+            read_time = time.perf_counter() - start
+
+            stored = conn.execute('SELECT SUM(LENGTH(content)) FROM templates').fetchone()[0]
+            conn.execute('VACUUM')
+            conn.close()
+
+            results.append({
+                'codec': name,
+                'stored_bytes': stored,
+                'db_bytes': os.path.getsize(path),
+                'write_ms_per_row': write_time * 1000 / rows,
+                'read_ms_per_row': read_time * 1000 / rows,
+            })
+
+    return results
+
+
+def report(results: List[Dict[str, Any]]) -> str:
+    """Format results as a table relative to plain JSON"""
+    baseline = results[0]
+    lines = [f"{'codec':<14}{'stored':>12}{'ratio':>8}{'db file':>12}{'write ms':>10}{'read ms':>10}"]
+    for result in results:
+        lines.append(
+            f"{result['codec']:<14}"
+            f"{result['stored_bytes']:>12}"
+            f"{result['stored_bytes'] / baseline['stored_bytes']:>8.2f}"
+            f"{result['db_bytes']:>12}"
+            f"{result['write_ms_per_row']:>10.3f}"
+            f"{result['read_ms_per_row']:>10.3f}"
+        )
+    return '\n'.join(lines)
+
+
+def _load_files(paths: Sequence[str]) -> List[Any]:
+    from app.services.xml.xml_parser import XMLParser
+
+    samples = []
+    for path in paths:
+        if path.endswith('.xml'):
+            with open(path, 'rb') as f:
+                samples.append(XMLParser().parse_stream(f))
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                samples.append(json.load(f))
+    return samples
+
+
+async def _load_db(limit: int) -> List[Any]:
+    from app.core.database import AsyncSessionLocal, engine
+    from app.services.compression.migrate import sample_content
+
+    async with AsyncSessionLocal() as db:
+        samples = await sample_content(db, limit)
+    await engine.dispose()
+    return samples
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark template content storage formats")
+    parser.add_argument('files', nargs='*', help="XML or JSON templates to use as samples")
+    parser.add_argument('--from-db', action='store_true', help="sample content from the configured database")
+    parser.add_argument('--samples', type=int, default=1000, help="templates sampled from the database")
+    parser.add_argument('--rows', type=int, default=1000, help="rows written per codec")
+    args = parser.parse_args(argv)
+
+    samples = _load_files(args.files)
+    if args.from_db:
+        samples.extend(asyncio.run(_load_db(args.samples)))
+
+    if not samples:
+        parser.error("no samples: pass template files or --from-db")
+
+    print(report(run(samples, args.rows)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Content Codec - Compressed binary encoding for template JSON
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from collections import Counter
+import json
+import re
+import struct
+import zlib
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# First byte of an encoded value; plain JSON always starts with a printable character
+ZLIB_TAG = 0x01
+ZSTD_TAG = 0x02
+
+# Tag byte followed by the CRC32 of the dictionary (0 when none was used)
+HEADER = struct.Struct('>BI')
+
+METHODS = ('none', 'zlib', 'zstd')
+
+# Fallback zlib dictionary with the keys repeated throughout template content.
+# zlib favours matches near the end, so the most frequent fragments go last.
+BUILTIN_ZLIB_DICTIONARY = (
+    '"transformation":{"m0":"m1":"m2":"m3":"m4":"m5":}"chart_type":"series":"title":'
+    '"generator":"error_level":"module_width":"module_size":"path":"next_page_id":'
+    '"condition_type":"border_style_id":"image_id":"image":"flow_content":"flow_id":'
+    '"text_styles":"para_styles":"colors":"fonts":"sub_fonts":"font_name":"label":"value":'
+    '"layout_id":"layout_name":"variables":"styles":"pages":"elements":"content":'
+    '"index":"parent_id":"variable_id":"location":"fill_style_id":"text_runs":[{"text":'
+    '"style_id":"name":"type":"FlowArea","type":"ImageObject","type":"PathObject",'
+    '"id":"position":{"x":0.0,"y":0.0},"size":{"width":0.0,"height":0.0},'
+).encode('utf-8')
+
+# Quoted keys and short string values in serialized JSON
+FRAGMENT_PATTERN = re.compile(rb'"[^"\\]{1,48}"[:,]?')
+
+
+def _dictionary_id(dictionary: Optional[bytes]) -> int:
+    return zlib.crc32(dictionary) if dictionary else 0
+
+
+def _load_zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd content compression requires the zstandard package")
+    return zstandard
+
+
+class ContentCodec:
+    """
+    Codificador de contenido de plantillas
+
+    Values are stored as compact UTF-8 JSON, or compressed with zlib or zstd
+    behind a 5-byte header naming the method and the dictionary used. Any
+    stored format decodes regardless of the configured method, so the
+    setting can change without rewriting existing rows.
+    """
+
+    def __init__(
+        self,
+        method: str = 'none',
+        level: Optional[int] = None,
+        dictionaries: Sequence[bytes] = (),
+    ):
+        if method not in METHODS:
+            raise ValueError(f"Unknown content compression method: {method}")
+
+        self.method = method
+        self.level = level
+
+        # The first dictionary is used for writing; all of them for reading
+        self.dictionary = dictionaries[0] if dictionaries else None
+        if self.dictionary is None and method == 'zlib':
+            self.dictionary = BUILTIN_ZLIB_DICTIONARY
+
+        self.dictionaries: Dict[int, bytes] = {_dictionary_id(BUILTIN_ZLIB_DICTIONARY): BUILTIN_ZLIB_DICTIONARY}
+        for dictionary in dictionaries:
+            self.dictionaries[_dictionary_id(dictionary)] = dictionary
+
+        self._zstd_compressor = None
+        self._zstd_decompressors: Dict[int, Any] = {}
+
+    @property
+    def compressed(self) -> bool:
+        """Whether content is stored in binary columns"""
+        return self.method != 'none'
+
+    @classmethod
+    def from_settings(cls) -> 'ContentCodec':
+        dictionaries = []
+        for path in settings.CONTENT_DICTIONARIES.split(','):
+            if path.strip():
+                with open(path.strip(), 'rb') as f:
+                    dictionaries.append(f.read())
+
+        return cls(settings.CONTENT_COMPRESSION, settings.CONTENT_COMPRESSION_LEVEL, dictionaries)
+
+    def encode(self, value: Any) -> bytes:
+        """Serialize a JSON value with the configured method"""
+        data = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+        if self.method == 'zlib':
+            level = self.level if self.level is not None else 6
+            compressor = zlib.compressobj(level, zdict=self.dictionary)
+            return HEADER.pack(ZLIB_TAG, _dictionary_id(self.dictionary)) + compressor.compress(data) + compressor.flush()
+
+        if self.method == 'zstd':
+            return HEADER.pack(ZSTD_TAG, _dictionary_id(self.dictionary)) + self._zstd_compressor_for().compress(data)
+
+        return data
+
+    def decode(self, data: bytes) -> Any:
+        """Deserialize a value written by any method"""
+        if isinstance(data, str):
+            return json.loads(data)
+
+        data = bytes(data)
+        if not data or data[0] not in (ZLIB_TAG, ZSTD_TAG):
+            return json.loads(data)
+
+        tag, dictionary_id = HEADER.unpack_from(data)
+        payload = data[HEADER.size:]
+
+        if dictionary_id and dictionary_id not in self.dictionaries:
+            raise ValueError(f"Content was compressed with unknown dictionary {dictionary_id:08x}")
+
+        if tag == ZLIB_TAG:
+            dictionary = self.dictionaries.get(dictionary_id)
+            decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+            raw = decompressor.decompress(payload) + decompressor.flush()
+        else:
+            raw = self._zstd_decompressor_for(dictionary_id).decompress(payload)
+
+        return json.loads(raw)
+
+    def _zstd_compressor_for(self):
+        if self._zstd_compressor is None:
+            zstandard = _load_zstd()
+            level = self.level if self.level is not None else 3
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+            self._zstd_compressor = zstandard.ZstdCompressor(level=level, dict_data=dict_data, write_content_size=True)
+        return self._zstd_compressor
+
+    def _zstd_decompressor_for(self, dictionary_id: int):
+        if dictionary_id not in self._zstd_decompressors:
+            zstandard = _load_zstd()
+            dictionary = self.dictionaries.get(dictionary_id)
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary_id else None
+            self._zstd_decompressors[dictionary_id] = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return self._zstd_decompressors[dictionary_id]
+
+
+def train_dictionary(samples: Iterable[Any], method: str, size: int = 32 * 1024) -> bytes:
+    """
+    Build a shared compression dictionary from sample template content
+
+    zstd uses its trainer; zlib gets the most frequent JSON fragments,
+    ordered so the most frequent sit at the end where zlib prefers them.
+    zlib only looks at the last 32 KB of a dictionary.
+    """
+    encoded: List[bytes] = [
+        json.dumps(sample, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        for sample in samples
+    ]
+    if not encoded:
+        raise ValueError("No samples to train a dictionary from")
+
+    if method == 'zstd':
+        zstandard = _load_zstd()
+        return zstandard.train_dictionary(size, encoded).as_bytes()
+
+    if method != 'zlib':
+        raise ValueError(f"Dictionaries are not used by method: {method}")
+
+    counts = Counter()
+    for data in encoded:
+        counts.update(FRAGMENT_PATTERN.findall(data))
+
+    fragments = []
+    total = 0
+    for fragment, count in counts.most_common():
+        if count < 2 or total + len(fragment) > min(size, 32 * 1024):
+            break
+        fragments.append(fragment)
+        total += len(fragment)
+
+    return b''.join(reversed(fragments))
+
+
+# Codec used by the CompressedJSON column type
+content_codec = ContentCodec.from_settings()
@@ -0,0 +1,193 @@
+"""
+Content storage migration
+
+Content columns are JSON while CONTENT_COMPRESSION is none and binary
+otherwise. Turning compression on converts them in place, keeping the JSON
+text as bytes, then re-encodes existing rows with the configured codec:
+
+    python -m app.services.compression.migrate --convert
+    python -m app.services.compression.migrate --train dictionary.bin --method zstd
+    CONTENT_COMPRESSION=zstd CONTENT_DICTIONARIES=dictionary.bin \\
+        python -m app.services.compression.migrate --recompress
+
+Converted rows stay readable: the codec decodes plain JSON bytes, so
+recompression can run while the API is serving. The API refuses to start
+while the columns do not match CONTENT_COMPRESSION (see check_columns).
+"""
+
+from typing import Any, List, Optional
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import LargeBinary, inspect, select, update, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.core.database import engine, AsyncSessionLocal
+from app.core.logging import setup_logging
+from app.models.template import Template
+from app.models.version import TemplateVersion
+from app.services.compression.content_codec import content_codec, train_dictionary
+
+logger = logging.getLogger(__name__)
+
+# (table, column) pairs stored as CompressedJSON
+COMPRESSED_COLUMNS = (
+    ('templates', 'content'),
+    ('template_versions', 'content'),
+)
+
+
+async def convert_columns(bind: AsyncEngine) -> None:
+    """Change the JSON content columns to binary, keeping the JSON text as bytes"""
+    async with bind.begin() as conn:
+        dialect = conn.dialect.name
+
+        for table, column in COMPRESSED_COLUMNS:
+            if dialect == 'postgresql':
+                await conn.execute(text(
+                    f"ALTER TABLE {table} ALTER COLUMN {column} TYPE bytea "
+                    f"USING convert_to({column}::text, 'UTF8')"
+                ))
+            elif dialect == 'sqlite':
+                # Column types are advisory in SQLite; only the stored values change
+                await conn.execute(text(
+                    f"UPDATE {table} SET {column} = CAST({column} AS BLOB) "
+                    f"WHERE typeof({column}) = 'text'"
+                ))
+            else:
+                raise ValueError(f"Unsupported database for content conversion: {dialect}")
+
+            logger.info(f"Converted {table}.{column} to binary storage")
+
+
+async def check_columns(bind: AsyncEngine) -> None:
+    """
+    Fail fast when the content columns do not match CONTENT_COMPRESSION
+
+    Raises:
+        RuntimeError: If compression is on and a column is still JSON, or
+            compression is off and a column holds binary content
+    """
+    def column_types(sync_conn):
+        inspector = inspect(sync_conn)
+        types = {}
+        for table, column in COMPRESSED_COLUMNS:
+            if inspector.has_table(table):
+                types[(table, column)] = next(
+                    c['type'] for c in inspector.get_columns(table) if c['name'] == column
+                )
+        return types
+
+    async with bind.connect() as conn:
+        types = await conn.run_sync(column_types)
+
+        for (table, column), column_type in types.items():
+            if conn.dialect.name == 'sqlite':
+                # Declared types are advisory; --convert only changes the stored values
+                binary = (await conn.execute(text(
+                    f"SELECT 1 FROM {table} WHERE typeof({column}) = 'blob' LIMIT 1"
+                ))).first() is not None
+                if content_codec.compressed or not binary:
+                    continue
+            else:
+                binary = isinstance(column_type, LargeBinary)
+                if binary == content_codec.compressed:
+                    continue
+
+            if content_codec.compressed:
+                raise RuntimeError(
+                    f"CONTENT_COMPRESSION={content_codec.method} needs binary content columns but "
+                    f"{table}.{column} is {column_type}; run python -m app.services.compression.migrate --convert"
+                )
+            raise RuntimeError(
+                f"{table}.{column} holds binary content but CONTENT_COMPRESSION is none; "
+                f"set it to the method the column was converted for"
+            )
+
+
+async def recompress(db: AsyncSession, batch_size: int = 200) -> int:
+    """
+    Re-encode stored content with the configured codec
+
+    Returns:
+        Number of rows rewritten
+    """
+    rewritten = 0
+
+    for model in (Template, TemplateVersion):
+        last_id = None
+
+        while True:
+            stmt = (
+                select(model.id, model.content)
+                .where(model.content.is_not(None))
+                .order_by(model.id)
+                .limit(batch_size)
+            )
+            if last_id is not None:
+                stmt = stmt.where(model.id > last_id)
+
+            rows = (await db.execute(stmt)).all()
+            if not rows:
+                break
+
+            for row_id, content in rows:
+                values = {'content': content}
+                if model is Template:
+                    # Storage changes are not user-visible edits
+                    values['updated_at'] = Template.updated_at
+
+                await db.execute(
+                    update(model)
+                    .where(model.id == row_id)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+
+            rewritten += len(rows)
+            last_id = rows[-1][0]
+            await db.commit()
+
+    logger.info(f"Recompressed {rewritten} rows")
+    return rewritten
+
+
+async def sample_content(db: AsyncSession, limit: int = 1000) -> List[Any]:
+    """Most recently updated template content, for dictionary training"""
+    result = await db.execute(
+        select(Template.content).order_by(Template.updated_at.desc()).limit(limit)
+    )
+    return [content for content in result.scalars().all() if content]
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Migrate template content storage")
+    parser.add_argument('--convert', action='store_true', help="convert JSON columns to binary")
+    parser.add_argument('--train', metavar='PATH', help="train a dictionary from stored content")
+    parser.add_argument('--method', choices=('zlib', 'zstd'), default='zstd', help="dictionary method")
+    parser.add_argument('--samples', type=int, default=1000, help="templates used for training")
+    parser.add_argument('--recompress', action='store_true', help="re-encode rows with the configured codec")
+    parser.add_argument('--batch-size', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.convert:
+        await convert_columns(engine)
+
+    async with AsyncSessionLocal() as db:
+        if args.train:
+            samples = await sample_content(db, args.samples)
+            dictionary = train_dictionary(samples, args.method)
+            with open(args.train, 'wb') as f:
+                f.write(dictionary)
+            logger.info(f"Wrote {len(dictionary)} byte {args.method} dictionary to {args.train}")
+
+        if args.recompress:
+            await recompress(db, args.batch_size)
+
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    setup_logging()
+    asyncio.run(main())
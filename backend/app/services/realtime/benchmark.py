@@ -0,0 +1,140 @@
+"""
+Wire format benchmark
+
+Compares the JSON and MessagePack encodings of coalesced collaboration
+batches on a synthetic editing session: bytes on the wire per event
+(Socket.IO packet included, as sent to each client) and server CPU per
+broadcast, which is paid once per batch however many clients receive it:
+
+    python -m app.services.realtime.benchmark
+    python -m app.services.realtime.benchmark --editors 50 --batches 2000
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import random
+import time
+import uuid
+
+from socketio import packet
+
+from app.services.realtime.wire import WireCodec
+
+
+def session(editors: int, elements: int, batches: int, seed: int = 0) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Batches of a room where every editor moves the cursor each tick and a
+    third of them drag, restyle or add elements
+    """
+    rng = random.Random(seed)
+    users = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(editors)]
+    element_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(elements)]
+
+    result = []
+    seq = 0
+    for _ in range(batches):
+        result.append(('cursor_updates', {'cursors': [
+            {'userId': user, 'position': {'x': rng.uniform(0, 595), 'y': rng.uniform(0, 842)}}
+            for user in users
+        ]}))
+
+        changes = []
+        for user in rng.sample(users, max(editors // 3, 1)):
+            seq += 1
+            index = rng.randrange(elements)
+            kind = rng.random()
+            if kind < 0.7:
+                ops = [
+                    {'op': 'replace', 'path': f'/pages/0/elements/{index}/position/x', 'value': rng.uniform(0, 595)},
+                    {'op': 'replace', 'path': f'/pages/0/elements/{index}/position/y', 'value': rng.uniform(0, 842)},
+                ]
+            elif kind < 0.9:
+                ops = [{'op': 'replace', 'path': f'/pages/0/elements/{index}/style/color', 'value': '#%06x' % rng.getrandbits(24)}]
+            else:
+                ops = [{'op': 'add', 'path': '/pages/0/elements/-', 'value': {
+                    'id': rng.choice(element_ids),
+                    'type': 'text',
+                    'position': {'x': rng.uniform(0, 595), 'y': rng.uniform(0, 842)},
+                    'size': {'width': 120.0, 'height': 24.0},
+                    'content': 'Lorem ipsum',
+                }}]
+            changes.append({'change': {'seq': seq, 'ops': ops}, 'userId': user})
+        result.append(('template_changes', {'changes': changes}))
+
+    return result
+
+
+def _packet_bytes(event: str, payload: Any) -> int:
+    encoded = packet.Packet(packet.EVENT, namespace='/', data=[event, payload]).encode()
+    if isinstance(encoded, list):
+        return sum(len(part) if isinstance(part, bytes) else len(part.encode('utf-8')) for part in encoded)
+    return len(encoded.encode('utf-8'))
+
+
+def run(batches: List[Tuple[str, Dict[str, Any]]], codec: WireCodec) -> List[Dict[str, Any]]:
+    """
+    Encode every batch with each format
+
+    Returns:
+        One result dict per event and encoding
+    """
+    results = []
+    for event in ('cursor_updates', 'template_changes'):
+        selected = [data for name, data in batches if name == event]
+        events = sum(len(data['cursors'] if event == 'cursor_updates' else data['changes']) for data in selected)
+
+        encoders = [
+            ('json', lambda data: data),
+            ('msgpack', lambda data: codec.encode(event, data)),
+        ]
+        for encoding, encode in encoders:
+            total = 0
+            start = time.process_time()
+            for data in selected:
+                total += _packet_bytes(event, encode(data))
+            cpu = time.process_time() - start
+
+            results.append({
+                'event': event,
+                'encoding': encoding,
+                'bytes_per_event': total / events,
+                'bytes_per_batch': total / len(selected),
+                'cpu_us_per_broadcast': cpu * 1e6 / len(selected),
+            })
+    return results
+
+
+def report(results: List[Dict[str, Any]]) -> str:
+    """Format results as a table relative to JSON"""
+    lines = [f"{'event':<18}{'encoding':<10}{'B/event':>10}{'ratio':>8}{'B/batch':>10}{'CPU us/bcast':>14}"]
+    baseline = {}
+    for result in results:
+        baseline.setdefault(result['event'], result)
+        lines.append(
+            f"{result['event']:<18}"
+            f"{result['encoding']:<10}"
+            f"{result['bytes_per_event']:>10.1f}"
+            f"{result['bytes_per_event'] / baseline[result['event']]['bytes_per_event']:>8.2f}"
+            f"{result['bytes_per_batch']:>10.0f}"
+            f"{result['cpu_us_per_broadcast']:>14.1f}"
+        )
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark collaboration wire formats")
+    parser.add_argument('--editors', type=int, default=10, help="editors in the room")
+    parser.add_argument('--elements', type=int, default=200, help="elements in the template")
+    parser.add_argument('--batches', type=int, default=1000, help="ticks of each event type")
+    parser.add_argument('--precision', type=float, default=0.1, help="cursor quantum in template units")
+    args = parser.parse_args(argv)
+
+    codec = WireCodec(args.precision)
+    if not codec.enabled:
+        parser.error("msgpack is not installed")
+
+    print(report(run(session(args.editors, args.elements, args.batches), codec)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Room Coalescer - Batch cursor moves and template changes per room and tick
+"""
+
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+
+from app.services.realtime.wire import encoding_room
+
+logger = logging.getLogger(__name__)
+
+
+class RoomCoalescer:
+    """
+    Agrupador de eventos de edición por sala
+
+    Instead of re-broadcasting every cursor move and change as it arrives,
+    events are buffered per room and flushed once per tick: the latest
+    cursor of each user as one 'cursor_updates' event and the pending
+    changes, in arrival order, as one 'template_changes' event. A room
+    therefore receives at most two events per tick however many editors
+    are typing or moving the mouse.
+
+    Batches go to the whole room; when every event in a batch came from
+    one connection that connection is skipped, otherwise clients drop
+    their own entries by userId.
+
+    Each batch is encoded once per wire format and sent to the room's
+    per-encoding sub-room, so JSON and binary clients share a room.
+    Flushes of a room are serialized, so batches leave in order even when
+    a burst flushes early while the tick is sending.
+    """
+
+    def __init__(self, sio, tick: float, codec=None, max_changes: int = 500):
+        self.sio = sio
+        self.tick = tick
+        self.codec = codec
+        self.max_changes = max_changes
+        self._cursors: Dict[str, Dict[Any, Tuple[str, Any]]] = {}
+        self._changes: Dict[str, List[Tuple[str, Any, Any]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._early_flushes: Set[asyncio.Task] = set()
+        # Per-room lock and the number of flushes holding or awaiting it
+        self._locks: Dict[str, List[Any]] = {}
+
+        # Deliveries the per-event broadcast would have made vs. actual ones
+        self.events_in = 0
+        self.deliveries_uncoalesced = 0
+        self.deliveries = 0
+        self.messages_out = 0
+
+    def add_cursor(self, room: str, sid: str, user_id: Any, position: Any):
+        """Record a cursor position, replacing the user's pending one"""
+        self._cursors.setdefault(room, {})[user_id] = (sid, position)
+        self._count_in(room)
+
+    def add_change(self, room: str, sid: str, user_id: Any, change: Any):
+        """Queue a change for the next batch of the room"""
+        changes = self._changes.setdefault(room, [])
+        changes.append((sid, user_id, change))
+        self._count_in(room)
+
+        if len(changes) >= self.max_changes:
+            # Bound memory and message size under bursts; flush early
+            task = asyncio.get_running_loop().create_task(self._flush_changes(room))
+            self._early_flushes.add(task)
+            task.add_done_callback(self._early_flushes.discard)
+
+    def remove(self, sid: str, room: Optional[str] = None):
+        """Drop pending cursors of a connection that left"""
+        rooms = [room] if room else list(self._cursors)
+        for name in rooms:
+            cursors = self._cursors.get(name, {})
+            for user_id in [u for u, (s, _) in cursors.items() if s == sid]:
+                del cursors[user_id]
+
+    async def flush(self):
+        """Send the pending batches of every room"""
+        for room in list(self._changes):
+            await self._flush_changes(room)
+        for room in list(self._cursors):
+            await self._flush_cursors(room)
+
+    @asynccontextmanager
+    async def _room_lock(self, room: str):
+        entry = self._locks.setdefault(room, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[room]
+
+    async def _flush_changes(self, room: str):
+        async with self._room_lock(room):
+            changes = self._changes.pop(room, None)
+            if not changes:
+                return
+            await self._emit(
+                'template_changes',
+                {'changes': [{'change': change, 'userId': user_id} for _, user_id, change in changes]},
+                room,
+                {sid for sid, _, _ in changes},
+            )
+
+    async def _flush_cursors(self, room: str):
+        async with self._room_lock(room):
+            cursors = self._cursors.pop(room, None)
+            if not cursors:
+                return
+            await self._emit(
+                'cursor_updates',
+                {'cursors': [{'userId': user_id, 'position': position} for user_id, (_, position) in cursors.items()]},
+                room,
+                {sid for sid, _ in cursors.values()},
+            )
+
+    async def _emit(self, event: str, data: Dict[str, Any], room: str, senders: set):
+        skip_sid = next(iter(senders)) if len(senders) == 1 else None
+        recipients = self._room_size(room) - (1 if skip_sid else 0)
+
+        self.messages_out += 1
+        self.deliveries += max(recipients, 0)
+        try:
+            await self.sio.emit(event, data, room=encoding_room(room, 'json'), skip_sid=skip_sid)
+            if self.codec is not None and self.codec.enabled:
+                payload = self.codec.encode(event, data)
+                await self.sio.emit(event, payload, room=encoding_room(room, 'msgpack'), skip_sid=skip_sid)
+        except Exception as e:
+            logger.error(f"Failed to flush {event} to room {room}: {e}")
+
+    def _count_in(self, room: str):
+        self.events_in += 1
+        self.deliveries_uncoalesced += max(self._room_size(room) - 1, 0)
+
+    def _room_size(self, room: str) -> int:
+        return sum(1 for _ in self.sio.manager.get_participants('/', room))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Room flush failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._early_flushes:
+            await asyncio.gather(*self._early_flushes, return_exceptions=True)
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of this process"""
+        return {
+            'tick_ms': round(self.tick * 1000),
+            'events_in': self.events_in,
+            'messages_out': self.messages_out,
+            'deliveries': self.deliveries,
+            'deliveries_uncoalesced': self.deliveries_uncoalesced,
+            'pending_rooms': len(self._cursors) + len(self._changes),
+        }
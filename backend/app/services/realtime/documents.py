@@ -0,0 +1,414 @@
+"""
+Collaborative Documents - Authoritative template content for editing rooms
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+import asyncio
+import copy
+import json
+import logging
+import uuid
+
+import jsonpatch
+import jsonpointer
+from redis.exceptions import WatchError
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.redis import get_redis
+from app.models.template import Template
+from app.services.cache.export_cache import export_cache
+from app.services.cache.template_cache import template_cache
+from app.services.versioning.version_store import VersionStore, snapshot_document
+
+logger = logging.getLogger(__name__)
+
+# Attempts to append an operation while other workers keep appending
+MAX_APPEND_ATTEMPTS = 10
+
+
+@dataclass
+class RoomDocument:
+    """Content of a template as of operation seq"""
+    template_id: str
+    content: Dict[str, Any]
+    seq: int
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), default=str)
+
+
+class CollaborativeDocuments:
+    """
+    Documentos colaborativos con registro de operaciones
+
+    Editors send RFC 6902 JSON Patch operations against Template.content.
+    The sequence counter, the operation log and the last compacted snapshot
+    live in Redis under collab:{id}:*, so every worker serving the room sees
+    one total order: an operation is appended only if the log is still at
+    the sequence the worker applied it to (WATCH/MULTI), otherwise the
+    worker catches up and retries. Each worker keeps the current content of
+    its active rooms in memory.
+
+    Every flush interval the content is written to Template.content as a
+    new version and the log is compacted into the snapshot, so the
+    database sees one write per room and interval instead of one per
+    keystroke. Joiners get the snapshot plus the operations since.
+    """
+
+    def __init__(self, flush_interval: float, state_ttl: int, prefix: str = 'collab'):
+        self.flush_interval = flush_interval
+        self.state_ttl = state_ttl
+        self.prefix = prefix
+        self._documents: Dict[str, RoomDocument] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.ops_applied = 0
+        self.flushes = 0
+
+    def _key(self, template_id: str, name: str) -> str:
+        return f"{self.prefix}:{template_id}:{name}"
+
+    # ========================================================================
+    # OPERATIONS
+    # ========================================================================
+
+    async def can_edit(self, template_id: str, user_id: Any) -> bool:
+        """Whether a user owns the template, and may therefore join its room"""
+        try:
+            template_uuid = UUID(str(template_id))
+        except ValueError:
+            return False
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Template.owner_id).where(Template.id == template_uuid))
+            owner_id = result.scalar_one_or_none()
+        return owner_id is not None and str(owner_id) == str(user_id)
+
+    async def join_state(self, template_id: str) -> Dict[str, Any]:
+        """
+        Snapshot and operations since, for an editor joining the room
+
+        Raises:
+            LookupError: If the template does not exist
+        """
+        snapshot = await self._snapshot(template_id)
+        await self._document(template_id, snapshot)
+        ops = await self._ops_since(template_id, snapshot['seq'])
+        return {'seq': snapshot['seq'], 'content': snapshot['content'], 'ops': ops}
+
+    async def apply(self, template_id: str, ops: List[Dict[str, Any]], user_id: Any) -> int:
+        """
+        Apply JSON Patch operations and append them to the log
+
+        Returns:
+            Sequence number assigned to the operations
+
+        Raises:
+            LookupError: If the template does not exist
+            ValueError: If the operations do not apply to the current content
+        """
+        if not isinstance(ops, list) or not ops:
+            raise ValueError("change must be a non-empty list of JSON Patch operations")
+
+        document = await self._document(template_id)
+        async with document.lock:
+            for _ in range(MAX_APPEND_ATTEMPTS):
+                await self._catch_up(document)
+                try:
+                    content = jsonpatch.apply_patch(document.content, ops)
+                except (jsonpatch.JsonPatchException, jsonpointer.JsonPointerException) as e:
+                    raise ValueError(str(e))
+
+                entry = {'seq': document.seq + 1, 'ops': ops, 'userId': user_id}
+                if await self._append(template_id, document.seq, entry):
+                    document.content = content
+                    document.seq += 1
+                    self.ops_applied += 1
+                    return document.seq
+
+        raise ValueError("Room is too busy, retry")
+
+    async def current_seq(self, template_id: str) -> int:
+        """Latest sequence number of a room"""
+        return int(await get_redis().get(self._key(template_id, 'seq')) or 0)
+
+    async def release(self, template_id: str):
+        """Flush a room nobody on this worker is editing and forget it"""
+        document = self._documents.get(template_id)
+        if document is None:
+            return
+        await self.flush_room(document)
+        self._documents.pop(template_id, None)
+
+    # ========================================================================
+    # FLUSHING
+    # ========================================================================
+
+    async def flush_room(self, document: RoomDocument):
+        """Persist a room's content and compact its log"""
+        redis = get_redis()
+        lock_key = self._key(document.template_id, 'flush')
+        # One worker flushes a room at a time; the token tells our lock
+        # from one taken by another worker after ours expired
+        token = uuid.uuid4().hex
+        if not await redis.set(lock_key, token, nx=True, ex=60):
+            return
+
+        try:
+            async with document.lock:
+                await self._catch_up(document)
+                snapshot = await self._stored_snapshot(document.template_id)
+                if snapshot is not None and document.seq <= snapshot['seq']:
+                    return
+                content = copy.deepcopy(document.content)
+                seq = document.seq
+
+            version = await self._persist(document.template_id, content)
+            if version is None:
+                # Template deleted while being edited
+                await self._drop(document.template_id)
+                return
+
+            await redis.set(self._key(document.template_id, 'snapshot'), _dumps({
+                'seq': seq, 'version': version, 'content': content,
+            }), ex=self.state_ttl)
+            await self._compact(document.template_id, seq)
+            self.flushes += 1
+        finally:
+            await self._release_lock(lock_key, token)
+
+    async def _release_lock(self, lock_key: str, token: str):
+        """Delete a lock only while it still holds our token"""
+        async with get_redis().pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(lock_key)
+                if await pipe.get(lock_key) != token.encode():
+                    return
+                pipe.multi()
+                pipe.delete(lock_key)
+                await pipe.execute()
+            except WatchError:
+                # Expired and taken by another worker meanwhile
+                pass
+
+    async def _persist(self, template_id: str, content: Dict[str, Any]) -> Optional[int]:
+        """
+        Write content to the template as a new version
+
+        Collaborative edits win over REST writes made meanwhile (as with a
+        plain PUT); those stay in the version history.
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Template).where(Template.id == UUID(template_id)).with_for_update()
+            )
+            template = result.scalar_one_or_none()
+            if template is None:
+                return None
+            if template.content == content:
+                return template.version
+
+            previous = snapshot_document(template)
+            template.content = content
+            template.version += 1
+            await VersionStore(db).record(template, previous, template.owner_id, "Collaborative editing")
+            await db.commit()
+            version = template.version
+
+        export_cache.invalidate(template.id)
+        await template_cache.invalidate(template.id, template.version)
+        return version
+
+    async def flush(self):
+        """Flush every room active on this worker"""
+        for document in list(self._documents.values()):
+            try:
+                await self.flush_room(document)
+            except Exception as e:
+                logger.error(f"Flush of room {document.template_id} failed: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    # ========================================================================
+    # STATE
+    # ========================================================================
+
+    async def _document(self, template_id: str, snapshot: Optional[Dict[str, Any]] = None) -> RoomDocument:
+        document = self._documents.get(template_id)
+        if document is not None:
+            return document
+
+        snapshot = snapshot or await self._snapshot(template_id)
+        return self._documents.setdefault(
+            template_id,
+            RoomDocument(template_id, snapshot['content'], snapshot['seq']),
+        )
+
+    async def _stored_snapshot(self, template_id: str) -> Optional[Dict[str, Any]]:
+        data = await get_redis().get(self._key(template_id, 'snapshot'))
+        return json.loads(data) if data is not None else None
+
+    async def _snapshot(self, template_id: str) -> Dict[str, Any]:
+        """Compacted state in Redis, created from the database when missing or stale"""
+        redis = get_redis()
+        snapshot = await self._stored_snapshot(template_id)
+        seq = int(await redis.get(self._key(template_id, 'seq')) or 0)
+        if snapshot is not None and seq > snapshot['seq']:
+            # Unflushed operations: the room's state is authoritative
+            return snapshot
+
+        try:
+            template_uuid = UUID(str(template_id))
+        except ValueError:
+            raise LookupError("Template not found")
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Template.content, Template.version).where(Template.id == template_uuid)
+            )
+            row = result.one_or_none()
+        if row is None:
+            raise LookupError("Template not found")
+
+        content, version = row
+        if snapshot is not None and snapshot['version'] == version:
+            return snapshot
+
+        if snapshot is None:
+            # First editor of the template
+            snapshot = {'seq': seq, 'version': version, 'content': content}
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.set(self._key(template_id, 'snapshot'), _dumps(snapshot), ex=self.state_ttl, nx=True)
+                pipe.set(self._key(template_id, 'seq'), seq, ex=self.state_ttl, nx=True)
+                await pipe.execute()
+            return await self._stored_snapshot(template_id) or snapshot
+
+        # Changed through the API since the last flush: replace the content
+        # through the log so workers holding the room catch up too
+        entry = {'seq': seq + 1, 'ops': [{'op': 'replace', 'path': '', 'value': content}], 'userId': None}
+        if not await self._append(template_id, seq, entry):
+            return await self._stored_snapshot(template_id) or snapshot
+
+        snapshot = {'seq': seq + 1, 'version': version, 'content': content}
+        await redis.set(self._key(template_id, 'snapshot'), _dumps(snapshot), ex=self.state_ttl)
+        await self._compact(template_id, seq + 1)
+        return snapshot
+
+    async def _append(self, template_id: str, expected_seq: int, entry: Dict[str, Any]) -> bool:
+        """Append an entry if the log is still at expected_seq"""
+        seq_key = self._key(template_id, 'seq')
+        ops_key = self._key(template_id, 'ops')
+        async with get_redis().pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(seq_key)
+                if int(await pipe.get(seq_key) or 0) != expected_seq:
+                    return False
+                pipe.multi()
+                pipe.rpush(ops_key, _dumps(entry))
+                pipe.set(seq_key, expected_seq + 1, ex=self.state_ttl)
+                pipe.expire(ops_key, self.state_ttl)
+                await pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    async def _catch_up(self, document: RoomDocument):
+        """Apply operations other workers appended since document.seq"""
+        seq = await self.current_seq(document.template_id)
+        if seq <= document.seq:
+            return
+
+        entries = await self._ops_since(document.template_id, document.seq)
+        if not entries or entries[0]['seq'] != document.seq + 1:
+            # Compacted past our state: restart from the snapshot
+            snapshot = await self._snapshot(document.template_id)
+            document.content, document.seq = snapshot['content'], snapshot['seq']
+            entries = await self._ops_since(document.template_id, document.seq)
+
+        for entry in entries:
+            document.content = jsonpatch.apply_patch(document.content, entry['ops'])
+            document.seq = entry['seq']
+
+    async def _head_seq(self, redis, ops_key: str) -> Optional[int]:
+        head = await redis.lindex(ops_key, 0)
+        return json.loads(head)['seq'] if head is not None else None
+
+    async def _ops_since(self, template_id: str, seq: int) -> List[Dict[str, Any]]:
+        """
+        Log entries after seq
+
+        Entries have consecutive seqs, so the one after seq sits at a known
+        offset from the head and only the tail from there is read. The head
+        is read again with the tail, atomically; if a compaction moved it
+        in between, the offset is recomputed.
+        """
+        ops_key = self._key(template_id, 'ops')
+        first = await self._head_seq(get_redis(), ops_key)
+        while first is not None:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                pipe.lindex(ops_key, 0)
+                pipe.lrange(ops_key, max(seq + 1 - first, 0), -1)
+                head, entries = await pipe.execute()
+            if head is None:
+                break
+            head_seq = json.loads(head)['seq']
+            if head_seq == first:
+                return [json.loads(raw) for raw in entries]
+            first = head_seq
+        return []
+
+    async def _compact(self, template_id: str, seq: int):
+        """Drop log entries included in the snapshot at seq"""
+        ops_key = self._key(template_id, 'ops')
+        async with get_redis().pipeline(transaction=True) as pipe:
+            for _ in range(MAX_APPEND_ATTEMPTS):
+                try:
+                    await pipe.watch(ops_key)
+                    first = await self._head_seq(pipe, ops_key)
+                    if first is None or first > seq:
+                        return
+                    # Only the head is trimmed, by its distance to seq
+                    pipe.multi()
+                    pipe.ltrim(ops_key, seq - first + 1, -1)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    # Appended or compacted meanwhile; the next flush retries
+                    continue
+
+    async def _drop(self, template_id: str):
+        self._documents.pop(template_id, None)
+        await get_redis().delete(*(self._key(template_id, name) for name in ('snapshot', 'seq', 'ops')))
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of this process"""
+        return {
+            'rooms': len(self._documents),
+            'ops_applied': self.ops_applied,
+            'flushes': self.flushes,
+        }
+
+
+collab_documents = CollaborativeDocuments(settings.COLLAB_FLUSH_INTERVAL, settings.COLLAB_STATE_TTL)
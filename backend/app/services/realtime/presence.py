@@ -0,0 +1,120 @@
+"""
+Room Presence - Editors connected to each template room, shared through Redis
+"""
+
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import time
+import uuid
+import logging
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class RoomPresence:
+    """
+    Presencia de editores por sala en Redis
+
+    Each room is a hash of sid -> member under presence:{room}, written by
+    whichever worker holds the connection. Workers refresh a heartbeat key
+    while alive; members of a worker whose heartbeat expired (a crashed
+    process never runs its disconnect handlers) are pruned on read.
+    Redis errors are logged and presence degrades to empty lists.
+    """
+
+    def __init__(self, ttl: int, prefix: str = 'presence'):
+        self.ttl = ttl
+        self.prefix = prefix
+        self.worker_id = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+    def _room_key(self, room: str) -> str:
+        return f"{self.prefix}:{room}"
+
+    def _worker_key(self, worker_id: str) -> str:
+        return f"{self.prefix}:worker:{worker_id}"
+
+    async def join(self, room: str, sid: str, user_id: Any, username: str):
+        member = json.dumps({
+            'userId': user_id,
+            'username': username,
+            'worker': self.worker_id,
+            'joinedAt': time.time(),
+        }, default=str)
+        try:
+            await get_redis().hset(self._room_key(room), sid, member)
+        except RedisError as e:
+            logger.warning(f"Presence join failed for room {room}: {e}")
+
+    async def leave(self, room: str, sid: str):
+        try:
+            await get_redis().hdel(self._room_key(room), sid)
+        except RedisError as e:
+            logger.warning(f"Presence leave failed for room {room}: {e}")
+
+    async def members(self, room: str) -> List[Dict[str, Any]]:
+        """Editors in a room across all workers, one entry per user"""
+        redis = get_redis()
+        try:
+            entries = await redis.hgetall(self._room_key(room))
+            if not entries:
+                return []
+
+            members = {sid.decode() if isinstance(sid, bytes) else sid: json.loads(value) for sid, value in entries.items()}
+            workers = sorted({m['worker'] for m in members.values()})
+            alive = await redis.mget([self._worker_key(w) for w in workers])
+            dead = {w for w, flag in zip(workers, alive) if flag is None}
+
+            stale = [sid for sid, m in members.items() if m['worker'] in dead]
+            if stale:
+                await redis.hdel(self._room_key(room), *stale)
+        except RedisError as e:
+            logger.warning(f"Presence lookup failed for room {room}: {e}")
+            return []
+
+        users: Dict[Any, Dict[str, Any]] = {}
+        for sid, member in members.items():
+            if member['worker'] not in dead:
+                users.setdefault(member['userId'], {'userId': member['userId'], 'username': member['username']})
+        return list(users.values())
+
+    async def count(self, room: str) -> int:
+        """Connections in a room across all workers"""
+        try:
+            return await get_redis().hlen(self._room_key(room))
+        except RedisError:
+            return 0
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await get_redis().set(self._worker_key(self.worker_id), 1, ex=self.ttl)
+            except RedisError as e:
+                logger.warning(f"Presence heartbeat failed: {e}")
+            await asyncio.sleep(self.ttl / 3)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await get_redis().delete(self._worker_key(self.worker_id))
+        except RedisError:
+            pass
+
+
+room_presence = RoomPresence(settings.WEBSOCKET_PRESENCE_TTL)
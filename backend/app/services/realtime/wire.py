@@ -0,0 +1,193 @@
+"""
+Wire Format - Compact MessagePack encoding of collaboration batches
+"""
+
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ENCODINGS = ('json', 'msgpack')
+
+WIRE_VERSION = 1
+
+# JSON Patch operations by opcode
+OPCODES = ('add', 'remove', 'replace', 'move', 'copy', 'test')
+OPCODE_INDEX = {name: index for index, name in enumerate(OPCODES)}
+
+# Keys whose string values are replaced by references into the string table
+ID_KEYS = frozenset(('id', 'elementId', 'userId', 'selectedIds'))
+
+# MessagePack extension type of a string table reference inside values
+REF_EXT = 1
+
+
+def _load_msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        logger.warning("msgpack is not installed; Socket.IO connections use JSON")
+        return None
+    return msgpack
+
+
+def encoding_room(room: str, encoding: str) -> str:
+    """Sub-room of the connections in a room that use an encoding"""
+    return f"{room}:{encoding}"
+
+
+def is_encoding_room(room: str) -> bool:
+    return room.rpartition(':')[2] in ENCODINGS
+
+
+class _StringTable:
+    """Strings of one message, each sent once and referenced by index"""
+
+    def __init__(self):
+        self.strings: List[Any] = []
+        self._index: Dict[Any, int] = {}
+
+    def ref(self, value: Any) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+
+class WireCodec:
+    """
+    Codificador binario de eventos de colaboración
+
+    Connections that negotiate 'msgpack' receive 'cursor_updates' and
+    'template_changes' batches as one binary attachment:
+
+        [version, strings, body]
+
+    strings holds every user id, JSON Pointer and element id of the batch
+    once; the body refers to them by index. Cursor batches are
+    [[user, x, y(, extra)], ...] with x and y quantized to integer
+    multiples of the cursor precision; change batches are
+    [[user, seq, [[opcode, path(, value | from)], ...]], ...] with opcodes
+    indexing OPCODES. Inside values, strings under ID_KEYS become
+    ExtType(REF_EXT, packed index).
+
+    Incoming 'template_change' and 'cursor_move' events may be packed
+    maps with the JSON field names; a packed cursor position is [x, y]
+    in quantized units.
+    """
+
+    def __init__(self, precision: float, enabled: bool = True):
+        self.precision = precision
+        self._msgpack = _load_msgpack() if enabled else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._msgpack is not None
+
+    def negotiate(self, environ: Dict[str, Any], auth: Any) -> str:
+        """Encoding requested in the connect auth payload or the ?encoding= query"""
+        requested = auth.get('encoding') if isinstance(auth, dict) else None
+        if requested is None:
+            requested = parse_qs(environ.get('QUERY_STRING', '')).get('encoding', [None])[0]
+
+        if requested == 'msgpack' and self.enabled:
+            return 'msgpack'
+        return 'json'
+
+    def describe(self, encoding: str) -> Dict[str, Any]:
+        """Wire parameters a client needs to decode its batches"""
+        if encoding != 'msgpack':
+            return {'encoding': 'json'}
+        return {'encoding': 'msgpack', 'version': WIRE_VERSION, 'cursorPrecision': self.precision}
+
+    # ========================================================================
+    # ENCODING
+    # ========================================================================
+
+    def encode(self, event: str, data: Dict[str, Any]) -> bytes:
+        """
+        Pack a coalesced batch
+
+        Raises:
+            ValueError: If the event is not a batch event
+        """
+        table = _StringTable()
+        if event == 'cursor_updates':
+            body = [self._cursor(cursor, table) for cursor in data['cursors']]
+        elif event == 'template_changes':
+            body = [
+                [table.ref(entry['userId']), entry['change']['seq'], [self._op(op, table) for op in entry['change']['ops']]]
+                for entry in data['changes']
+            ]
+        else:
+            raise ValueError(f"No binary encoding for event {event}")
+
+        return self._msgpack.packb([WIRE_VERSION, table.strings, body], use_bin_type=True)
+
+    def quantize(self, value: float) -> int:
+        return int(round(value / self.precision))
+
+    def _cursor(self, cursor: Dict[str, Any], table: _StringTable) -> List[Any]:
+        user = table.ref(cursor['userId'])
+        position = cursor['position']
+        if not isinstance(position, dict) or not all(
+            isinstance(position.get(axis), (int, float)) for axis in ('x', 'y')
+        ):
+            return [user, None, None, position]
+
+        packed = [user, self.quantize(position['x']), self.quantize(position['y'])]
+        extra = {k: v for k, v in position.items() if k not in ('x', 'y')}
+        if extra:
+            packed.append(self._value(extra, table))
+        return packed
+
+    def _op(self, op: Dict[str, Any], table: _StringTable) -> List[Any]:
+        packed = [OPCODE_INDEX[op['op']], table.ref(op['path'])]
+        if op['op'] in ('move', 'copy'):
+            packed.append(table.ref(op['from']))
+        elif op['op'] != 'remove':
+            packed.append(self._value(op['value'], table))
+        return packed
+
+    def _value(self, value: Any, table: _StringTable, interned: bool = False) -> Any:
+        if isinstance(value, dict):
+            return {k: self._value(v, table, k in ID_KEYS) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._value(v, table, interned) for v in value]
+        if interned and isinstance(value, str):
+            return self._msgpack.ExtType(REF_EXT, self._msgpack.packb(table.ref(value)))
+        return value
+
+    # ========================================================================
+    # DECODING
+    # ========================================================================
+
+    def decode(self, payload: bytes) -> Dict[str, Any]:
+        """
+        Unpack an incoming event payload
+
+        Raises:
+            ValueError: If msgpack is disabled or the payload is not a packed map
+        """
+        if not self.enabled:
+            raise ValueError("Binary payloads are not supported")
+        try:
+            data = self._msgpack.unpackb(payload, raw=False)
+        except Exception:
+            raise ValueError("Invalid msgpack payload")
+        if not isinstance(data, dict):
+            raise ValueError("Payload must be a map")
+        return data
+
+    def dequantize(self, position: Any) -> Optional[Any]:
+        """Cursor position sent as quantized [x, y] back in template units"""
+        if isinstance(position, (list, tuple)) and len(position) == 2 and all(isinstance(v, int) for v in position):
+            return {'x': round(position[0] * self.precision, 6), 'y': round(position[1] * self.precision, 6)}
+        return position
+
+
+wire_codec = WireCodec(settings.WEBSOCKET_CURSOR_PRECISION, settings.WEBSOCKET_MSGPACK)
@@ -0,0 +1,155 @@
+"""
+Compiled Templates - Resolve stored templates to render-ready form
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+import json
+import threading
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import cache_lookup
+from app.models.template import Template, TemplateType
+from app.services.cache.template_cache import template_cache
+from app.services.rendering.pdf_renderer import compile_template
+from app.services.versioning.version_store import VersionStore
+
+logger = logging.getLogger(__name__)
+
+# template_cache kind for compiled PDF templates
+COMPILED_KIND = 'pdf-compiled'
+
+
+class CompiledTemplateStore:
+    """
+    Almacén de plantillas compiladas por (id, versión)
+
+    Lookups go through a per-process LRU, then the shared Redis cache,
+    then the database (the version history for past versions). Compiled
+    templates are immutable per version, so entries never need
+    invalidation; they only age out.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[Hashable, int], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def resolve(
+        self,
+        db: AsyncSession,
+        template_id: Any,
+        owner_id: Any,
+        version: Optional[int] = None,
+    ) -> Tuple[int, int]:
+        """
+        Check access to a PDF template and resolve the version to render
+
+        Args:
+            db: Database session
+            template_id: Template to render
+            owner_id: Owner the template must belong to
+            version: Version to render (current when omitted)
+
+        Returns:
+            (version to render, current version)
+
+        Raises:
+            LookupError: If the template or version does not exist
+            ValueError: If the template is not a renderable PDF template
+        """
+        result = await db.execute(
+            select(Template.version, Template.type).where(
+                Template.id == template_id,
+                Template.owner_id == owner_id
+            )
+        )
+        row = result.one_or_none()
+        if row is None:
+            raise LookupError("Template not found")
+
+        current_version, template_type = row
+        if template_type != TemplateType.PDF:
+            raise ValueError("Only PDF templates can be rendered to PDF")
+
+        version = version or current_version
+        if version > current_version:
+            raise LookupError(f"Version {version} not found")
+
+        return version, current_version
+
+    async def get(
+        self,
+        db: AsyncSession,
+        template_id: Any,
+        version: int,
+        current_version: int,
+    ) -> Dict[str, Any]:
+        """
+        Compiled template of a version returned by resolve()
+
+        Raises:
+            LookupError: If the version is not in the history
+        """
+        key = (template_id, version)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                cache_lookup('compiled_template', True)
+                return compiled
+            self.misses += 1
+            cache_lookup('compiled_template', False)
+
+        cached = await template_cache.get_compiled(template_id, version, COMPILED_KIND)
+        if cached is not None:
+            compiled = json.loads(cached)
+        else:
+            compiled = compile_template(await self._load_content(db, template_id, version, current_version))
+            await template_cache.set_compiled(
+                template_id, version, COMPILED_KIND,
+                json.dumps(compiled, separators=(',', ':')).encode('utf-8'),
+            )
+
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return compiled
+
+    async def _load_content(self, db: AsyncSession, template_id: Any, version: int, current_version: int) -> Dict[str, Any]:
+        if version == current_version:
+            result = await db.execute(
+                select(Template.content, Template.version).where(Template.id == template_id)
+            )
+            content, loaded_version = result.one()
+            if loaded_version == version:
+                return content
+            # Updated since the version lookup; the history has the requested version
+
+        try:
+            document = await VersionStore(db).materialize(template_id, version)
+        except ValueError as e:
+            raise LookupError(str(e))
+        return document['content']
+
+    def invalidate(self, template_id: Any):
+        """Drop the compiled versions of a deleted template"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == template_id]:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+compiled_templates = CompiledTemplateStore(settings.COMPILED_TEMPLATE_CACHE_SIZE)
@@ -7,6 +7,8 @@ from jinja2 import Template
 from premailer import transform
 import logging
 
+from app.core.metrics import EMAIL_RENDER_SECONDS
+
 logger = logging.getLogger(__name__)
 
 
@@ -18,6 +20,7 @@ class EmailRenderer:
     def __init__(self):
         self.variables_data = {}
 
+    @EMAIL_RENDER_SECONDS.labels('total').time()
     def render(self, template_data: Dict[str, Any], data: Dict[str, Any] = None) -> Dict[str, str]:
         """
         Render template to email HTML
@@ -38,7 +41,8 @@ class EmailRenderer:
         html = self._create_email_html(html_body, template_data)
 
         # Inline CSS for email compatibility
-        html_with_inline_css = transform(html)
+        with EMAIL_RENDER_SECONDS.labels('inline_css').time():
+            html_with_inline_css = transform(html)
 
         # Apply email compatibility fixes
         compatible_html = self._apply_email_fixes(html_with_inline_css)
@@ -2,11 +2,16 @@
 PDF Renderer - Render templates to PDF using ReportLab
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from io import BytesIO
+import hashlib
+import math
+import zlib
 import logging
 
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfdoc
+from reportlab.lib.utils import ImageReader
 from reportlab.lib.pagesizes import A4, letter, legal
 from reportlab.lib.units import mm, inch
 from reportlab.lib.colors import Color, black, white
@@ -20,10 +25,69 @@ import qrcode
 import barcode
 from barcode.writer import ImageWriter
 
+from app.core.config import settings
+from app.core.metrics import PDF_ASSET_SECONDS, PDF_ELEMENT_SECONDS, PDF_PAGE_SECONDS, PDF_RENDER_SECONDS
+from app.services.storage.variants import resolve_image
 from app.services.xml.xml_parser import XMLParser
 
 logger = logging.getLogger(__name__)
 
+IMAGE_FORMATS = ('auto', 'jpeg', 'flate')
+
+
+class _LevelZCompress(pdfdoc.PDFStreamFilterZCompress):
+    """FlateDecode filter with a configurable zlib level that records sizes"""
+
+    def __init__(self, level: int, stats: Dict[str, int]):
+        self.level = level
+        self.stats = stats
+
+    def encode(self, text):
+        if isinstance(text, str):
+            text = text.encode('utf8')
+        encoded = zlib.compress(text, self.level)
+        self.stats['page_bytes_raw'] += len(text)
+        self.stats['page_bytes_compressed'] += len(encoded)
+        return encoded
+
+
+class _OptimizedCanvas(canvas.Canvas):
+    """Canvas whose page streams use a _LevelZCompress filter"""
+
+    def __init__(self, *args, page_filter: Optional[_LevelZCompress] = None, **kwargs):
+        self._page_filter = page_filter
+        super().__init__(*args, **kwargs)
+
+    def showPage(self):
+        super().showPage()
+
+        page = self._doc.Pages.pages[-1]
+        if self._page_filter is not None and page.compression and not page.Contents:
+            stream = pdfdoc.PDFStream(content=page.stream, filters=[self._page_filter])
+            stream.__Comment__ = "page stream"
+            page.Contents = stream
+
+
+def compile_template(template: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Prepare parsed template content for rendering
+
+    Validates the pages and sorts each page's elements by z-index once, so
+    the result can be cached and rendered many times without re-parsing.
+
+    Raises:
+        ValueError: If the template has no pages
+    """
+    if not template.get('pages'):
+        raise ValueError("No pages found in template")
+
+    pages = []
+    for page in template['pages']:
+        elements = sorted(page.get('elements', []), key=lambda e: e.get('z_index', 0))
+        pages.append({**page, 'elements': elements})
+
+    return {**template, 'pages': pages}
+
 
 class PDFRenderer:
     """
@@ -51,8 +115,26 @@ class PDFRenderer:
             PDF bytes
         """
         # Parse XML
-        template = self.parser.parse(xml_string)
+        template = compile_template(self.parser.parse(xml_string))
 
+        return self.render_compiled(template, data, options)
+
+    @PDF_RENDER_SECONDS.time()
+    def render_compiled(self, template: Dict[str, Any], data: Dict[str, Any] = None, options: Dict[str, Any] = None) -> bytes:
+        """
+        Render a template prepared by compile_template() to PDF
+
+        The template is only read, so one compiled template can be shared
+        by concurrent renders.
+
+        Args:
+            template: Compiled template
+            data: Variable data for placeholders
+            options: Rendering options (dpi, page_size, etc.)
+
+        Returns:
+            PDF bytes
+        """
         # Store variable data
         self.variables_data = data or {}
 
@@ -60,19 +142,52 @@ class PDFRenderer:
         options = options or {}
         self.dpi = options.get('dpi', 300)
 
+        # Deterministic output: identical inputs produce identical bytes
+        deterministic = options.get('deterministic', settings.PDF_DETERMINISTIC)
+
+        # Size options
+        try:
+            compression = int(options.get('compression', settings.PDF_COMPRESSION_LEVEL))
+            self.image_quality = int(options.get('image_quality', settings.PDF_IMAGE_QUALITY))
+        except (TypeError, ValueError):
+            raise ValueError("compression and image_quality must be integers")
+        self.recompress_images = options.get('recompress_images', settings.PDF_RECOMPRESS_IMAGES)
+        self.image_format = options.get('image_format', 'auto')
+        if not 0 <= compression <= 9:
+            raise ValueError("compression must be between 0 and 9")
+        if not 1 <= self.image_quality <= 95:
+            raise ValueError("image_quality must be between 1 and 95")
+        if self.image_format not in IMAGE_FORMATS:
+            raise ValueError(f"image_format must be one of {', '.join(IMAGE_FORMATS)}")
+
+        self._images: Dict[Tuple, Tuple[ImageReader, int]] = {}
+        self._barcodes: Dict[Tuple[str, str], bytes] = {}
+        self.stats = {
+            'images_drawn': 0,
+            'images_embedded': 0,
+            'image_bytes_source': 0,
+            'image_bytes_embedded': 0,
+            'image_bytes_reused': 0,
+            'page_bytes_raw': 0,
+            'page_bytes_compressed': 0,
+        }
+
         # Create PDF buffer
         buffer = BytesIO()
 
-        # Get first page to determine size
-        if not template.get('pages'):
-            raise ValueError("No pages found in template")
-
         first_page = template['pages'][0]
         self.page_width = self._convert_units(first_page.get('width', 0.21590))  # Default A4 width
         self.page_height = self._convert_units(first_page.get('height', 0.27940))  # Default A4 height
 
-        # Create canvas
-        self.canvas = canvas.Canvas(buffer, pagesize=(self.page_width, self.page_height))
+        # Create canvas; invariant mode fixes the creation date and document ID
+        self.canvas = _OptimizedCanvas(
+            buffer,
+            pagesize=(self.page_width, self.page_height),
+            invariant=1 if deterministic else 0,
+            pageCompression=1 if compression else 0,
+            page_filter=_LevelZCompress(compression, self.stats) if compression else None,
+        )
+        self._set_metadata(template)
 
         # Store styles
         self.styles = template.get('styles', {})
@@ -91,8 +206,22 @@ class PDFRenderer:
         pdf_bytes = buffer.getvalue()
         buffer.close()
 
+        self.stats['pdf_bytes'] = len(pdf_bytes)
+        self.stats['bytes_saved'] = (
+            self.stats['image_bytes_source'] - self.stats['image_bytes_embedded']
+            + self.stats['image_bytes_reused']
+            + self.stats['page_bytes_raw'] - self.stats['page_bytes_compressed']
+        )
+
         return pdf_bytes
 
+    def _set_metadata(self, template: Dict[str, Any]):
+        """Set document metadata from the template only, never from the clock or host"""
+        self.canvas.setTitle(template.get('layout_name') or '')
+        self.canvas.setCreator(settings.APP_NAME)
+        self.canvas.setProducer(f"{settings.APP_NAME} {settings.APP_VERSION}")
+
+    @PDF_PAGE_SECONDS.time()
     def _render_page(self, page: Dict[str, Any]):
         """Render a single page"""
         logger.info(f"Rendering page: {page.get('name')}")
@@ -103,13 +232,8 @@ class PDFRenderer:
 
         self.canvas.setPageSize((page_width, page_height))
 
-        # Render all elements on the page
-        elements = page.get('elements', [])
-
-        # Sort by z-index if available
-        elements.sort(key=lambda e: e.get('z_index', 0))
-
-        for element in elements:
+        # Elements are already in z-index order (see compile_template)
+        for element in page.get('elements', []):
             try:
                 self._render_element(element)
             except Exception as e:
@@ -122,18 +246,20 @@ class PDFRenderer:
         """Render a single element"""
         element_type = element.get('type')
 
-        if element_type == 'FlowArea':
-            self._render_flow_area(element)
-        elif element_type == 'ImageObject':
-            self._render_image(element)
-        elif element_type == 'PathObject':
-            self._render_path(element)
-        elif element_type == 'Barcode':
-            self._render_barcode(element)
-        elif element_type == 'Chart':
-            self._render_chart(element)
-        else:
+        renderers = {
+            'FlowArea': self._render_flow_area,
+            'ImageObject': self._render_image,
+            'PathObject': self._render_path,
+            'Barcode': self._render_barcode,
+            'Chart': self._render_chart,
+        }
+        render = renderers.get(element_type)
+        if render is None:
             logger.warning(f"Unknown element type: {element_type}")
+            return
+
+        with PDF_ELEMENT_SECONDS.labels(element_type).time():
+            render(element)
 
     def _render_flow_area(self, element: Dict[str, Any]):
         """Render FlowArea (text content)"""
@@ -229,7 +355,7 @@ class PDFRenderer:
         try:
             # Draw image
             self.canvas.drawImage(
-                image_path,
+                self._load_image(image_path, width, height),
                 x, y,
                 width=width,
                 height=height,
@@ -314,26 +440,9 @@ class PDFRenderer:
 
         try:
             if barcode_type == 'QR':
-                # Generate QR code
-                qr = qrcode.QRCode(
-                    version=1,
-                    error_correction=qrcode.constants.ERROR_CORRECT_M,
-                    box_size=10,
-                    border=4,
-                )
-                qr.add_data(str(data))
-                qr.make(fit=True)
-
-                img = qr.make_image(fill_color="black", back_color="white")
-
-                # Save to buffer
-                buffer = BytesIO()
-                img.save(buffer, format='PNG')
-                buffer.seek(0)
-
                 # Draw QR code
                 self.canvas.drawImage(
-                    buffer,
+                    self._barcode_image(barcode_type, str(data), lambda: self._make_qr(data)),
                     x, y,
                     width=width,
                     height=height,
@@ -341,17 +450,9 @@ class PDFRenderer:
                 )
 
             else:
-                # Generate barcode
-                barcode_class = barcode.get_barcode_class(barcode_type.lower())
-                barcode_instance = barcode_class(str(data), writer=ImageWriter())
-
-                buffer = BytesIO()
-                barcode_instance.write(buffer)
-                buffer.seek(0)
-
                 # Draw barcode
                 self.canvas.drawImage(
-                    buffer,
+                    self._barcode_image(barcode_type, str(data), lambda: self._make_barcode(barcode_type, data)),
                     x, y,
                     width=width,
                     height=height,
@@ -364,6 +465,123 @@ class PDFRenderer:
             self.canvas.setStrokeColorRGB(0.5, 0.5, 0.5)
             self.canvas.rect(x, y, width, height)
 
+    def _make_qr(self, data: Any) -> bytes:
+        """QR code as PNG bytes"""
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_M,
+            box_size=10,
+            border=4,
+        )
+        qr.add_data(str(data))
+        qr.make(fit=True)
+
+        img = qr.make_image(fill_color="black", back_color="white")
+
+        buffer = BytesIO()
+        img.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def _make_barcode(self, barcode_type: str, data: Any) -> bytes:
+        """Linear barcode as PNG bytes"""
+        barcode_class = barcode.get_barcode_class(barcode_type.lower())
+        barcode_instance = barcode_class(str(data), writer=ImageWriter())
+
+        buffer = BytesIO()
+        barcode_instance.write(buffer)
+        return buffer.getvalue()
+
+    def _barcode_image(self, barcode_type: str, data: str, generate) -> ImageReader:
+        """Generate a barcode once per document; barcodes are never resampled or made lossy"""
+        key = (barcode_type, data)
+        if key not in self._barcodes:
+            with PDF_ASSET_SECONDS.labels('barcode').time():
+                self._barcodes[key] = generate()
+        return self._prepare_image(self._barcodes[key], None, lossy=False)
+
+    def _load_image(self, path: str, width: float, height: float) -> ImageReader:
+        """Image file prepared for drawing at width x height points"""
+        with PDF_ASSET_SECONDS.labels('image').time():
+            target = self._target_pixels(width, height)
+            if path.startswith('/storage/'):
+                # Uploaded asset: start from the smallest variant that is sharp enough
+                path = resolve_image(path[len('/storage/'):], target)
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            return self._prepare_image(data, target if self.recompress_images else None, lossy=True)
+
+    def _target_pixels(self, width: float, height: float) -> Optional[Tuple[int, int]]:
+        """Pixel size needed to draw width x height points at the render DPI"""
+        if width <= 0 or height <= 0:
+            return None
+        return (
+            max(1, math.ceil(width / 72.0 * self.dpi)),
+            max(1, math.ceil(height / 72.0 * self.dpi)),
+        )
+
+    def _prepare_image(self, data: bytes, target: Optional[Tuple[int, int]], lossy: bool) -> ImageReader:
+        """
+        Shared ImageReader for identical image bytes drawn at the same size
+
+        ReportLab names image XObjects by a digest of their pixels, so
+        reusing one reader embeds a single XObject per document and avoids
+        decoding the image again for every placement.
+        """
+        key = (hashlib.sha256(data).digest(), target, lossy)
+        self.stats['images_drawn'] += 1
+
+        cached = self._images.get(key)
+        if cached is not None:
+            reader, size = cached
+            self.stats['image_bytes_reused'] += size
+            return reader
+
+        encoded = self._recompress(data, target, lossy) if self.recompress_images else data
+        reader = ImageReader(BytesIO(encoded))
+        self._images[key] = (reader, len(encoded))
+
+        self.stats['images_embedded'] += 1
+        self.stats['image_bytes_source'] += len(data)
+        self.stats['image_bytes_embedded'] += len(encoded)
+        return reader
+
+    def _recompress(self, data: bytes, target: Optional[Tuple[int, int]], lossy: bool) -> bytes:
+        """Downsample an image to the target size and pick JPEG or lossless encoding"""
+        img = Image.open(BytesIO(data))
+        source_format = img.format
+
+        resized = False
+        if target and (img.width > target[0] * 1.1 or img.height > target[1] * 1.1):
+            img.thumbnail(target, Image.LANCZOS)
+            resized = True
+
+        has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+        if not lossy or has_alpha or self.image_format == 'flate':
+            use_jpeg = False
+        elif self.image_format == 'jpeg':
+            use_jpeg = True
+        else:
+            # Photographs compress far better as JPEG; flat artwork stays lossless
+            use_jpeg = source_format == 'JPEG' or img.convert('RGB').getcolors(256) is None
+
+        if not resized and (not use_jpeg or source_format == 'JPEG'):
+            # Nothing to gain; re-encoding a JPEG only loses quality
+            return data
+
+        buffer = BytesIO()
+        if use_jpeg:
+            img.convert('L' if img.mode in ('1', 'L') else 'RGB').save(
+                buffer, format='JPEG', quality=self.image_quality, optimize=True
+            )
+        else:
+            img.save(buffer, format='PNG', optimize=True)
+
+        encoded = buffer.getvalue()
+        if not resized and len(encoded) >= len(data):
+            return data
+        return encoded
+
     def _render_chart(self, element: Dict[str, Any]):
         """Render Chart"""
         # TODO: Implement chart rendering with matplotlib
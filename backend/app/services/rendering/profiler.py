@@ -0,0 +1,185 @@
+"""
+Render Profiler - Time and size breakdown of a single render
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import time
+
+# Render options that only control profiling; they never change the output
+PROFILE_OPTIONS = ('profile', 'profile_top')
+
+
+def profile_requested(options: Optional[Dict[str, Any]]) -> bool:
+    return bool((options or {}).get('profile'))
+
+
+def output_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Render options without the profiling ones, e.g. for result cache keys"""
+    return {k: v for k, v in (options or {}).items() if k not in PROFILE_OPTIONS}
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+class RenderProfile:
+    """
+    Perfil de un renderizado
+
+    attach_pdf() / attach_email() replace the per-page and per-element
+    methods of one renderer instance with timed wrappers. Renders without
+    a profile use the class methods untouched, so the timers cost nothing
+    unless requested.
+
+    PDF element bytes are the content stream operators the element wrote
+    plus the image data it embedded for the first time; page bytes are the
+    uncompressed content stream and the images first embedded on the page.
+    """
+
+    def __init__(self, top: int = 10):
+        self.top = max(int(top), 0)
+        self.stages: Dict[str, float] = {}
+        self.pages: List[Dict[str, Any]] = []
+        self.elements: List[Dict[str, Any]] = []
+        self.cache = {
+            'images': {'hits': 0, 'misses': 0},
+            'barcodes': {'hits': 0, 'misses': 0},
+        }
+        self._started = time.perf_counter()
+        self._page: Optional[Dict[str, Any]] = None
+
+    def _timed_stage(self, name: str, fn: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+        return timed
+
+    # ========================================================================
+    # PDF
+    # ========================================================================
+
+    def attach_pdf(self, renderer):
+        """Profile the next render of a PDFRenderer"""
+        render_page = renderer._render_page
+        render_element = renderer._render_element
+        barcode_image = renderer._barcode_image
+        prepare_image = renderer._prepare_image
+
+        def profiled_page(page):
+            self._page = {'index': len(self.pages), 'name': page.get('name'), 'elements': 0}
+            images_before = renderer.stats['image_bytes_embedded']
+            start = time.perf_counter()
+            try:
+                render_page(page)
+            finally:
+                self._page['ms'] = _ms(time.perf_counter() - start)
+                last = renderer.canvas._doc.Pages.pages[-1] if renderer.canvas._doc.Pages.pages else None
+                self._page['content_bytes'] = len(getattr(last, 'stream', '') or '')
+                self._page['image_bytes'] = renderer.stats['image_bytes_embedded'] - images_before
+                self.pages.append(self._page)
+
+        def profiled_element(element):
+            code = renderer.canvas._code
+            code_start = len(code)
+            images_before = renderer.stats['image_bytes_embedded']
+            entry = {
+                'id': element.get('id'),
+                'type': element.get('type'),
+                'page': self._page['index'] if self._page else None,
+            }
+            start = time.perf_counter()
+            try:
+                render_element(element)
+            except Exception:
+                entry['error'] = True
+                raise
+            finally:
+                entry['ms'] = _ms(time.perf_counter() - start)
+                entry['bytes'] = (
+                    sum(len(op) + 1 for op in code[code_start:])
+                    + renderer.stats['image_bytes_embedded'] - images_before
+                )
+                if self._page is not None:
+                    self._page['elements'] += 1
+                self.elements.append(entry)
+
+        def profiled_barcode(barcode_type, data, generate):
+            generated = len(renderer._barcodes)
+            reader = barcode_image(barcode_type, data, generate)
+            self.cache['barcodes']['misses' if len(renderer._barcodes) > generated else 'hits'] += 1
+            return reader
+
+        def profiled_prepare(data, target, lossy):
+            embedded = renderer.stats['images_embedded']
+            reader = prepare_image(data, target, lossy)
+            self.cache['images']['misses' if renderer.stats['images_embedded'] > embedded else 'hits'] += 1
+            return reader
+
+        renderer._render_page = profiled_page
+        renderer._render_element = profiled_element
+        renderer._barcode_image = profiled_barcode
+        renderer._prepare_image = profiled_prepare
+        renderer.parser.parse = self._timed_stage('parse', renderer.parser.parse)
+        renderer.render_compiled = self._timed_stage('render', renderer.render_compiled)
+
+    # ========================================================================
+    # EMAIL
+    # ========================================================================
+
+    def attach_email(self, renderer):
+        """Profile the next render of an EmailRenderer"""
+        render_element = renderer._render_element
+
+        def profiled_element(element):
+            entry = {'id': element.get('id'), 'type': element.get('type')}
+            start = time.perf_counter()
+            try:
+                html = render_element(element)
+            except Exception:
+                entry['error'] = True
+                raise
+            finally:
+                entry['ms'] = _ms(time.perf_counter() - start)
+                self.elements.append(entry)
+            entry['bytes'] = len(html.encode('utf-8')) if html else 0
+            return html
+
+        renderer._render_element = profiled_element
+        for name, method in (
+            ('body', '_generate_html_body'),
+            ('layout', '_create_email_html'),
+            ('fixes', '_apply_email_fixes'),
+            ('text', '_generate_plain_text'),
+        ):
+            setattr(renderer, method, self._timed_stage(name, getattr(renderer, method)))
+        renderer.render = self._timed_stage('render', renderer.render)
+
+    # ========================================================================
+    # REPORT
+    # ========================================================================
+
+    def report(self, **extra: Any) -> Dict[str, Any]:
+        """The breakdown, slowest elements first in 'slowest'"""
+        stages = {name: _ms(seconds) for name, seconds in self.stages.items()}
+        if 'render' in stages:
+            # Time outside the profiled parts: fonts, serialization and
+            # compression for PDFs, premailer CSS inlining for emails
+            accounted = sum(page['ms'] for page in self.pages) if self.pages else sum(
+                ms for name, ms in stages.items() if name in ('body', 'layout', 'fixes', 'text')
+            )
+            stages['other'] = round(max(stages['render'] - accounted, 0.0), 3)
+
+        report = {
+            'total_ms': _ms(time.perf_counter() - self._started),
+            'stages_ms': stages,
+            'elements': self.elements,
+            'slowest': sorted(self.elements, key=lambda e: e['ms'], reverse=True)[:self.top],
+            **extra,
+        }
+        if self.pages:
+            report['pages'] = self.pages
+            report['cache'] = self.cache
+        return report
@@ -0,0 +1,40 @@
+"""
+Render Stats - Per-template PDF size statistics
+"""
+
+from collections import Counter
+from typing import Any, Dict
+import threading
+
+
+class RenderStats:
+    """
+    Estadísticas acumuladas de renderizado por plantilla
+
+    Sums the size counters reported by PDFRenderer.stats for each render
+    of a template in this process.
+    """
+
+    def __init__(self):
+        self._totals: Dict[Any, Counter] = {}
+        self._lock = threading.Lock()
+
+    def record(self, template_id: Any, stats: Dict[str, int]):
+        """Add the stats of one render"""
+        with self._lock:
+            totals = self._totals.setdefault(template_id, Counter())
+            totals['renders'] += 1
+            totals.update(stats)
+
+    def get(self, template_id: Any) -> Dict[str, int]:
+        """Totals for a template (empty when it has not been rendered)"""
+        with self._lock:
+            return dict(self._totals.get(template_id, {}))
+
+    def invalidate(self, template_id: Any):
+        """Forget a deleted template"""
+        with self._lock:
+            self._totals.pop(template_id, None)
+
+
+render_stats = RenderStats()
@@ -0,0 +1,200 @@
+"""
+Template Search - Ranked, index-backed search over templates
+"""
+
+from typing import Any, List, Optional, Sequence, Tuple
+import re
+import logging
+
+from sqlalchemy import select, func, cast, exists, or_, literal_column, table, column, text, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from app.models.template import Template, TemplateType, build_search_text
+
+logger = logging.getLogger(__name__)
+
+# Text search configuration; must match the ix_templates_search_tsv expression
+TS_CONFIG = literal_column("'simple'")
+
+# FTS5 table mirrored from templates on SQLite
+templates_fts = table('templates_fts', column('rowid'), column('search_text'), column('tags'))
+
+# Words in a free-text query
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+class TemplateSearch:
+    """
+    Buscador de plantillas sobre name, description, tags y nombres de variables
+
+    PostgreSQL uses a tsvector GIN index for ranked word matches plus a
+    trigram GIN index for substring matches; SQLite uses the templates_fts
+    FTS5 table with bm25 ranking. Tag filters require every given tag,
+    matched exactly and case-sensitively on every database.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.dialect = db.bind.dialect.name
+
+    async def search(
+        self,
+        owner_id: Any,
+        query: Optional[str] = None,
+        tags: Sequence[str] = (),
+        type: Optional[TemplateType] = None,
+        limit: int = 50,
+        offset: int = 0,
+        columns: Optional[Sequence[Any]] = None,
+    ) -> List[Tuple[Template, float]]:
+        """
+        Search templates of an owner
+
+        Args:
+            owner_id: Owner of the templates
+            query: Free text; words are matched as prefixes
+            tags: Tags that must all be present
+            type: Optional template type filter
+            limit: Maximum number of results
+            offset: Results to skip
+            columns: Template columns to load (all when omitted)
+
+        Returns:
+            (template, rank) pairs, best match first
+        """
+        query = (query or '').strip()
+
+        if self.dialect == 'postgresql':
+            stmt = self._postgres_query(query, tags)
+        elif self.dialect == 'sqlite':
+            stmt = self._sqlite_query(query, tags)
+        else:
+            stmt = self._fallback_query(query, tags)
+
+        stmt = stmt.where(Template.owner_id == owner_id)
+
+        if type:
+            stmt = stmt.where(Template.type == type)
+
+        if columns:
+            stmt = stmt.options(load_only(*columns))
+
+        stmt = stmt.offset(offset).limit(limit)
+
+        result = await self.db.execute(stmt)
+        return [(template, float(rank or 0)) for template, rank in result.all()]
+
+    def _postgres_query(self, query: str, tags: Sequence[str]):
+        """Full-text rank with a trigram-indexed substring fallback"""
+        tokens = TOKEN_PATTERN.findall(query.lower())
+        substring = Template.search_text.contains(query.lower(), autoescape=True)
+
+        if tokens:
+            vector = func.to_tsvector(TS_CONFIG, Template.search_text)
+            # Every word as a prefix term: 'inv':* & 'fin':*
+            ts_query = func.to_tsquery(TS_CONFIG, ' & '.join(f"'{token}':*" for token in tokens))
+            rank = func.ts_rank(vector, ts_query)
+
+            stmt = select(Template, rank.label('rank')).where(
+                or_(vector.op('@@')(ts_query), substring)
+            ).order_by(rank.desc(), Template.updated_at.desc())
+        elif query:
+            stmt = select(Template, literal_column('0').label('rank')).where(substring).order_by(
+                Template.updated_at.desc()
+            )
+        else:
+            stmt = select(Template, literal_column('0').label('rank')).order_by(Template.updated_at.desc())
+
+        if tags:
+            stmt = stmt.where(cast(Template.tags, JSONB).contains(list(tags)))
+
+        return stmt
+
+    def _sqlite_query(self, query: str, tags: Sequence[str]):
+        """FTS5 match over the templates_fts mirror, ranked by bm25"""
+        match = self._fts_match(query)
+        if not match:
+            stmt = select(Template, literal_column('0').label('rank')).order_by(Template.updated_at.desc())
+        else:
+            # bm25 is lower-is-better; negate it so higher rank means better match
+            bm25 = func.bm25(literal_column('templates_fts'))
+            stmt = (
+                select(Template, (-bm25).label('rank'))
+                .join(templates_fts, templates_fts.c.rowid == literal_column('templates.rowid'))
+                .where(literal_column('templates_fts').op('MATCH')(match))
+                .order_by(bm25, Template.updated_at.desc())
+            )
+
+        # Exact elements of the tags array, like the JSONB containment on PostgreSQL
+        for tag in tags:
+            values = func.json_each(Template.tags).table_valued('value')
+            stmt = stmt.where(exists(select(1).select_from(values).where(values.c.value == tag)))
+
+        return stmt
+
+    def _fts_match(self, query: str) -> str:
+        """Build an FTS5 MATCH expression with a prefix term per word"""
+        return ' AND '.join(
+            f'search_text : {self._fts_quote(token)}*'
+            for token in TOKEN_PATTERN.findall(query.lower())
+        )
+
+    def _fts_quote(self, value: str) -> str:
+        """Quote a string as an FTS5 phrase"""
+        return '"' + value.replace('"', '""') + '"'
+
+    def _fallback_query(self, query: str, tags: Sequence[str]):
+        """Unindexed LIKE search for other databases"""
+        stmt = select(Template, literal_column('0').label('rank')).order_by(Template.updated_at.desc())
+
+        for token in TOKEN_PATTERN.findall(query.lower()):
+            stmt = stmt.where(Template.search_text.contains(token, autoescape=True))
+
+        for tag in tags:
+            stmt = stmt.where(Template.search_text.contains(tag.lower(), autoescape=True))
+
+        return stmt
+
+    async def rebuild_index(self, batch_size: int = 500) -> int:
+        """
+        Recompute search_text for every template and rebuild the FTS mirror
+
+        Used to backfill rows written before search_text existed.
+
+        Returns:
+            Number of templates updated
+        """
+        updated = 0
+        last_id = None
+
+        while True:
+            stmt = select(Template).order_by(Template.id).limit(batch_size)
+            if last_id is not None:
+                stmt = stmt.where(Template.id > last_id)
+
+            result = await self.db.execute(stmt)
+            templates = result.scalars().all()
+            if not templates:
+                break
+
+            for template in templates:
+                await self.db.execute(
+                    update(Template)
+                    .where(Template.id == template.id)
+                    # Keep updated_at: reindexing is not a user-visible change
+                    .values(search_text=build_search_text(template), updated_at=Template.updated_at)
+                    .execution_options(synchronize_session=False)
+                )
+
+            updated += len(templates)
+            last_id = templates[-1].id
+            await self.db.commit()
+
+        if self.dialect == 'sqlite':
+            await self.db.execute(text("INSERT INTO templates_fts(templates_fts) VALUES ('rebuild')"))
+            await self.db.commit()
+
+        logger.info(f"Search index rebuilt for {updated} templates")
+        return updated
@@ -0,0 +1,216 @@
+"""
+Asset Store - Content-addressed storage for uploaded assets
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+import hashlib
+import os
+import uuid
+import logging
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.asset import AssetBlob
+from app.services.storage.backends import StorageBackend, storage_backend
+from app.services.storage.variants import derivative_prefix
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from an upload at a time
+CHUNK_SIZE = 64 * 1024
+
+# Blob media types remembered per process
+MIME_TYPE_CACHE_SIZE = 10000
+
+
+class UploadTooLarge(ValueError):
+    """The upload exceeded the size limit while streaming"""
+
+
+@dataclass
+class StagedUpload:
+    """Upload written to a temporary file, hashed but not yet stored"""
+    path: Path
+    content_hash: str
+    size: int
+
+
+class AssetStore:
+    """
+    Almacén de archivos direccionado por contenido
+
+    Files are stored under the key <hash[:2]>/<hash[2:4]>/<hash> in the
+    storage backend and shared by every asset with the same bytes.
+    AssetBlob.ref_count tracks how many assets point at a file; it is
+    written under a row lock. A blob whose count drops to zero keeps its
+    row until delete_file() removes the file under that same lock, so an
+    upload of the same bytes in between revives the blob instead of losing
+    its file. Uploads are staged in a local scratch directory first.
+    """
+
+    def __init__(self, backend: StorageBackend, scratch_dir: str):
+        self.backend = backend
+        self.tmp_dir = Path(scratch_dir)
+        # Blob media types never change, so lookups are kept for the process lifetime
+        self._mime_types: Dict[str, str] = {}
+
+    def blob_key(self, content_hash: str) -> str:
+        return f"{content_hash[:2]}/{content_hash[2:4]}/{content_hash}"
+
+    def blob_url(self, content_hash: str) -> str:
+        return f"/storage/{self.blob_key(content_hash)}"
+
+    async def stage(self, upload: UploadFile, max_bytes: int) -> StagedUpload:
+        """
+        Stream an upload to a temporary file, hashing it on the way
+
+        Memory use is one chunk regardless of the upload size.
+
+        Raises:
+            UploadTooLarge: As soon as more than max_bytes have been read
+        """
+        await aiofiles.os.makedirs(self.tmp_dir, exist_ok=True)
+        path = self.tmp_dir / uuid.uuid4().hex
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(path, 'wb') as f:
+                while True:
+                    chunk = await upload.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+
+                    digest.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            await self.discard(path)
+            raise
+
+        return StagedUpload(path=path, content_hash=digest.hexdigest(), size=size)
+
+    async def commit(self, db: AsyncSession, staged: StagedUpload, mime_type: str) -> AssetBlob:
+        """
+        Store staged bytes and take a reference on their blob
+
+        Duplicate content increments the existing blob's reference count and
+        the staged file is dropped. Runs inside the caller's transaction.
+        """
+        blob = await self._locked_blob(db, staged.content_hash)
+        if blob is not None and blob.ref_count > 0:
+            blob.ref_count += 1
+            await self.discard(staged.path)
+            return blob
+
+        if blob is not None:
+            # Released but not deleted yet: its file may already be gone
+            await run_in_threadpool(
+                self.backend.put_file, self.blob_key(staged.content_hash), str(staged.path), mime_type
+            )
+            blob.ref_count = 1
+            await self.discard(staged.path)
+            return blob
+
+        # Same hash means same bytes, so replacing a concurrently stored
+        # file is harmless
+        await run_in_threadpool(
+            self.backend.put_file, self.blob_key(staged.content_hash), str(staged.path), mime_type
+        )
+
+        blob = AssetBlob(
+            content_hash=staged.content_hash,
+            size=staged.size,
+            mime_type=mime_type,
+            ref_count=1,
+        )
+        try:
+            async with db.begin_nested():
+                db.add(blob)
+            return blob
+        except IntegrityError:
+            # Inserted concurrently by another upload: reference that one
+            logger.debug(f"Blob {staged.content_hash} created concurrently")
+            blob = await self._locked_blob(db, staged.content_hash)
+            blob.ref_count += 1
+            return blob
+
+    async def release(self, db: AsyncSession, content_hash: str) -> bool:
+        """
+        Drop one reference to a blob
+
+        Returns:
+            True when this was the last reference; the caller removes the
+            blob with delete_file() after committing
+        """
+        blob = await self._locked_blob(db, content_hash)
+        if blob is None or blob.ref_count <= 0:
+            return False
+
+        blob.ref_count -= 1
+        return blob.ref_count == 0
+
+    async def delete_file(self, db: AsyncSession, content_hash: str) -> bool:
+        """
+        Remove a released blob: its file, its variants and its row
+
+        Runs in its own transaction and commits it. The row stays locked
+        while the files are removed, and nothing is removed if an upload
+        took a new reference since the release.
+
+        Returns:
+            Whether the blob was removed
+        """
+        blob = await self._locked_blob(db, content_hash)
+        if blob is None or blob.ref_count > 0:
+            await db.rollback()
+            return False
+
+        await run_in_threadpool(self.backend.delete, self.blob_key(content_hash))
+        await run_in_threadpool(self.backend.delete_prefix, derivative_prefix(content_hash))
+        await db.delete(blob)
+        await db.commit()
+        return True
+
+    async def mime_type(self, db: AsyncSession, content_hash: str) -> Optional[str]:
+        """Media type a blob was uploaded with"""
+        mime_type = self._mime_types.get(content_hash)
+        if mime_type is None:
+            result = await db.execute(
+                select(AssetBlob.mime_type).where(AssetBlob.content_hash == content_hash)
+            )
+            mime_type = result.scalar_one_or_none()
+            if mime_type is not None:
+                if len(self._mime_types) >= MIME_TYPE_CACHE_SIZE:
+                    self._mime_types.clear()
+                self._mime_types[content_hash] = mime_type
+        return mime_type
+
+    async def discard(self, path: Path):
+        try:
+            await aiofiles.os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def _locked_blob(self, db: AsyncSession, content_hash: str) -> Optional[AssetBlob]:
+        result = await db.execute(
+            select(AssetBlob)
+            .where(AssetBlob.content_hash == content_hash)
+            .with_for_update()
+        )
+        return result.scalar_one_or_none()
+
+
+asset_store = AssetStore(storage_backend, os.path.join(settings.LOCAL_STORAGE_PATH, 'tmp'))
@@ -0,0 +1,418 @@
+"""
+Storage Backends - Local disk and S3-compatible object storage
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import logging
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from app.core.config import settings
+from app.core.metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend:
+    """
+    Interfaz de almacenamiento de archivos
+
+    Keys are relative paths such as 'ab/cd/<hash>'. Methods block, so
+    async code calls them through run_in_threadpool; the renderer calls
+    them directly from its worker thread.
+    """
+
+    def put_file(self, key: str, path: str, content_type: str):
+        """Store a local file under a key, consuming the file"""
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> str:
+        """
+        Local filesystem path with the contents of a key
+
+        Raises:
+            FileNotFoundError: If the key does not exist
+        """
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> List[str]:
+        """Names of the files directly under a prefix"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str):
+        """Delete every key under a prefix"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {'type': self.name}
+
+
+class LocalStorage(StorageBackend):
+    """Almacenamiento en el disco local bajo LOCAL_STORAGE_PATH"""
+
+    name = 'local'
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        root = self.root.resolve()
+        path = (root / key).resolve()
+        if root not in path.parents:
+            raise FileNotFoundError(key)
+        return path
+
+    def put_file(self, key: str, path: str, content_type: str):
+        target = self._path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, target)
+
+    def local_path(self, key: str) -> str:
+        path = self._path(key)
+        if not path.is_file():
+            raise FileNotFoundError(key)
+        return str(path)
+
+    def list(self, prefix: str) -> List[str]:
+        try:
+            return [
+                entry.name for entry in os.scandir(self._path(prefix))
+                if entry.is_file() and not entry.name.startswith('.')
+            ]
+        except OSError:
+            return []
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def delete_prefix(self, prefix: str):
+        try:
+            shutil.rmtree(self._path(prefix))
+        except FileNotFoundError:
+            pass
+
+
+class FileCache:
+    """
+    Caché de lectura en disco para objetos remotos
+
+    Files live at <directory>/<sha[:2]>/<sha> where sha hashes the key;
+    the total size is bounded by evicting least recently used files.
+    Entries are written through a temporary file and an atomic rename.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _load(self):
+        """Index existing files, oldest first"""
+        if self._loaded:
+            return
+        self._loaded = True
+
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, path, stat.st_size))
+
+        for _, path, size in sorted(files):
+            self._entries[path] = size
+            self._size += size
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached path of a key, refreshing its recency"""
+        path = self._path(key)
+        with self._lock:
+            self._load()
+            try:
+                os.utime(path)
+            except OSError:
+                size = self._entries.pop(path, None)
+                if size is not None:
+                    self._size -= size
+                self.misses += 1
+                cache_lookup('storage', False)
+                return None
+
+            if path not in self._entries:
+                size = os.path.getsize(path)
+                self._entries[path] = size
+                self._size += size
+            self._entries.move_to_end(path)
+            self.hits += 1
+            cache_lookup('storage', True)
+            return path
+
+    def put(self, key: str, fill: Callable[[str], None]) -> str:
+        """
+        Add a key by calling fill(temp_path) to write its contents
+
+        The download runs outside the lock so different keys are fetched
+        in parallel.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.')
+        os.close(fd)
+        try:
+            fill(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        size = os.path.getsize(path)
+        with self._lock:
+            self._load()
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._size -= previous
+            self._entries[path] = size
+            self._size += size
+
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                evicted, evicted_size = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                try:
+                    os.remove(evicted)
+                except OSError:
+                    pass
+        return path
+
+    def discard(self, key: str):
+        path = self._path(key)
+        with self._lock:
+            size = self._entries.pop(path, None)
+            if size is not None:
+                self._size -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class S3Storage(StorageBackend):
+    """
+    Almacenamiento en S3 o MinIO
+
+    One boto3 client (thread-safe, with a connection pool sized for the
+    transfer concurrency) is shared by all requests. Uploads above the
+    multipart threshold are split into parts sent in parallel straight
+    from the staged file; downloads land in a local read-through cache
+    so the renderer reads images from disk after the first fetch.
+    Prefix listings are cached too, including empty ones for a while, so
+    drawing an image without variants does not list the bucket each time.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        cache: FileCache,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        path_style: bool = False,
+        multipart_threshold: int = 8 * 1024 * 1024,
+        multipart_chunksize: int = 8 * 1024 * 1024,
+        max_concurrency: int = 8,
+        empty_listing_ttl: float = 300,
+        name: str = 's3',
+    ):
+        self.name = name
+        self.bucket = bucket
+        self.cache = cache
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.path_style = path_style
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        self.max_concurrency = max_concurrency
+        self.empty_listing_ttl = empty_listing_ttl
+        self._client = None
+        self._transfer_config = None
+        self._client_lock = threading.Lock()
+        # Variant listings are immutable once written, so non-empty ones are
+        # kept; empty ones expire, as another worker may fill the prefix
+        self._listings: Dict[str, Tuple[List[str], float]] = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._transfer_config = TransferConfig(
+                        multipart_threshold=self.multipart_threshold,
+                        multipart_chunksize=self.multipart_chunksize,
+                        max_concurrency=self.max_concurrency,
+                        use_threads=True,
+                    )
+                    self._client = boto3.client(
+                        's3',
+                        endpoint_url=self.endpoint_url,
+                        region_name=self.region,
+                        aws_access_key_id=self.access_key,
+                        aws_secret_access_key=self.secret_key,
+                        config=Config(
+                            max_pool_connections=self.max_concurrency * 2,
+                            retries={'max_attempts': 3, 'mode': 'standard'},
+                            s3={'addressing_style': 'path' if self.path_style else 'auto'},
+                        ),
+                    )
+        return self._client
+
+    def put_file(self, key: str, path: str, content_type: str):
+        self.client.upload_file(
+            path, self.bucket, key,
+            ExtraArgs={'ContentType': content_type},
+            Config=self._transfer_config,
+        )
+        # The staged file becomes the cached copy, saving the first download
+        self.cache.put(key, lambda tmp_path: shutil.move(path, tmp_path))
+        self._listings.pop(_parent_prefix(key), None)
+
+    def local_path(self, key: str) -> str:
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            return self.cache.put(key, lambda tmp_path: self.client.download_file(
+                self.bucket, key, tmp_path, Config=self._transfer_config,
+            ))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                raise FileNotFoundError(key)
+            raise
+
+    def list(self, prefix: str) -> List[str]:
+        prefix = prefix.rstrip('/') + '/'
+        cached = self._listings.get(prefix)
+        if cached is not None and (cached[0] or cached[1] > time.monotonic()):
+            return cached[0]
+
+        names = [
+            item['Key'][len(prefix):]
+            for item in self._iter_objects(prefix)
+            if '/' not in item['Key'][len(prefix):]
+        ]
+        if len(self._listings) >= 10000:
+            self._listings.clear()
+        self._listings[prefix] = (names, time.monotonic() + self.empty_listing_ttl)
+        return names
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        self.cache.discard(key)
+        self._listings.pop(_parent_prefix(key), None)
+
+    def delete_prefix(self, prefix: str):
+        prefix = prefix.rstrip('/') + '/'
+        self._listings.pop(prefix, None)
+
+        keys = [item['Key'] for item in self._iter_objects(prefix)]
+        # delete_objects takes at most 1000 keys per call
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+            )
+        for key in keys:
+            self.cache.discard(key)
+
+    def _iter_objects(self, prefix: str):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            yield from page.get('Contents', [])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'type': self.name,
+            'bucket': self.bucket,
+            'cache': {
+                'hits': self.cache.hits,
+                'misses': self.cache.misses,
+                'entries': len(self.cache),
+                'bytes': self.cache.size,
+            },
+        }
+
+
+def _parent_prefix(key: str) -> str:
+    return key.rpartition('/')[0] + '/'
+
+
+def backend_from_settings() -> StorageBackend:
+    """Backend selected by STORAGE_TYPE"""
+    if settings.STORAGE_TYPE == 'local':
+        return LocalStorage(settings.LOCAL_STORAGE_PATH)
+
+    if settings.STORAGE_TYPE not in ('s3', 'minio'):
+        raise ValueError(f"Unknown STORAGE_TYPE: {settings.STORAGE_TYPE}")
+
+    return S3Storage(
+        settings.STORAGE_BUCKET,
+        FileCache(settings.STORAGE_CACHE_DIR, settings.STORAGE_CACHE_MAX_MB * 1024 * 1024),
+        endpoint_url=settings.AWS_ENDPOINT_URL,
+        region=settings.AWS_REGION,
+        access_key=settings.AWS_ACCESS_KEY_ID,
+        secret_key=settings.AWS_SECRET_ACCESS_KEY,
+        # MinIO serves buckets under the path, not as subdomains
+        path_style=settings.STORAGE_TYPE == 'minio',
+        multipart_threshold=settings.STORAGE_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+        multipart_chunksize=settings.STORAGE_MULTIPART_CHUNK_MB * 1024 * 1024,
+        max_concurrency=settings.STORAGE_MAX_CONCURRENCY,
+        empty_listing_ttl=settings.STORAGE_EMPTY_LISTING_TTL,
+        name=settings.STORAGE_TYPE,
+    )
+
+
+storage_backend = backend_from_settings()
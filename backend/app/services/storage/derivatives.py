@@ -0,0 +1,164 @@
+"""
+Asset Derivatives - Thumbnails and render-ready variants of uploaded images
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import asyncio
+import math
+import os
+import shutil
+import uuid
+import logging
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.asset import Asset
+from app.services.storage.backends import storage_backend
+from app.services.storage.variants import derivative_prefix, parse_variants
+
+logger = logging.getLogger(__name__)
+
+# Raster types Pillow can resample; SVG and fonts get no derivatives
+DERIVABLE_TYPES = ('image/jpeg', 'image/png', 'image/gif')
+
+
+def derivative_specs() -> Dict[str, int]:
+    """Longest edge in pixels of each variant"""
+    return {
+        'thumbnail': settings.THUMBNAIL_SIZE,
+        'preview': math.ceil(settings.DERIVATIVE_PRINT_INCHES * settings.PREVIEW_DPI),
+        'export': math.ceil(settings.DERIVATIVE_PRINT_INCHES * settings.EXPORT_DPI),
+    }
+
+
+def generate_derivatives(source: str, directory: str, specs: Dict[str, int], existing: List[str]) -> Dict[str, Any]:
+    """
+    Write the variants of an image that are smaller than the original
+
+    Runs in a worker process. Variants named in existing are skipped, so
+    blobs shared by several assets are only processed once.
+
+    Returns:
+        Source dimensions and the variants written to directory
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    with Image.open(source) as img:
+        source_size = img.size
+        # Lossless sources stay lossless; the renderer picks the final encoding
+        lossless = img.format != 'JPEG'
+
+        for name, edge in specs.items():
+            if name in existing:
+                continue
+            if max(img.size) <= edge and name != 'thumbnail':
+                # The original already is the smallest image meeting this DPI
+                continue
+
+            variant = img.copy()
+            variant.thumbnail((edge, edge), Image.LANCZOS)
+
+            if lossless:
+                ext, save_options = 'png', {'format': 'PNG', 'optimize': True}
+                if variant.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+                    variant = variant.convert('RGBA')
+            else:
+                ext, save_options = 'jpg', {'format': 'JPEG', 'quality': 90, 'optimize': True}
+                variant = variant.convert('L' if variant.mode in ('1', 'L') else 'RGB')
+
+            variant.save(directory / f"{name}-{variant.width}x{variant.height}.{ext}", **save_options)
+
+    return {
+        'width': source_size[0],
+        'height': source_size[1],
+        'variants': parse_variants(os.listdir(directory)),
+    }
+
+
+class DerivativePipeline:
+    """
+    Generador de variantes de imágenes en segundo plano
+
+    Uploads schedule process() as a background task; the Pillow work runs
+    in a process pool so large images never block the event loop or
+    compete with request handling for the GIL. Results are recorded in
+    Asset.meta['derivatives'] and Asset.thumbnail_url.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def wants(self, asset: Asset) -> bool:
+        """Whether an asset gets derivatives"""
+        return bool(asset.content_hash) and asset.mime_type in DERIVABLE_TYPES
+
+    async def process(self, asset_id: Any, source_key: str, content_hash: str):
+        """Generate the variants of an uploaded asset and record them"""
+        prefix = derivative_prefix(content_hash)
+        scratch = os.path.join(settings.LOCAL_STORAGE_PATH, 'tmp', uuid.uuid4().hex)
+        try:
+            source = await run_in_threadpool(storage_backend.local_path, source_key)
+            existing = parse_variants(await run_in_threadpool(storage_backend.list, prefix))
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(),
+                generate_derivatives, source, scratch, derivative_specs(), [v['name'] for v in existing],
+            )
+            for variant in result['variants']:
+                media_type = 'image/png' if variant['file'].endswith('.png') else 'image/jpeg'
+                await run_in_threadpool(
+                    storage_backend.put_file,
+                    f"{prefix}/{variant['file']}", os.path.join(scratch, variant['file']), media_type,
+                )
+        except Exception as e:
+            logger.error(f"Derivative generation failed for asset {asset_id}: {e}")
+            return
+        finally:
+            await run_in_threadpool(shutil.rmtree, scratch, True)
+
+        derivatives = {
+            v['name']: {
+                'url': f"/storage/{prefix}/{v['file']}",
+                'width': v['width'],
+                'height': v['height'],
+            }
+            for v in existing + result['variants']
+        }
+
+        async with AsyncSessionLocal() as db:
+            asset = (await db.execute(select(Asset).where(Asset.id == asset_id))).scalar_one_or_none()
+            if asset is None:
+                # Deleted while processing
+                return
+
+            asset.meta = {
+                **(asset.meta or {}),
+                'width': result['width'],
+                'height': result['height'],
+                'derivatives': derivatives,
+            }
+            if 'thumbnail' in derivatives:
+                asset.thumbnail_url = derivatives['thumbnail']['url']
+            await db.commit()
+
+        logger.info(f"Generated {len(result['variants'])} derivatives for asset {asset_id}")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+derivative_pipeline = DerivativePipeline(settings.DERIVATIVE_WORKERS)
@@ -0,0 +1,161 @@
+"""
+File Server - Conditional and ranged responses for stored files
+"""
+
+from typing import Mapping, Optional, Tuple
+import os
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.etag import etag_matches
+
+# Content-addressed files never change under their URL
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Files stored under a reusable name must be revalidated
+MUTABLE_CACHE_CONTROL = "public, no-cache"
+
+# Media types a browser runs scripts in when opened directly
+ACTIVE_MEDIA_TYPES = ('image/svg+xml', 'text/html', 'application/xhtml+xml', 'text/xml', 'application/xml')
+
+# Opened directly, active files render as a sandboxed, script-less document;
+# embedding them with <img> is unaffected
+SANDBOX_CSP = "default-src 'none'; style-src 'unsafe-inline'; sandbox"
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range Range header into an inclusive (start, end)
+
+    Returns None when the header should be ignored and the whole file
+    served: other units, malformed values, or multiple ranges.
+
+    Raises:
+        ValueError: If the range cannot be satisfied for this size
+    """
+    unit, _, ranges = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+
+    start, sep, end = ranges.strip().partition('-')
+    if not sep:
+        return None
+
+    if not (start or end).isdigit() or (end and not end.isdigit()):
+        return None
+
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+
+    first = int(start)
+    last = int(end) if end else size - 1
+
+    if first >= size:
+        raise ValueError("Range starts past the end of the file")
+    if first > last:
+        return None
+    return first, min(last, size - 1)
+
+
+class StoredFileResponse(Response):
+    """
+    Respuesta de archivo con soporte de Range y peticiones condicionales
+
+    Handles If-None-Match, If-Range and single byte ranges. The body goes
+    out through the ASGI zero-copy (sendfile) or pathsend extension when
+    the server offers them, and in chunks otherwise.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        media_type: str,
+        etag: str,
+        cache_control: str,
+        headers: Optional[Mapping[str, str]] = None,
+    ):
+        self.path = path
+        self.size = stat_result.st_size
+        self.status_code = 200
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.headers['etag'] = etag
+        self.headers['cache-control'] = cache_control
+        self.headers['accept-ranges'] = 'bytes'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        request_headers = Headers(scope=scope)
+        etag = self.headers['etag']
+
+        if etag_matches(request_headers.get('if-none-match'), etag):
+            await self._send_empty(send, 304, drop=('content-type', 'content-length', 'accept-ranges'))
+            return
+
+        byte_range = None
+        range_header = request_headers.get('range')
+        if_range = request_headers.get('if-range')
+        # If-Range requires a strong match; otherwise the whole file is sent
+        if range_header and (if_range is None or if_range.strip() == etag):
+            try:
+                byte_range = parse_range(range_header, self.size)
+            except ValueError:
+                self.headers['content-range'] = f"bytes */{self.size}"
+                await self._send_empty(send, 416, drop=('content-type',))
+                return
+
+        if byte_range is None:
+            offset, count, status_code = 0, self.size, 200
+        else:
+            offset, count, status_code = byte_range[0], byte_range[1] - byte_range[0] + 1, 206
+            self.headers['content-range'] = f"bytes {byte_range[0]}-{byte_range[1]}/{self.size}"
+        self.headers['content-length'] = str(count)
+
+        await send({'type': 'http.response.start', 'status': status_code, 'headers': self.raw_headers})
+
+        extensions = scope.get('extensions') or {}
+        if scope['method'].upper() == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        elif 'http.response.zerocopysend' in extensions:
+            with open(self.path, 'rb') as f:
+                await send({
+                    'type': 'http.response.zerocopysend',
+                    'file': f,
+                    'offset': offset,
+                    'count': count,
+                    'more_body': False,
+                })
+        elif 'http.response.pathsend' in extensions and status_code == 200:
+            await send({'type': 'http.response.pathsend', 'path': str(self.path)})
+        else:
+            await self._send_chunks(send, offset, count)
+
+    async def _send_chunks(self, send: Send, offset: int, count: int):
+        async with await anyio.open_file(self.path, mode='rb') as f:
+            await f.seek(offset)
+            remaining = count
+            while True:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                remaining -= len(chunk)
+                more_body = remaining > 0 and len(chunk) > 0
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+                if not more_body:
+                    break
+
+    async def _send_empty(self, send: Send, status_code: int, drop: Tuple[str, ...]):
+        for name in drop:
+            if name in self.headers:
+                del self.headers[name]
+        self.headers['content-length'] = '0'
+        await send({'type': 'http.response.start', 'status': status_code, 'headers': self.raw_headers})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
@@ -0,0 +1,67 @@
+"""
+Asset Variants - Storage layout of derived images and variant selection
+
+Kept free of database and model imports so the PDF renderer can resolve
+images without loading them.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import math
+import re
+
+from app.services.storage.backends import storage_backend
+
+# Variant files are named <name>-<width>x<height>.<ext>
+VARIANT_NAME = re.compile(r'^(?P<name>[a-z]+)-(?P<width>\d+)x(?P<height>\d+)\.(?:jpg|png)$')
+
+
+def derivative_prefix(content_hash: str) -> str:
+    """Storage prefix holding the variants of a stored blob"""
+    return f"derived/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}"
+
+
+def parse_variants(names: List[str]) -> List[Dict[str, Any]]:
+    """Variants among the file names of a derivative prefix"""
+    variants = []
+    for name in names:
+        match = VARIANT_NAME.match(name)
+        if match:
+            variants.append({
+                'name': match['name'],
+                'file': name,
+                'width': int(match['width']),
+                'height': int(match['height']),
+            })
+    return variants
+
+
+def select_variant(key: str, width_px: int, height_px: int) -> str:
+    """
+    Key of the smallest stored variant of a blob that covers a drawing size
+
+    Images are drawn preserving their aspect ratio, so a variant covers
+    the box when it is at least as wide as the image drawn inside it.
+    Falls back to the original when no variant is large enough or the
+    key is not a blob.
+    """
+    content_hash = key.rsplit('/', 1)[-1]
+    if len(content_hash) != 64:
+        return key
+
+    prefix = derivative_prefix(content_hash)
+    best = None
+    for variant in parse_variants(storage_backend.list(prefix)):
+        needed = min(width_px, math.ceil(height_px * variant['width'] / variant['height']))
+        if variant['width'] >= needed and (best is None or variant['width'] < best['width']):
+            best = variant
+
+    if best is None:
+        return key
+    return f"{prefix}/{best['file']}"
+
+
+def resolve_image(key: str, target: Optional[Tuple[int, int]]) -> str:
+    """Local path of a stored image, using the best variant for a pixel size"""
+    if target:
+        key = select_variant(key, *target)
+    return storage_backend.local_path(key)
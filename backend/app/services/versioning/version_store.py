@@ -0,0 +1,190 @@
+"""
+Version Store - Template history as snapshots plus compressed delta chains
+"""
+
+from typing import Any, Dict, List, Optional
+import copy
+import json
+import zlib
+import logging
+
+import jsonpatch
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.template import Template
+from app.models.version import TemplateVersion
+
+logger = logging.getLogger(__name__)
+
+# Template fields captured in each version
+VERSIONED_FIELDS = ('name', 'description', 'content', 'page_size', 'variables', 'styles', 'metadata', 'tags')
+
+# Template attributes of fields whose serialized name differs
+FIELD_ATTRIBUTES = {'metadata': 'meta'}
+
+
+def field_attribute(field: str) -> str:
+    """Template attribute holding a versioned field"""
+    return FIELD_ATTRIBUTES.get(field, field)
+
+
+def snapshot_document(template: Template) -> Dict[str, Any]:
+    """Versioned fields of a template as a plain dict"""
+    return json.loads(json.dumps({field: getattr(template, field_attribute(field)) for field in VERSIONED_FIELDS}))
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+class VersionStore:
+    """
+    Almacén de versiones de plantillas
+
+    Every Nth version (VERSION_SNAPSHOT_INTERVAL) is stored as a full
+    snapshot; the versions in between store a zlib-compressed JSON Patch
+    against their predecessor. Materializing a version loads its snapshot
+    and replays fewer than N deltas.
+    """
+
+    def __init__(self, db: AsyncSession, snapshot_interval: Optional[int] = None):
+        self.db = db
+        self.snapshot_interval = max(1, snapshot_interval or settings.VERSION_SNAPSHOT_INTERVAL)
+
+    async def record(
+        self,
+        template: Template,
+        previous: Dict[str, Any],
+        user_id: Any,
+        comment: Optional[str] = None,
+    ) -> TemplateVersion:
+        """
+        Record the current state of a template as template.version
+
+        Args:
+            template: Template after the change, with its version already bumped
+            previous: snapshot_document() taken before the change
+            user_id: Author of the change
+            comment: Optional description of the change
+
+        Returns:
+            The added TemplateVersion (not committed)
+        """
+        document = snapshot_document(template)
+        latest = await self._latest(template.id)
+
+        # Templates without history start it with the state before this change
+        if latest is None and template.version > 1:
+            latest = self._snapshot(template.id, template.version - 1, previous, user_id, None)
+            self.db.add(latest)
+
+        if (
+            latest is None
+            or latest.version != template.version - 1
+            or template.version - latest.base_version >= self.snapshot_interval
+        ):
+            entry = self._snapshot(template.id, template.version, document, user_id, comment)
+        else:
+            patch = _dumps(jsonpatch.make_patch(previous, document).patch)
+            snapshot = _dumps(document)
+
+            # A delta as large as the document (e.g. a full rewrite) is not worth replaying
+            if len(patch) * 2 > len(snapshot):
+                entry = self._snapshot(template.id, template.version, document, user_id, comment, snapshot)
+            else:
+                delta = zlib.compress(patch)
+                entry = TemplateVersion(
+                    template_id=template.id,
+                    version=template.version,
+                    delta=delta,
+                    base_version=latest.base_version,
+                    size=len(delta),
+                    comment=comment,
+                    created_by=user_id,
+                )
+
+        self.db.add(entry)
+        return entry
+
+    def _snapshot(
+        self,
+        template_id: Any,
+        version: int,
+        document: Dict[str, Any],
+        user_id: Any,
+        comment: Optional[str],
+        encoded: Optional[bytes] = None,
+    ) -> TemplateVersion:
+        return TemplateVersion(
+            template_id=template_id,
+            version=version,
+            content=document,
+            base_version=version,
+            size=len(encoded or _dumps(document)),
+            comment=comment,
+            created_by=user_id,
+        )
+
+    async def _latest(self, template_id: Any) -> Optional[TemplateVersion]:
+        result = await self.db.execute(
+            select(TemplateVersion)
+            .where(TemplateVersion.template_id == template_id)
+            .order_by(TemplateVersion.version.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def list_versions(self, template_id: Any, limit: int = 50, offset: int = 0) -> List[TemplateVersion]:
+        """List versions of a template, newest first"""
+        result = await self.db.execute(
+            select(TemplateVersion)
+            .where(TemplateVersion.template_id == template_id)
+            .order_by(TemplateVersion.version.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def materialize(self, template_id: Any, version: int) -> Dict[str, Any]:
+        """
+        Rebuild the document of a version
+
+        Raises:
+            ValueError: If the version is not in the history
+        """
+        result = await self.db.execute(
+            select(TemplateVersion.base_version).where(
+                TemplateVersion.template_id == template_id,
+                TemplateVersion.version == version,
+            )
+        )
+        base_version = result.scalar_one_or_none()
+        if base_version is None:
+            raise ValueError(f"Version {version} not found")
+
+        result = await self.db.execute(
+            select(TemplateVersion)
+            .where(
+                TemplateVersion.template_id == template_id,
+                TemplateVersion.version >= base_version,
+                TemplateVersion.version <= version,
+            )
+            .order_by(TemplateVersion.version)
+        )
+        chain = result.scalars().all()
+
+        # Copy the snapshot once, then replay the deltas in place
+        document = copy.deepcopy(chain[0].content)
+        for entry in chain[1:]:
+            patch = json.loads(zlib.decompress(entry.delta))
+            document = jsonpatch.apply_patch(document, patch, in_place=True)
+
+        return document
+
+    async def diff(self, template_id: Any, from_version: int, to_version: int) -> List[Dict[str, Any]]:
+        """JSON Patch that turns from_version into to_version"""
+        source = await self.materialize(template_id, from_version)
+        target = await self.materialize(template_id, to_version)
+        return jsonpatch.make_patch(source, target).patch
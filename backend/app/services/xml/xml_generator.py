@@ -2,195 +2,423 @@
 XML Generator - Generate XML from Python template structure
 """
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator, Optional, BinaryIO
+from io import BytesIO
 from lxml import etree
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Indentation used when pretty printing
+INDENT = "  "
+
+# Depth of the children of the inner Layout (WorkFlow > Layout > Layout > child)
+LAYOUT_CHILD_LEVEL = 3
+
+
+class _ChunkBuffer:
+    """Write target that collects bytes until they are drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data: bytes):
+        self._chunks.append(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
 
 class XMLGenerator:
     """
     Generator para convertir estructura Python a XML de plantillas
     """
 
-    def generate(self, template_data: Dict[str, Any]) -> str:
+    def __init__(self):
+        self._written_flows = set()
+        self._written_images = set()
+
+    def generate(self, template_data: Dict[str, Any], pretty_print: bool = True) -> str:
         """
         Generate XML from template structure
 
         Args:
             template_data: Template data dictionary
+            pretty_print: Indent the output
 
         Returns:
             XML string
         """
-        # Create root element
-        root = etree.Element("WorkFlow")
+        buffer = BytesIO()
+        self.write(template_data, buffer, pretty_print=pretty_print)
+        return buffer.getvalue().decode('utf-8')
 
-        # Create Layout
-        layout_root = etree.SubElement(root, "Layout")
-        layout_id = etree.SubElement(layout_root, "Id")
-        layout_id.text = template_data.get('layout_id', 'Layout1')
+    def write(self, template_data: Dict[str, Any], output: BinaryIO, pretty_print: bool = True):
+        """
+        Write XML incrementally to a binary stream
 
-        layout_name = etree.SubElement(layout_root, "Name")
-        layout_name.text = template_data.get('layout_name', 'Template')
+        Only one top-level Layout child is held in memory at a time.
 
-        layout = etree.SubElement(layout_root, "Layout")
+        Args:
+            template_data: Template data dictionary
+            output: Binary file object or path
+            pretty_print: Indent the output
+        """
+        for _ in self._write(template_data, output, pretty_print):
+            pass
 
-        # Generate variables
-        self._generate_variables(layout, template_data.get('variables', []))
+    def iter_chunks(self, template_data: Dict[str, Any], pretty_print: bool = True) -> Iterator[bytes]:
+        """
+        Generate XML as a sequence of byte chunks, e.g. for a streaming response
 
-        # Generate pages
-        self._generate_pages(layout, template_data.get('pages', []))
+        Args:
+            template_data: Template data dictionary
+            pretty_print: Indent the output
 
-        # Generate styles
-        self._generate_styles(layout, template_data.get('styles', {}))
+        Yields:
+            Encoded XML chunks
+        """
+        buffer = _ChunkBuffer()
+        for _ in self._write(template_data, buffer, pretty_print):
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
 
-        # Pretty print XML
-        xml_string = etree.tostring(
-            root,
-            pretty_print=True,
-            xml_declaration=True,
-            encoding='UTF-8'
-        ).decode('utf-8')
+        chunk = buffer.drain()
+        if chunk:
+            yield chunk
 
-        return xml_string
+    def _write(self, template_data: Dict[str, Any], output: Any, pretty_print: bool) -> Iterator[None]:
+        """Write the document, yielding after each top-level Layout child is flushed"""
+        self._written_flows = set()
+        self._written_images = set()
 
-    def _generate_variables(self, parent: etree.Element, variables: List[Dict[str, Any]]):
-        """Generate Variable elements"""
-        for var in variables:
-            var_elem = etree.SubElement(parent, "Variable")
+        with etree.xmlfile(output, encoding='UTF-8') as xf:
+            xf.write_declaration()
 
-            id_elem = etree.SubElement(var_elem, "Id")
-            id_elem.text = str(var.get('id', ''))
+            with xf.element("WorkFlow"):
+                self._write_node(xf, None, 1, pretty_print)
 
-            name_elem = etree.SubElement(var_elem, "Name")
-            name_elem.text = var.get('name', '')
+                with xf.element("Layout"):
+                    layout_id = etree.Element("Id")
+                    layout_id.text = template_data.get('layout_id', 'Layout1')
+                    self._write_node(xf, layout_id, 2, pretty_print)
 
-            parent_id = var.get('parent_id')
-            if parent_id:
-                parent_elem = etree.SubElement(var_elem, "ParentId")
-                parent_elem.text = str(parent_id)
+                    layout_name = etree.Element("Name")
+                    layout_name.text = template_data.get('layout_name', 'Template')
+                    self._write_node(xf, layout_name, 2, pretty_print)
 
-                index_elem = etree.SubElement(var_elem, "IndexInParent")
-                index_elem.text = str(var.get('index', 0))
+                    self._write_node(xf, None, 2, pretty_print)
 
-    def _generate_pages(self, parent: etree.Element, pages: List[Dict[str, Any]]):
-        """Generate Page elements"""
-        for page in pages:
-            # Page declaration
-            page_decl = etree.SubElement(parent, "Page")
+                    with xf.element("Layout"):
+                        for node in self._iter_layout_nodes(template_data):
+                            self._write_node(xf, node, LAYOUT_CHILD_LEVEL, pretty_print)
+                            xf.flush()
+                            yield
 
-            id_elem = etree.SubElement(page_decl, "Id")
-            id_elem.text = str(page.get('id', ''))
+                        self._write_node(xf, None, LAYOUT_CHILD_LEVEL - 1, pretty_print)
 
-            name_elem = etree.SubElement(page_decl, "Name")
-            name_elem.text = page.get('name', 'Page')
+                    self._write_node(xf, None, 1, pretty_print)
 
-            parent_id_elem = etree.SubElement(page_decl, "ParentId")
-            parent_id_elem.text = "Def.Pages"
+                self._write_node(xf, None, 0, pretty_print)
+
+    def _write_node(self, xf, node: Optional[etree.Element], level: int, pretty_print: bool):
+        """
+        Write a subtree at the given depth
 
-            index_elem = etree.SubElement(page_decl, "IndexInParent")
-            index_elem.text = str(page.get('index', 0))
+        With node=None only the indentation before the next container tag is
+        written.
+        """
+        if pretty_print:
+            xf.write("\n" + INDENT * level)
+            if node is not None:
+                etree.indent(node, space=INDENT, level=level)
 
-            # Page configuration
-            page_config = etree.SubElement(parent, "Page")
+        if node is not None:
+            xf.write(node)
 
-            id_elem = etree.SubElement(page_config, "Id")
-            id_elem.text = str(page.get('id', ''))
+    def _iter_layout_nodes(self, template_data: Dict[str, Any]) -> Iterator[etree.Element]:
+        """Yield every child of the inner Layout element in document order"""
+        yield from self._generate_variables(template_data.get('variables', []))
+        yield from self._generate_pages(template_data.get('pages', []))
+        yield from self._generate_styles(template_data.get('styles', {}))
 
-            cond_elem = etree.SubElement(page_config, "ConditionType")
-            cond_elem.text = page.get('condition_type', 'Simple')
+    def _generate_variables(self, variables: List[Dict[str, Any]]) -> Iterator[etree.Element]:
+        """Generate Variable elements"""
+        for var in variables:
+            var_elem = etree.Element("Variable")
 
-            width_elem = etree.SubElement(page_config, "Width")
-            width_elem.text = str(page.get('width', 0.2159))
+            self._text(var_elem, "Id", var.get('id', ''))
+            self._text(var_elem, "Name", var.get('name', ''))
 
-            height_elem = etree.SubElement(page_config, "Height")
-            height_elem.text = str(page.get('height', 0.2794))
+            parent_id = var.get('parent_id')
+            if parent_id:
+                self._text(var_elem, "ParentId", parent_id)
+                self._text(var_elem, "IndexInParent", var.get('index', 0))
 
-            next_page_elem = etree.SubElement(page_config, "NextPageId")
-            next_page_elem.text = page.get('next_page_id', '')
+            yield var_elem
+
+    def _generate_pages(self, pages: List[Dict[str, Any]]) -> Iterator[etree.Element]:
+        """Generate Page elements"""
+        for page in pages:
+            page_id = page.get('id', '')
+
+            # Page declaration
+            page_decl = etree.Element("Page")
+            self._text(page_decl, "Id", page_id)
+            self._text(page_decl, "Name", page.get('name', 'Page'))
+            self._text(page_decl, "ParentId", page.get('parent_id') or "Def.Pages")
+            self._text(page_decl, "IndexInParent", page.get('index', 0))
+            yield page_decl
+
+            # Page configuration, only if the page has one
+            if any(key in page for key in ('width', 'height', 'condition_type', 'next_page_id')):
+                page_config = etree.Element("Page")
+                self._text(page_config, "Id", page_id)
+                self._text(page_config, "ConditionType", page.get('condition_type', 'Simple'))
+                self._text(page_config, "Width", page.get('width', 0.2159))
+                self._text(page_config, "Height", page.get('height', 0.2794))
+                self._text(page_config, "NextPageId", page.get('next_page_id'))
+                yield page_config
 
             # Generate page elements
-            for element in page.get('elements', []):
-                self._generate_element(parent, element)
+            for index, element in enumerate(page.get('elements', [])):
+                yield from self._generate_element(element, page_id, index)
 
-    def _generate_element(self, parent: etree.Element, element: Dict[str, Any]):
+    def _generate_element(self, element: Dict[str, Any], page_id: str, index: int) -> Iterator[etree.Element]:
         """Generate element based on type"""
         element_type = element.get('type')
 
         if element_type == 'FlowArea':
-            self._generate_flow_area(parent, element)
+            yield from self._generate_flow_area(element, page_id, index)
         elif element_type == 'ImageObject':
-            self._generate_image_object(parent, element)
+            yield from self._generate_image_object(element, page_id, index)
         elif element_type == 'PathObject':
-            self._generate_path_object(parent, element)
+            yield from self._generate_path_object(element, page_id, index)
         elif element_type == 'Barcode':
-            self._generate_barcode(parent, element)
+            yield from self._generate_barcode(element, page_id, index)
         elif element_type == 'Chart':
-            self._generate_chart(parent, element)
+            yield from self._generate_chart(element, page_id, index)
+        else:
+            logger.warning(f"Skipping unknown element type on export: {element_type}")
+
+    def _generate_flow_area(self, element: Dict[str, Any], page_id: str, index: int) -> Iterator[etree.Element]:
+        """Generate FlowArea declaration, configuration and its Flow"""
+        yield self._declaration("FlowArea", element, 'FlowArea', page_id, index)
+
+        config = self._configuration("FlowArea", element)
+        self._text(config, "FlowId", element.get('flow_id'))
+        self._text(config, "BorderStyleId", element.get('border_style_id'))
+        yield config
+
+        flow = element.get('flow_content') or {}
+        flow_id = flow.get('id') or element.get('flow_id')
+        if flow and flow_id and flow_id not in self._written_flows:
+            self._written_flows.add(flow_id)
+            yield self._generate_flow(flow_id, flow)
+
+    def _generate_flow(self, flow_id: str, flow: Dict[str, Any]) -> etree.Element:
+        """Generate Flow configuration element"""
+        flow_elem = etree.Element("Flow")
+        self._text(flow_elem, "Id", flow_id)
+        self._text(flow_elem, "Type", flow.get('type', 'Simple'))
+
+        if flow.get('content'):
+            self._generate_flow_content(flow_elem, flow['content'])
+
+        for condition in flow.get('conditions', []):
+            cond_elem = etree.SubElement(flow_elem, "Condition")
+            cond_elem.set('Value', condition.get('value', ''))
+            self._generate_flow_content(cond_elem, condition.get('content', []))
+
+        if 'default' in flow:
+            default_elem = etree.SubElement(flow_elem, "Default")
+            self._generate_flow_content(default_elem, flow['default'])
+
+        return flow_elem
+
+    def _generate_flow_content(self, parent: etree.Element, content: List[Dict[str, Any]]):
+        """Generate FlowContent paragraphs and text runs"""
+        flow_content = etree.SubElement(parent, "FlowContent")
+
+        for paragraph in content:
+            para_elem = etree.SubElement(flow_content, "P")
+            para_elem.set('Id', paragraph.get('style_id', ''))
+
+            for text_run in paragraph.get('text_runs', []):
+                text_elem = etree.SubElement(para_elem, "T")
+                text_elem.set('Id', text_run.get('style_id', ''))
+
+                if text_run.get('type') == 'variable':
+                    obj_ref = etree.SubElement(text_elem, "O")
+                    obj_ref.set('Id', str(text_run.get('variable_id', '')))
+                else:
+                    text_elem.text = text_run.get('text', '')
+
+    def _generate_image_object(self, element: Dict[str, Any], page_id: str, index: int) -> Iterator[etree.Element]:
+        """Generate ImageObject declaration, configuration and its Image"""
+        yield self._declaration("ImageObject", element, 'Image', page_id, index)
+
+        config = self._configuration("ImageObject", element)
+        self._text(config, "ImageId", element.get('image_id'))
+
+        transformation = element.get('transformation')
+        if transformation:
+            for i in range(6):
+                self._text(config, f"Transformation_M{i}", transformation.get(f'm{i}', 0))
+        yield config
+
+        image = element.get('image') or {}
+        image_id = image.get('id') or element.get('image_id')
+        if image and image_id and image_id not in self._written_images:
+            self._written_images.add(image_id)
+
+            image_elem = etree.Element("Image")
+            self._text(image_elem, "Id", image_id)
+            self._text(image_elem, "ImageType", image.get('type', 'Simple'))
+            self._text(image_elem, "ImageLocation", image.get('location', ''))
+            self._text(image_elem, "VariableId", image.get('variable_id'))
+            yield image_elem
+
+    def _generate_path_object(self, element: Dict[str, Any], page_id: str, index: int) -> Iterator[etree.Element]:
+        """Generate PathObject declaration and configuration"""
+        yield self._declaration("PathObject", element, 'Path', page_id, index)
+
+        config = self._configuration("PathObject", element)
+
+        path_elem = etree.SubElement(config, "Path")
+        for cmd in element.get('path', []):
+            cmd_elem = etree.SubElement(path_elem, cmd.get('type', 'LineTo'))
+            if cmd.get('type') != 'ClosePath':
+                cmd_elem.set('X', str(cmd.get('x', 0)))
+                cmd_elem.set('Y', str(cmd.get('y', 0)))
+
+        self._text(config, "FillStyleId", element.get('fill_style_id'))
+        yield config
+
+    def _generate_barcode(self, element: Dict[str, Any], page_id: str, index: int) -> Iterator[etree.Element]:
+        """Generate Barcode declaration and configuration"""
+        yield self._declaration("Barcode", element, 'Barcode', page_id, index)
+
+        config = self._configuration("Barcode", element)
+        self._text(config, "VariableId", element.get('variable_id'))
+        self._text(config, "FillStyleId", element.get('fill_style_id'))
+
+        generator = element.get('generator')
+        if generator:
+            gen_elem = etree.SubElement(config, "BarcodeGenerator")
+            self._text(gen_elem, "Type", generator.get('type', 'QR'))
+            self._text(gen_elem, "ErrorLevel", generator.get('error_level', 'M'))
+            self._text(gen_elem, "ModuleWidth", generator.get('module_width', 0.001))
+            self._text(gen_elem, "ModuleSize", generator.get('module_size', 0.001))
+            self._text(gen_elem, "Height", generator.get('height', 0.03))
+
+        yield config
+
+    def _generate_chart(self, element: Dict[str, Any], page_id: str, index: int) -> Iterator[etree.Element]:
+        """Generate Chart declaration and configuration"""
+        yield self._declaration("Chart", element, 'Chart', page_id, index)
+
+        config = self._configuration("Chart", element)
+        self._text(config, "Chart_Type", element.get('chart_type', 'Bar'))
+        self._text(config, "Chart_Title", element.get('title', ''))
+
+        series = element.get('series', [])
+        if series:
+            serie_elem = etree.SubElement(config, "Serie")
+            for item in series:
+                item_elem = etree.SubElement(serie_elem, "SerieItem")
+                self._text(item_elem, "Value", item.get('value', 0))
+                self._text(item_elem, "Label", item.get('label', ''))
+
+        yield config
+
+    def _generate_styles(self, styles: Dict[str, Any]) -> Iterator[etree.Element]:
+        """Generate style definitions"""
+        # Generate fonts
+        for font_id, font_data in styles.get('fonts', {}).items():
+            font_elem = etree.Element("Font")
 
-    def _generate_flow_area(self, parent: etree.Element, element: Dict[str, Any]):
-        """Generate FlowArea element"""
-        # Declaration
-        decl = etree.SubElement(parent, "FlowArea")
+            id_elem = etree.SubElement(font_elem, "Id")
+            id_elem.set('Name', font_id)
+            id_elem.text = "Def.Font"
 
-        id_elem = etree.SubElement(decl, "Id")
-        id_elem.text = str(element.get('id', ''))
+            self._text(font_elem, "Name", font_data.get('name', 'Arial'))
+            self._text(font_elem, "FontName", font_data.get('font_name', 'Arial'))
 
-        name_elem = etree.SubElement(decl, "Name")
-        name_elem.text = element.get('name', 'FlowArea')
+            for sub_name, sub_data in font_data.get('sub_fonts', {}).items():
+                sub_elem = etree.SubElement(font_elem, "SubFont")
+                sub_elem.set('Name', sub_name)
+                self._text(sub_elem, "FontLocation", sub_data.get('location', ''))
 
-        parent_id_elem = etree.SubElement(decl, "ParentId")
-        parent_id_elem.text = str(element.get('parent_id', ''))
+            yield font_elem
 
-        index_elem = etree.SubElement(decl, "IndexInParent")
-        index_elem.text = str(element.get('index', 0))
+        # Generate colors
+        for color_id, color_data in styles.get('colors', {}).items():
+            color_elem = etree.Element("Color")
 
-        # Configuration
-        config = etree.SubElement(parent, "FlowArea")
+            id_elem = etree.SubElement(color_elem, "Id")
+            id_elem.set('Name', color_id)
+            id_elem.text = "Def.Color"
 
-        id_elem = etree.SubElement(config, "Id")
-        id_elem.text = str(element.get('id', ''))
+            self._text(
+                color_elem, "RGB",
+                f"{color_data.get('r', 0)},{color_data.get('g', 0)},{color_data.get('b', 0)}"
+            )
 
-        pos = element.get('position', {})
-        pos_elem = etree.SubElement(config, "Pos")
-        pos_elem.set('X', str(pos.get('x', 0)))
-        pos_elem.set('Y', str(pos.get('y', 0)))
+            yield color_elem
 
-        size = element.get('size', {})
-        size_elem = etree.SubElement(config, "Size")
-        size_elem.set('X', str(size.get('width', 0)))
-        size_elem.set('Y', str(size.get('height', 0)))
+        # Generate text styles
+        for style_id, style_data in styles.get('text_styles', {}).items():
+            style_elem = etree.Element("TextStyle")
 
-        flow_id_elem = etree.SubElement(config, "FlowId")
-        flow_id_elem.text = str(element.get('flow_id', ''))
+            id_elem = etree.SubElement(style_elem, "Id")
+            id_elem.set('Name', style_id)
+            id_elem.text = "Def.TextStyle"
 
-        border_elem = etree.SubElement(config, "BorderStyleId")
-        border_elem.text = element.get('border_style_id', '')
+            self._text(style_elem, "FontSize", style_data.get('font_size', 0.004))
+            self._text(style_elem, "FillStyleId", style_data.get('fill_style_id'))
+            self._text(style_elem, "FontId", style_data.get('font_id'))
+            self._text(style_elem, "SubFont", style_data.get('sub_font', 'Regular'))
 
-    def _generate_image_object(self, parent: etree.Element, element: Dict[str, Any]):
-        """Generate ImageObject element"""
-        # Declaration
-        decl = etree.SubElement(parent, "ImageObject")
+            yield style_elem
 
-        id_elem = etree.SubElement(decl, "Id")
-        id_elem.text = str(element.get('id', ''))
+        # Generate paragraph styles
+        for style_id, style_data in styles.get('para_styles', {}).items():
+            style_elem = etree.Element("ParaStyle")
 
-        name_elem = etree.SubElement(decl, "Name")
-        name_elem.text = element.get('name', 'Image')
+            id_elem = etree.SubElement(style_elem, "Id")
+            id_elem.set('Name', style_id)
+            id_elem.text = "Def.ParaStyle"
 
-        parent_id_elem = etree.SubElement(decl, "ParentId")
-        parent_id_elem.text = str(element.get('parent_id', ''))
+            self._text(style_elem, "LeftIndent", style_data.get('left_indent', 0))
+            self._text(style_elem, "RightIndent", style_data.get('right_indent', 0))
+            self._text(style_elem, "SpaceBefore", style_data.get('space_before', 0))
+            self._text(style_elem, "SpaceAfter", style_data.get('space_after', 0))
+            self._text(style_elem, "LineSpacing", style_data.get('line_spacing', 0))
+            self._text(style_elem, "HAlign", style_data.get('h_align', 'Left'))
 
-        index_elem = etree.SubElement(decl, "IndexInParent")
-        index_elem.text = str(element.get('index', 0))
+            yield style_elem
 
-        # Configuration
-        config = etree.SubElement(parent, "ImageObject")
+    def _declaration(self, tag: str, element: Dict[str, Any], default_name: str,
+                     page_id: str, index: int) -> etree.Element:
+        """Generate the declaration of a page element (Id, Name, ParentId, IndexInParent)"""
+        decl = etree.Element(tag)
 
-        id_elem = etree.SubElement(config, "Id")
-        id_elem.text = str(element.get('id', ''))
+        self._text(decl, "Id", element.get('id', ''))
+        self._text(decl, "Name", element.get('name', default_name))
+        self._text(decl, "ParentId", element.get('parent_id') or page_id)
+        self._text(decl, "IndexInParent", element.get('index', index))
+
+        return decl
+
+    def _configuration(self, tag: str, element: Dict[str, Any]) -> etree.Element:
+        """Generate the configuration of a page element with Id, Pos and Size"""
+        config = etree.Element(tag)
+
+        self._text(config, "Id", element.get('id', ''))
 
         pos = element.get('position', {})
         pos_elem = etree.SubElement(config, "Pos")
@@ -202,47 +430,11 @@ class XMLGenerator:
         size_elem.set('X', str(size.get('width', 0)))
         size_elem.set('Y', str(size.get('height', 0)))
 
-        image_id_elem = etree.SubElement(config, "ImageId")
-        image_id_elem.text = str(element.get('image_id', ''))
-
-    def _generate_path_object(self, parent: etree.Element, element: Dict[str, Any]):
-        """Generate PathObject element"""
-        # Similar to FlowArea and ImageObject
-        pass
-
-    def _generate_barcode(self, parent: etree.Element, element: Dict[str, Any]):
-        """Generate Barcode element"""
-        # Similar structure
-        pass
-
-    def _generate_chart(self, parent: etree.Element, element: Dict[str, Any]):
-        """Generate Chart element"""
-        # Similar structure
-        pass
-
-    def _generate_styles(self, parent: etree.Element, styles: Dict[str, Any]):
-        """Generate style definitions"""
-        # Generate fonts
-        for font_id, font_data in styles.get('fonts', {}).items():
-            font_elem = etree.SubElement(parent, "Font")
-
-            id_elem = etree.SubElement(font_elem, "Id")
-            id_elem.set('Name', font_id)
-            id_elem.text = "Def.Font"
-
-            name_elem = etree.SubElement(font_elem, "Name")
-            name_elem.text = font_data.get('name', 'Arial')
-
-            font_name_elem = etree.SubElement(font_elem, "FontName")
-            font_name_elem.text = font_data.get('font_name', 'Arial')
-
-        # Generate colors
-        for color_id, color_data in styles.get('colors', {}).items():
-            color_elem = etree.SubElement(parent, "Color")
-
-            id_elem = etree.SubElement(color_elem, "Id")
-            id_elem.set('Name', color_id)
-            id_elem.text = "Def.Color"
+        return config
 
-            rgb_elem = etree.SubElement(color_elem, "RGB")
-            rgb_elem.text = f"{color_data.get('r', 0)},{color_data.get('g', 0)},{color_data.get('b', 0)}"
+    def _text(self, parent: etree.Element, tag: str, value: Any) -> etree.Element:
+        """Append a child element with text; None produces an empty element"""
+        child = etree.SubElement(parent, tag)
+        if value is not None:
+            child.text = str(value)
+        return child
@@ -2,12 +2,20 @@
 XML Parser - Parse XML templates to Python objects
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union, BinaryIO
 from lxml import etree
 import logging
 
+from app.core.metrics import XML_PARSE_SECONDS
+
 logger = logging.getLogger(__name__)
 
+# Element types placed on pages, in the order they are listed per page
+PAGE_ELEMENT_TAGS = ('FlowArea', 'ImageObject', 'PathObject', 'Barcode', 'Chart')
+
+# Style definition elements collected into the styles dictionary
+STYLE_TAGS = ('Font', 'Color', 'TextStyle', 'ParaStyle')
+
 
 class XMLParser:
     """
@@ -30,12 +38,29 @@ class XMLParser:
         Parse XML string to dictionary structure
         """
         try:
-            root = etree.fromstring(xml_string.encode('utf-8'))
-            return self._parse_workflow(root)
+            with XML_PARSE_SECONDS.labels('parse').time():
+                root = etree.fromstring(xml_string.encode('utf-8'))
+                return self._parse_workflow(root)
         except Exception as e:
             logger.error(f"Error parsing XML: {e}")
             raise ValueError(f"Invalid XML: {e}")
 
+    def parse_stream(self, source: Union[str, BinaryIO]) -> Dict[str, Any]:
+        """
+        Parse XML from a file path or binary file object using iterparse
+
+        Each top-level child of the Layout is indexed as soon as it is closed
+        and then cleared, so peak memory is bounded by the largest single
+        element instead of the whole document. Returns the same structure as
+        parse().
+        """
+        try:
+            with XML_PARSE_SECONDS.labels('parse_stream').time():
+                return self._parse_workflow_stream(source)
+        except Exception as e:
+            logger.error(f"Error parsing XML stream: {e}")
+            raise ValueError(f"Invalid XML: {e}")
+
     def _parse_workflow(self, root: etree.Element) -> Dict[str, Any]:
         """Parse WorkFlow root element"""
         layout = root.find('.//Layout')
@@ -60,27 +85,200 @@ class XMLParser:
 
         return result
 
+    def _parse_workflow_stream(self, source: Union[str, BinaryIO]) -> Dict[str, Any]:
+        """Parse WorkFlow incrementally, indexing Layout children as they close"""
+        context = etree.iterparse(
+            source,
+            events=('start', 'end'),
+            remove_comments=True,
+            remove_pis=True,
+            huge_tree=True,
+        )
+
+        index = None
+        layout_id = None
+        layout_name = None
+
+        depth = 0
+        outer_depth = None  # depth of the first Layout element
+        inner_depth = None  # depth of the nested Layout holding the template
+        outer_open = False
+        inner_open = False
+
+        for event, elem in context:
+            if event == 'start':
+                depth += 1
+                if outer_depth is None and depth > 1 and elem.tag == 'Layout':
+                    outer_depth = depth
+                    outer_open = True
+                elif (outer_open and inner_depth is None
+                        and depth == outer_depth + 1 and elem.tag == 'Layout'):
+                    inner_depth = depth
+                    inner_open = True
+                    index = self._new_stream_index()
+                continue
+
+            if inner_open and depth > inner_depth + 1:
+                # Descendants are parsed together with their Layout child
+                depth -= 1
+                continue
+
+            if inner_open and depth == inner_depth + 1:
+                self._index_stream_element(elem, index)
+            elif inner_open and depth == inner_depth:
+                inner_open = False
+            elif outer_open and depth == outer_depth + 1:
+                if elem.tag == 'Id' and layout_id is None:
+                    layout_id = elem.text or ''
+                elif elem.tag == 'Name' and layout_name is None:
+                    layout_name = elem.text or ''
+            elif outer_open and depth == outer_depth:
+                outer_open = False
+
+            # Free everything already processed
+            elem.clear(keep_tail=True)
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+            depth -= 1
+
+        del context
+
+        if outer_depth is None:
+            raise ValueError("No Layout found in XML")
+
+        result = {
+            'layout_id': layout_id or '',
+            'layout_name': layout_name or '',
+            'variables': [],
+            'pages': [],
+            'elements': [],
+            'styles': {},
+        }
+
+        if index is not None:
+            result['variables'] = index['variables']
+            result['pages'] = self._assemble_stream_pages(index)
+            result['styles'] = index['styles']
+
+        return result
+
+    def _new_stream_index(self) -> Dict[str, Any]:
+        """Create the incremental index filled by _index_stream_element"""
+        return {
+            'variables': [],
+            'pages': [],
+            'page_configs': {},
+            'declarations': {tag: {} for tag in PAGE_ELEMENT_TAGS},
+            'configs': {tag: {} for tag in PAGE_ELEMENT_TAGS},
+            'flows': {},
+            'images': {},
+            'styles': self._empty_styles(),
+        }
+
+    def _index_stream_element(self, elem: etree.Element, index: Dict[str, Any]):
+        """Index a closed top-level Layout child before it is cleared"""
+        tag = elem.tag
+
+        if tag == 'Variable':
+            index['variables'].append(self._parse_variable(elem))
+
+        elif tag == 'Page':
+            if self._get_text(elem, 'ParentId'):
+                index['pages'].append(self._parse_page_declaration(elem))
+            else:
+                index['page_configs'][self._get_text(elem, 'Id')] = self._parse_page_config(elem)
+
+        elif tag in PAGE_ELEMENT_TAGS:
+            elem_id = self._get_text(elem, 'Id')
+            parent_id = self._get_text(elem, 'ParentId')
+
+            if parent_id:
+                declaration = {'id': elem_id, 'name': self._get_text(elem, 'Name')}
+                index['declarations'][tag].setdefault(parent_id, []).append(declaration)
+
+            # First element with Pos is the configuration, as with find()
+            if elem.find('Pos') is not None and elem_id not in index['configs'][tag]:
+                index['configs'][tag][elem_id] = self._parse_element_config(tag, elem)
+
+        elif tag == 'Flow':
+            flow_id = self._get_text(elem, 'Id')
+            if elem.find('Type') is not None and flow_id not in index['flows']:
+                index['flows'][flow_id] = self._parse_flow_config(elem, flow_id)
+
+        elif tag == 'Image':
+            image_id = self._get_text(elem, 'Id')
+            if elem.find('ImageType') is not None and image_id not in index['images']:
+                index['images'][image_id] = self._parse_image_config(elem, image_id)
+
+        elif tag in STYLE_TAGS:
+            self._add_style(index['styles'], elem)
+
+    def _assemble_stream_pages(self, index: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Resolve indexed declarations, configurations and references into pages"""
+        pages = index['pages']
+        self.flows.update(index['flows'])
+        self.images.update(index['images'])
+
+        for page in pages:
+            if page['id'] in index['page_configs']:
+                page.update(index['page_configs'][page['id']])
+
+            elements = []
+            for tag in PAGE_ELEMENT_TAGS:
+                for declaration in index['declarations'][tag].get(page['id'], []):
+                    config = index['configs'][tag].get(declaration['id'])
+                    if config is None:
+                        config = self._parse_element_config(tag, None)
+
+                    element = {'type': tag, **declaration, **config}
+
+                    if tag == 'FlowArea' and element['flow_id']:
+                        element['flow_content'] = index['flows'].get(element['flow_id'], {})
+                    elif tag == 'ImageObject' and element['image_id']:
+                        element['image'] = index['images'].get(element['image_id'], {})
+
+                    elements.append(element)
+
+            page['elements'] = elements
+
+        return pages
+
+    def _parse_element_config(self, tag: str, config: Optional[etree.Element]) -> Dict[str, Any]:
+        """Parse the configuration of a page element by tag"""
+        config_parsers = {
+            'FlowArea': self._parse_flow_area_config,
+            'ImageObject': self._parse_image_object_config,
+            'PathObject': self._parse_path_object_config,
+            'Barcode': self._parse_barcode_config,
+            'Chart': self._parse_chart_config,
+        }
+        return config_parsers[tag](config)
+
     def _parse_variables(self, layout: etree.Element) -> List[Dict[str, Any]]:
         """Parse all Variable elements"""
         variables = []
 
         for var in layout.findall('.//Variable'):
-            var_id = self._get_text(var, 'Id')
+            variables.append(self._parse_variable(var))
 
-            # Check if this is a declaration or definition
-            parent_id = self._get_text(var, 'ParentId')
+        return variables
 
-            variable = {
-                'id': var_id,
-                'name': self._get_text(var, 'Name'),
-                'parent_id': parent_id,
-                'index': self._get_text(var, 'IndexInParent'),
-            }
+    def _parse_variable(self, var: etree.Element) -> Dict[str, Any]:
+        """Parse a single Variable element"""
+        var_id = self._get_text(var, 'Id')
 
-            variables.append(variable)
-            self.variables[var_id] = variable
+        # Check if this is a declaration or definition
+        parent_id = self._get_text(var, 'ParentId')
 
-        return variables
+        variable = {
+            'id': var_id,
+            'name': self._get_text(var, 'Name'),
+            'parent_id': parent_id,
+            'index': self._get_text(var, 'IndexInParent'),
+        }
+
+        self.variables[var_id] = variable
+        return variable
 
     def _parse_pages(self, layout: etree.Element) -> List[Dict[str, Any]]:
         """Parse all Page elements"""
@@ -94,24 +292,10 @@ class XMLParser:
 
             # If has ParentId, it's a declaration
             if parent_id:
-                page_data = {
-                    'id': page_id,
-                    'name': self._get_text(page, 'Name'),
-                    'parent_id': parent_id,
-                    'index': self._get_text(page, 'IndexInParent'),
-                    'elements': []
-                }
-                pages.append(page_data)
-                self.pages[page_id] = page_data
+                pages.append(self._parse_page_declaration(page))
             else:
                 # It's a configuration
-                page_configs[page_id] = {
-                    'id': page_id,
-                    'width': float(self._get_text(page, 'Width', '0.21590')),
-                    'height': float(self._get_text(page, 'Height', '0.27940')),
-                    'condition_type': self._get_text(page, 'ConditionType', 'Simple'),
-                    'next_page_id': self._get_text(page, 'NextPageId'),
-                }
+                page_configs[page_id] = self._parse_page_config(page)
 
         # Second pass: merge configurations with declarations
         for page in pages:
@@ -123,6 +307,29 @@ class XMLParser:
 
         return pages
 
+    def _parse_page_declaration(self, page: etree.Element) -> Dict[str, Any]:
+        """Parse a Page declaration (element with ParentId)"""
+        page_id = self._get_text(page, 'Id')
+        page_data = {
+            'id': page_id,
+            'name': self._get_text(page, 'Name'),
+            'parent_id': self._get_text(page, 'ParentId'),
+            'index': self._get_text(page, 'IndexInParent'),
+            'elements': []
+        }
+        self.pages[page_id] = page_data
+        return page_data
+
+    def _parse_page_config(self, page: etree.Element) -> Dict[str, Any]:
+        """Parse a Page configuration (element without ParentId)"""
+        return {
+            'id': self._get_text(page, 'Id'),
+            'width': float(self._get_text(page, 'Width', '0.21590')),
+            'height': float(self._get_text(page, 'Height', '0.27940')),
+            'condition_type': self._get_text(page, 'ConditionType', 'Simple'),
+            'next_page_id': self._get_text(page, 'NextPageId'),
+        }
+
     def _parse_page_elements(self, layout: etree.Element, page_id: str) -> List[Dict[str, Any]]:
         """Parse all elements belonging to a page"""
         elements = []
@@ -161,20 +368,19 @@ class XMLParser:
         # Get configuration
         config = layout.find(f'.//FlowArea[Id="{elem_id}"][Pos]')
 
-        pos = self._parse_position(config.find('Pos') if config is not None else None)
-        size = self._parse_size(config.find('Size') if config is not None else None)
+        flow_area = self._build_element('FlowArea', elem, self._parse_flow_area_config(config))
+        if flow_area['flow_id']:
+            flow_area['flow_content'] = self._parse_flow(layout, flow_area['flow_id'])
 
-        flow_id = self._get_text(config, 'FlowId') if config is not None else None
-        flow_content = self._parse_flow(layout, flow_id) if flow_id else {}
+        return flow_area
 
+    def _parse_flow_area_config(self, config: Optional[etree.Element]) -> Dict[str, Any]:
+        """Parse FlowArea configuration, leaving flow_content to be resolved"""
         return {
-            'type': 'FlowArea',
-            'id': elem_id,
-            'name': self._get_text(elem, 'Name'),
-            'position': pos,
-            'size': size,
-            'flow_id': flow_id,
-            'flow_content': flow_content,
+            'position': self._parse_position(config.find('Pos') if config is not None else None),
+            'size': self._parse_size(config.find('Size') if config is not None else None),
+            'flow_id': self._get_text(config, 'FlowId') if config is not None else None,
+            'flow_content': {},
             'border_style_id': self._get_text(config, 'BorderStyleId') if config is not None else None,
         }
 
@@ -187,6 +393,10 @@ class XMLParser:
         if config is None:
             return {}
 
+        return self._parse_flow_config(config, flow_id)
+
+    def _parse_flow_config(self, config: etree.Element, flow_id: str) -> Dict[str, Any]:
+        """Parse Flow configuration (element with Type)"""
         flow_type = self._get_text(config, 'Type', 'Simple')
 
         flow = {
@@ -264,20 +474,19 @@ class XMLParser:
         elem_id = self._get_text(elem, 'Id')
         config = layout.find(f'.//ImageObject[Id="{elem_id}"][Pos]')
 
-        pos = self._parse_position(config.find('Pos') if config is not None else None)
-        size = self._parse_size(config.find('Size') if config is not None else None)
+        image_object = self._build_element('ImageObject', elem, self._parse_image_object_config(config))
+        if image_object['image_id']:
+            image_object['image'] = self._parse_image(layout, image_object['image_id'])
 
-        image_id = self._get_text(config, 'ImageId') if config is not None else None
-        image = self._parse_image(layout, image_id) if image_id else {}
+        return image_object
 
+    def _parse_image_object_config(self, config: Optional[etree.Element]) -> Dict[str, Any]:
+        """Parse ImageObject configuration, leaving image to be resolved"""
         return {
-            'type': 'ImageObject',
-            'id': elem_id,
-            'name': self._get_text(elem, 'Name'),
-            'position': pos,
-            'size': size,
-            'image_id': image_id,
-            'image': image,
+            'position': self._parse_position(config.find('Pos') if config is not None else None),
+            'size': self._parse_size(config.find('Size') if config is not None else None),
+            'image_id': self._get_text(config, 'ImageId') if config is not None else None,
+            'image': {},
             'transformation': self._parse_transformation(config) if config is not None else None,
         }
 
@@ -290,6 +499,10 @@ class XMLParser:
         if config is None:
             return {}
 
+        return self._parse_image_config(config, image_id)
+
+    def _parse_image_config(self, config: etree.Element, image_id: str) -> Dict[str, Any]:
+        """Parse Image configuration (element with ImageType)"""
         return {
             'id': image_id,
             'type': self._get_text(config, 'ImageType', 'Simple'),
@@ -302,9 +515,10 @@ class XMLParser:
         elem_id = self._get_text(elem, 'Id')
         config = layout.find(f'.//PathObject[Id="{elem_id}"][Pos]')
 
-        pos = self._parse_position(config.find('Pos') if config is not None else None)
-        size = self._parse_size(config.find('Size') if config is not None else None)
+        return self._build_element('PathObject', elem, self._parse_path_object_config(config))
 
+    def _parse_path_object_config(self, config: Optional[etree.Element]) -> Dict[str, Any]:
+        """Parse PathObject configuration"""
         path_data = []
         if config is not None:
             path_elem = config.find('Path')
@@ -312,11 +526,8 @@ class XMLParser:
                 path_data = self._parse_path(path_elem)
 
         return {
-            'type': 'PathObject',
-            'id': elem_id,
-            'name': self._get_text(elem, 'Name'),
-            'position': pos,
-            'size': size,
+            'position': self._parse_position(config.find('Pos') if config is not None else None),
+            'size': self._parse_size(config.find('Size') if config is not None else None),
             'path': path_data,
             'fill_style_id': self._get_text(config, 'FillStyleId') if config is not None else None,
         }
@@ -350,9 +561,10 @@ class XMLParser:
         elem_id = self._get_text(elem, 'Id')
         config = layout.find(f'.//Barcode[Id="{elem_id}"][Pos]')
 
-        pos = self._parse_position(config.find('Pos') if config is not None else None)
-        size = self._parse_size(config.find('Size') if config is not None else None)
+        return self._build_element('Barcode', elem, self._parse_barcode_config(config))
 
+    def _parse_barcode_config(self, config: Optional[etree.Element]) -> Dict[str, Any]:
+        """Parse Barcode configuration"""
         barcode_gen = {}
         if config is not None:
             gen_elem = config.find('BarcodeGenerator')
@@ -366,11 +578,8 @@ class XMLParser:
                 }
 
         return {
-            'type': 'Barcode',
-            'id': elem_id,
-            'name': self._get_text(elem, 'Name'),
-            'position': pos,
-            'size': size,
+            'position': self._parse_position(config.find('Pos') if config is not None else None),
+            'size': self._parse_size(config.find('Size') if config is not None else None),
             'variable_id': self._get_text(config, 'VariableId') if config is not None else None,
             'fill_style_id': self._get_text(config, 'FillStyleId') if config is not None else None,
             'generator': barcode_gen,
@@ -381,9 +590,10 @@ class XMLParser:
         elem_id = self._get_text(elem, 'Id')
         config = layout.find(f'.//Chart[Id="{elem_id}"][Pos]')
 
-        pos = self._parse_position(config.find('Pos') if config is not None else None)
-        size = self._parse_size(config.find('Size') if config is not None else None)
+        return self._build_element('Chart', elem, self._parse_chart_config(config))
 
+    def _parse_chart_config(self, config: Optional[etree.Element]) -> Dict[str, Any]:
+        """Parse Chart configuration"""
         series = []
         if config is not None:
             serie_elem = config.find('Serie')
@@ -395,19 +605,35 @@ class XMLParser:
                     })
 
         return {
-            'type': 'Chart',
-            'id': elem_id,
-            'name': self._get_text(elem, 'Name'),
-            'position': pos,
-            'size': size,
+            'position': self._parse_position(config.find('Pos') if config is not None else None),
+            'size': self._parse_size(config.find('Size') if config is not None else None),
             'chart_type': self._get_text(config, 'Chart_Type', 'Bar') if config is not None else 'Bar',
             'title': self._get_text(config, 'Chart_Title', '') if config is not None else '',
             'series': series,
         }
 
+    def _build_element(self, element_type: str, elem: etree.Element, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Combine an element declaration with its parsed configuration"""
+        return {
+            'type': element_type,
+            'id': self._get_text(elem, 'Id'),
+            'name': self._get_text(elem, 'Name'),
+            **config,
+        }
+
     def _parse_styles(self, layout: etree.Element) -> Dict[str, Any]:
         """Parse all style definitions"""
-        styles = {
+        styles = self._empty_styles()
+
+        for tag in STYLE_TAGS:
+            for style in layout.findall(f'.//{tag}'):
+                self._add_style(styles, style)
+
+        return styles
+
+    def _empty_styles(self) -> Dict[str, Any]:
+        """Create the empty styles structure"""
+        return {
             'fonts': {},
             'colors': {},
             'text_styles': {},
@@ -415,60 +641,55 @@ class XMLParser:
             'border_styles': {},
         }
 
-        # Parse Fonts
-        for font in layout.findall('.//Font'):
-            font_id = font.find('Id').get('Name')
+    def _add_style(self, styles: Dict[str, Any], style: etree.Element):
+        """Parse a Font, Color, TextStyle or ParaStyle element into styles"""
+        tag = style.tag
+
+        if tag == 'Font':
+            font_id = style.find('Id').get('Name')
             styles['fonts'][font_id] = {
                 'id': font_id,
-                'name': self._get_text(font, 'Name'),
-                'font_name': self._get_text(font, 'FontName'),
+                'name': self._get_text(style, 'Name'),
+                'font_name': self._get_text(style, 'FontName'),
                 'sub_fonts': {}
             }
 
-            for sub in font.findall('SubFont'):
+            for sub in style.findall('SubFont'):
                 sub_name = sub.get('Name')
                 styles['fonts'][font_id]['sub_fonts'][sub_name] = {
                     'location': self._get_text(sub, 'FontLocation')
                 }
+            return
+
+        style_id_elem = style.find('Id')
+        if style_id_elem is None or not style_id_elem.get('Name'):
+            return
+        style_id = style_id_elem.get('Name')
+
+        if tag == 'Color':
+            rgb = self._get_text(style, 'RGB', '0,0,0')
+            r, g, b = map(int, rgb.split(','))
+            styles['colors'][style_id] = {'r': r, 'g': g, 'b': b}
+
+        elif tag == 'TextStyle':
+            styles['text_styles'][style_id] = {
+                'id': style_id,
+                'font_size': float(self._get_text(style, 'FontSize', '0.004')),
+                'fill_style_id': self._get_text(style, 'FillStyleId'),
+                'font_id': self._get_text(style, 'FontId'),
+                'sub_font': self._get_text(style, 'SubFont', 'Regular'),
+            }
 
-        # Parse Colors
-        for color in layout.findall('.//Color'):
-            color_id_elem = color.find('Id')
-            if color_id_elem is not None and color_id_elem.get('Name'):
-                color_id = color_id_elem.get('Name')
-                rgb = self._get_text(color, 'RGB', '0,0,0')
-                r, g, b = map(int, rgb.split(','))
-                styles['colors'][color_id] = {'r': r, 'g': g, 'b': b}
-
-        # Parse TextStyles
-        for style in layout.findall('.//TextStyle'):
-            style_id_elem = style.find('Id')
-            if style_id_elem is not None and style_id_elem.get('Name'):
-                style_id = style_id_elem.get('Name')
-                styles['text_styles'][style_id] = {
-                    'id': style_id,
-                    'font_size': float(self._get_text(style, 'FontSize', '0.004')),
-                    'fill_style_id': self._get_text(style, 'FillStyleId'),
-                    'font_id': self._get_text(style, 'FontId'),
-                    'sub_font': self._get_text(style, 'SubFont', 'Regular'),
-                }
-
-        # Parse ParaStyles
-        for style in layout.findall('.//ParaStyle'):
-            style_id_elem = style.find('Id')
-            if style_id_elem is not None and style_id_elem.get('Name'):
-                style_id = style_id_elem.get('Name')
-                styles['para_styles'][style_id] = {
-                    'id': style_id,
-                    'left_indent': float(self._get_text(style, 'LeftIndent', '0')),
-                    'right_indent': float(self._get_text(style, 'RightIndent', '0')),
-                    'space_before': float(self._get_text(style, 'SpaceBefore', '0')),
-                    'space_after': float(self._get_text(style, 'SpaceAfter', '0')),
-                    'line_spacing': float(self._get_text(style, 'LineSpacing', '0')),
-                    'h_align': self._get_text(style, 'HAlign', 'Left'),
-                }
-
-        return styles
+        elif tag == 'ParaStyle':
+            styles['para_styles'][style_id] = {
+                'id': style_id,
+                'left_indent': float(self._get_text(style, 'LeftIndent', '0')),
+                'right_indent': float(self._get_text(style, 'RightIndent', '0')),
+                'space_before': float(self._get_text(style, 'SpaceBefore', '0')),
+                'space_after': float(self._get_text(style, 'SpaceAfter', '0')),
+                'line_spacing': float(self._get_text(style, 'LineSpacing', '0')),
+                'h_align': self._get_text(style, 'HAlign', 'Left'),
+            }
 
     def _parse_position(self, pos_elem: Optional[etree.Element]) -> Dict[str, float]:
         """Parse Position element"""
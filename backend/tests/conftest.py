@@ -0,0 +1,40 @@
+"""
+Test configuration
+
+Settings requires a database URL and a secret key; tests use these
+placeholders, a fresh SQLite database per test where one is needed, and
+fakeredis instead of Redis.
+"""
+
+import os
+
+import fakeredis.aioredis
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+os.environ.setdefault('DATABASE_URL', 'sqlite+aiosqlite:///:memory:')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+
+from app.core.database import Base  # noqa: E402
+from app.core.redis import set_redis  # noqa: E402
+import app.models  # noqa: E402,F401
+
+
+@pytest.fixture
+async def redis():
+    """Shared Redis client replaced by an in-memory fakeredis server"""
+    client = fakeredis.aioredis.FakeRedis()
+    set_redis(client)
+    yield client
+    set_redis(None)
+    await client.aclose()
+
+
+@pytest.fixture
+async def sessions(tmp_path):
+    """Session factory of an empty SQLite database with every table"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+    await engine.dispose()
@@ -0,0 +1,75 @@
+"""
+Per-room batching of cursor moves and changes
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from app.services.realtime.coalescer import RoomCoalescer
+
+
+class SlowServer:
+    """Socket.IO server stand-in whose emits take a while"""
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.emitted = []
+        self.manager = SimpleNamespace(get_participants=lambda namespace, room: [('a', 'a'), ('b', 'b')])
+
+    async def emit(self, event, data, room=None, skip_sid=None):
+        await asyncio.sleep(self.delays.pop(0) if self.delays else 0)
+        self.emitted.append((event, data, room))
+
+
+def seqs(server):
+    return [
+        [entry['change'] for entry in data['changes']]
+        for event, data, _ in server.emitted if event == 'template_changes'
+    ]
+
+
+async def test_one_batch_per_event_and_tick():
+    server = SlowServer()
+    coalescer = RoomCoalescer(server, tick=1)
+
+    for x in range(5):
+        coalescer.add_cursor('t1', 'a', 'user-1', {'x': x})
+    coalescer.add_change('t1', 'a', 'user-1', 1)
+    coalescer.add_change('t1', 'b', 'user-2', 2)
+    await coalescer.flush()
+
+    assert [event for event, _, _ in server.emitted] == ['template_changes', 'cursor_updates']
+    assert server.emitted[1][1] == {'cursors': [{'userId': 'user-1', 'position': {'x': 4}}]}
+    assert server.emitted[1][2] == 't1:json'
+    assert seqs(server) == [[1, 2]]
+
+
+async def test_early_flushes_keep_order():
+    # The tick batch takes longer to send than the early one
+    server = SlowServer(0.05)
+    coalescer = RoomCoalescer(server, tick=1, max_changes=2)
+
+    coalescer.add_change('t1', 'a', 'user-1', 1)
+    tick = asyncio.create_task(coalescer.flush())
+    await asyncio.sleep(0)
+    # A burst while the tick batch is being sent
+    coalescer.add_change('t1', 'a', 'user-1', 2)
+    coalescer.add_change('t1', 'a', 'user-1', 3)
+    await tick
+    await coalescer.stop()
+
+    assert seqs(server) == [[1], [2, 3]]
+    assert coalescer._locks == {}
+
+
+async def test_stop_waits_for_early_flushes():
+    server = SlowServer(0.01)
+    coalescer = RoomCoalescer(server, tick=1, max_changes=2)
+
+    coalescer.add_change('t1', 'a', 'user-1', 1)
+    coalescer.add_change('t1', 'a', 'user-1', 2)
+    # The early flush has taken the batch and is sending it
+    await asyncio.sleep(0)
+    await coalescer.stop()
+
+    assert seqs(server) == [[1, 2]]
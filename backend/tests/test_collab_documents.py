@@ -0,0 +1,131 @@
+"""
+Authoritative room documents shared by workers through Redis
+"""
+
+from uuid import UUID
+
+import pytest
+from sqlalchemy import select
+
+from app.models.template import Template, TemplateType
+from app.models.user import User
+from app.models.version import TemplateVersion
+from app.services.realtime import documents as documents_module
+from app.services.realtime.documents import CollaborativeDocuments
+
+
+def add_element(element_id):
+    return [{'op': 'add', 'path': '/pages/0/elements/-', 'value': {'id': element_id}}]
+
+
+def element_ids(content):
+    return [element['id'] for element in content['pages'][0]['elements']]
+
+
+@pytest.fixture
+async def template_id(sessions, redis, monkeypatch):
+    monkeypatch.setattr(documents_module, 'AsyncSessionLocal', sessions)
+    async with sessions() as db:
+        user = User(email='ana@example.com', name='Ana', hashed_password='x')
+        db.add(user)
+        await db.flush()
+        template = Template(
+            name='Invoice', type=TemplateType.PDF, content={'pages': [{'elements': []}]},
+            owner_id=user.id, variables=[], styles=[], tags=[],
+        )
+        db.add(template)
+        await db.commit()
+        return str(template.id)
+
+
+@pytest.fixture
+def workers(template_id):
+    return CollaborativeDocuments(60, 3600), CollaborativeDocuments(60, 3600)
+
+
+async def test_operations_are_ordered_across_workers(workers, template_id):
+    first, second = workers
+    assert (await first.join_state(template_id))['seq'] == 0
+    await second.join_state(template_id)
+
+    assert await first.apply(template_id, add_element('a'), 'user-1') == 1
+    # The second worker catches up before appending
+    assert await second.apply(template_id, add_element('b'), 'user-2') == 2
+    assert await first.apply(template_id, add_element('c'), 'user-1') == 3
+
+    # Other workers apply entries they missed on their next catch-up
+    await second._catch_up(second._documents[template_id])
+    for worker in workers:
+        assert element_ids(worker._documents[template_id].content) == ['a', 'b', 'c']
+
+    joiner = await CollaborativeDocuments(60, 3600).join_state(template_id)
+    assert joiner['seq'] == 0
+    assert [op['seq'] for op in joiner['ops']] == [1, 2, 3]
+    assert joiner['ops'][1]['userId'] == 'user-2'
+
+
+async def test_invalid_operations(workers, template_id):
+    first, _ = workers
+    with pytest.raises(ValueError):
+        await first.apply(template_id, [{'op': 'remove', 'path': '/missing'}], 'user-1')
+    with pytest.raises(LookupError):
+        await first.join_state('00000000-0000-0000-0000-000000000000')
+    assert await first.current_seq(template_id) == 0
+
+
+async def test_flush_persists_and_compacts(workers, template_id, sessions, redis):
+    first, second = workers
+    await second.join_state(template_id)
+    for element_id in 'ab':
+        await first.apply(template_id, add_element(element_id), 'user-1')
+
+    await first.flush_room(first._documents[template_id])
+
+    async with sessions() as db:
+        template = await db.get(Template, UUID(template_id))
+        versions = (await db.execute(select(TemplateVersion.version))).scalars().all()
+    assert element_ids(template.content) == ['a', 'b']
+    assert template.version == 2
+    assert sorted(versions) == [1, 2]
+    assert await redis.llen(first._key(template_id, 'ops')) == 0
+    assert await redis.get(first._key(template_id, 'flush')) is None
+
+    # Joiners start from the flushed snapshot
+    state = await CollaborativeDocuments(60, 3600).join_state(template_id)
+    assert (state['seq'], state['ops']) == (2, [])
+    assert element_ids(state['content']) == ['a', 'b']
+
+    # A worker behind the compacted log restarts from the snapshot
+    assert await second.apply(template_id, add_element('c'), 'user-2') == 3
+    assert element_ids(second._documents[template_id].content) == ['a', 'b', 'c']
+
+
+async def test_ops_since_reads_the_tail(workers, template_id):
+    first, _ = workers
+    await first.join_state(template_id)
+    for element_id in 'abcde':
+        await first.apply(template_id, add_element(element_id), 'user-1')
+
+    await first._compact(template_id, 3)
+
+    assert [op['seq'] for op in await first._ops_since(template_id, 4)] == [5]
+    assert [op['seq'] for op in await first._ops_since(template_id, 3)] == [4, 5]
+    # Compacted entries are gone; callers restart from the snapshot
+    assert [op['seq'] for op in await first._ops_since(template_id, 1)] == [4, 5]
+    assert await first._ops_since(template_id, 5) == []
+
+
+async def test_flush_lock_of_another_worker_is_kept(workers, template_id, redis):
+    first, _ = workers
+    await first.join_state(template_id)
+    await first.apply(template_id, add_element('a'), 'user-1')
+    lock_key = first._key(template_id, 'flush')
+
+    # Another worker holds the lock: this flush skips the room
+    await redis.set(lock_key, 'other-worker')
+    await first.flush_room(first._documents[template_id])
+    assert await redis.llen(first._key(template_id, 'ops')) == 1
+
+    # A lock that expired and was taken over is not released by its old owner
+    await first._release_lock(lock_key, 'expired-token')
+    assert await redis.get(lock_key) == b'other-worker'
@@ -0,0 +1,43 @@
+"""
+Deterministic PDF output: identical inputs produce identical bytes
+"""
+
+from pathlib import Path
+import hashlib
+
+import pytest
+
+from app.services.rendering.pdf_renderer import PDFRenderer
+from app.services.xml.xml_parser import XMLParser
+
+INVOICE = Path(__file__).resolve().parents[2] / 'examples' / 'pdf-templates' / 'invoice.xml'
+
+DATA = {'customer_name': 'Ada Lovelace', 'invoice_number': 'F-0042'}
+
+
+@pytest.fixture(scope='module')
+def template():
+    content = XMLParser().parse(INVOICE.read_text(encoding='utf-8'))
+    content['pages'][0]['elements'].append({
+        'type': 'Barcode',
+        'id': 'qr',
+        'position': {'x': 0.01, 'y': 0.01},
+        'size': {'width': 0.03, 'height': 0.03},
+        'generator': {'type': 'QR'},
+    })
+    return content
+
+
+def render(template, **options) -> bytes:
+    return PDFRenderer().render_compiled(template, DATA, options)
+
+
+def test_same_inputs_same_sha256(template):
+    first = render(template, deterministic=True)
+    second = render(template, deterministic=True)
+
+    assert hashlib.sha256(first).hexdigest() == hashlib.sha256(second).hexdigest()
+
+
+def test_non_deterministic_output_differs(template):
+    assert render(template, deterministic=False) != render(template, deterministic=False)
@@ -0,0 +1,124 @@
+"""
+Rooms shared by several workers through Redis: presence and event fan-out
+"""
+
+import asyncio
+
+import fakeredis
+import pytest
+import socketio
+from socketio import async_redis_manager
+
+from app.services.realtime.coalescer import RoomCoalescer
+from app.services.realtime.presence import RoomPresence
+from app.services.realtime.wire import encoding_room
+
+
+@pytest.fixture
+async def workers(redis):
+    first, second = RoomPresence(ttl=30), RoomPresence(ttl=30)
+    first.start()
+    second.start()
+    # Let both heartbeats run once
+    await asyncio.sleep(0)
+    yield first, second
+    await first.stop()
+    await second.stop()
+
+
+async def test_presence_spans_workers(workers):
+    first, second = workers
+
+    await first.join('t1', 'sid-a', 'user-1', 'Ana')
+    await second.join('t1', 'sid-b', 'user-2', 'Luis')
+    await second.join('t1', 'sid-c', 'user-1', 'Ana')
+
+    for worker in workers:
+        users = await worker.members('t1')
+        assert sorted(u['userId'] for u in users) == ['user-1', 'user-2']
+        assert await worker.count('t1') == 3
+
+    await second.leave('t1', 'sid-b')
+    assert [u['userId'] for u in await first.members('t1')] == ['user-1']
+
+
+async def test_members_of_dead_worker_are_pruned(workers):
+    first, second = workers
+
+    await first.join('t1', 'sid-a', 'user-1', 'Ana')
+    await second.join('t1', 'sid-b', 'user-2', 'Luis')
+
+    # Like a crashed worker, its heartbeat is gone but its members remain
+    await second.stop()
+
+    assert [u['userId'] for u in await first.members('t1')] == ['user-1']
+    assert await first.count('t1') == 1
+
+
+@pytest.fixture
+def message_queue(monkeypatch):
+    """AsyncRedisManager clients connect to one in-memory Redis"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        async_redis_manager.aioredis.Redis,
+        'from_url',
+        lambda url, **options: fakeredis.aioredis.FakeRedis(server=server),
+    )
+    return server
+
+
+class Worker:
+    """One Socket.IO server process with its own connections"""
+
+    def __init__(self):
+        self.sio = socketio.AsyncServer(async_mode='asgi', client_manager=socketio.AsyncRedisManager('redis://'))
+        self.sio.manager.initialize()
+        self.sio.manager_initialized = True
+        self.received = []
+
+        async def send(eio_sid, pkt):
+            self.received.append((eio_sid, pkt.data))
+
+        self.sio._send_eio_packet = send
+
+    async def connect(self, eio_sid, room):
+        sid = await self.sio.manager.connect(eio_sid, '/')
+        await self.sio.enter_room(sid, room)
+        return sid
+
+    async def close(self):
+        self.sio.manager.thread.cancel()
+
+
+async def until(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, 'timed out waiting for fan-out'
+        await asyncio.sleep(0.01)
+
+
+async def test_batches_reach_clients_on_every_worker(message_queue):
+    first, second = Worker(), Worker()
+    room = encoding_room('t1', 'json')
+    sender = await first.connect('eio-a', room)
+    await second.connect('eio-b', room)
+    await second.connect('eio-c', 'other:json')
+    # Let both listeners subscribe to the channel
+    await asyncio.sleep(0.1)
+
+    coalescer = RoomCoalescer(first.sio, tick=1)
+    coalescer.add_change('t1', sender, 'user-1', {'op': 'replace', 'path': '/name', 'value': 'x'})
+    coalescer.add_cursor('t1', sender, 'user-1', {'x': 1, 'y': 2})
+    await coalescer.flush()
+
+    await until(lambda: len(second.received) == 2)
+    assert [eio_sid for eio_sid, _ in second.received] == ['eio-b', 'eio-b']
+    assert 'template_changes' in second.received[0][1]
+    assert 'cursor_updates' in second.received[1][1]
+    # The sender is skipped on its own worker
+    await asyncio.sleep(0.1)
+    assert first.received == []
+
+    await first.close()
+    await second.close()
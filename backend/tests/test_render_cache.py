@@ -0,0 +1,59 @@
+"""
+RenderCache size limit and recency on a shared directory
+"""
+
+from app.services.cache import render_cache as render_cache_module
+from app.services.cache.render_cache import RenderCache, render_key
+
+
+def test_key_is_canonical():
+    assert render_key('pdf', 't', {'a': 1, 'b': 2}, {}) == render_key('pdf', 't', {'b': 2, 'a': 1}, {})
+    assert render_key('pdf', 't', {}, {}) != render_key('email', 't', {}, {})
+
+
+def test_get_set_touch(tmp_path):
+    cache = RenderCache(str(tmp_path), max_bytes=1024)
+
+    assert cache.get('ab' * 32) is None
+    assert not cache.touch('ab' * 32)
+
+    cache.set('ab' * 32, b'pdf')
+
+    assert cache.get('ab' * 32) == b'pdf'
+    assert cache.touch('ab' * 32)
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(str(tmp_path), max_bytes=10)
+    cache.set('a' * 64, b'1234')
+    cache.set('b' * 64, b'1234')
+    cache.get('a' * 64)
+
+    cache.set('c' * 64, b'1234')
+
+    assert cache.get('b' * 64) is None
+    assert cache.get('a' * 64) == b'1234'
+    assert cache.size == 8
+
+
+def test_limit_covers_files_of_other_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(render_cache_module, 'RESCAN_INTERVAL', 0)
+    worker_a = RenderCache(str(tmp_path), max_bytes=10)
+    worker_b = RenderCache(str(tmp_path), max_bytes=10)
+
+    worker_a.set('a' * 64, b'1234')
+    worker_a.set('b' * 64, b'1234')
+    worker_b.set('c' * 64, b'1234')
+
+    stored = sum(1 for path in tmp_path.rglob('*') if path.is_file() and not path.name.startswith('.'))
+    assert stored == 2
+    assert worker_b.get('a' * 64) is None
+
+
+def test_disabled(tmp_path):
+    cache = RenderCache(str(tmp_path), max_bytes=1024, enabled=False)
+    cache.set('ab' * 32, b'pdf')
+
+    assert cache.get('ab' * 32) is None
+    assert not any(tmp_path.iterdir())
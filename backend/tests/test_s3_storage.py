@@ -0,0 +1,165 @@
+"""
+S3Storage against a mocked S3: multipart uploads, read-through cache, delete_prefix
+"""
+
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from app.services.storage.backends import FileCache, S3Storage
+
+BUCKET = 'test-assets'
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def make_storage(tmp_path, name='cache', max_bytes=64 * MB):
+    return S3Storage(
+        BUCKET,
+        FileCache(str(tmp_path / name), max_bytes),
+        region='us-east-1',
+        # S3 parts other than the last one are at least 5 MB
+        multipart_threshold=5 * MB,
+        multipart_chunksize=5 * MB,
+        max_concurrency=4,
+    )
+
+
+def staged_file(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_put_file_seeds_the_cache(s3, tmp_path):
+    storage = make_storage(tmp_path)
+    path = staged_file(tmp_path, 'upload', b'png bytes')
+
+    storage.put_file('ab/cd/blob', path, 'image/png')
+
+    stored = s3.get_object(Bucket=BUCKET, Key='ab/cd/blob')
+    assert stored['Body'].read() == b'png bytes'
+    assert stored['ContentType'] == 'image/png'
+    # The staged file became the cached copy
+    assert not os.path.exists(path)
+    with open(storage.local_path('ab/cd/blob'), 'rb') as f:
+        assert f.read() == b'png bytes'
+    assert storage.cache.hits == 1
+
+
+def test_large_files_use_multipart(s3, tmp_path):
+    storage = make_storage(tmp_path)
+    data = os.urandom(11 * MB)
+
+    storage.put_file('ab/cd/large', staged_file(tmp_path, 'upload', data), 'image/png')
+
+    stored = s3.head_object(Bucket=BUCKET, Key='ab/cd/large')
+    assert stored['ETag'].strip('"').endswith('-3')
+    assert stored['ContentLength'] == len(data)
+
+
+def test_read_through_cache(s3, tmp_path):
+    s3.put_object(Bucket=BUCKET, Key='ab/cd/remote', Body=b'remote bytes')
+    storage = make_storage(tmp_path)
+
+    first = storage.local_path('ab/cd/remote')
+    second = storage.local_path('ab/cd/remote')
+
+    assert first == second
+    with open(first, 'rb') as f:
+        assert f.read() == b'remote bytes'
+    assert (storage.cache.hits, storage.cache.misses) == (1, 1)
+
+
+def test_missing_key(s3, tmp_path):
+    storage = make_storage(tmp_path)
+
+    with pytest.raises(FileNotFoundError):
+        storage.local_path('ab/cd/missing')
+    assert len(storage.cache) == 0
+
+
+def test_cache_is_bounded(s3, tmp_path):
+    for name in ('one', 'two', 'three'):
+        s3.put_object(Bucket=BUCKET, Key=name, Body=b'x' * 400)
+    storage = make_storage(tmp_path, max_bytes=1000)
+
+    for name in ('one', 'two', 'three'):
+        storage.local_path(name)
+
+    assert len(storage.cache) == 2
+    assert storage.cache.size == 800
+    # Evicted files are fetched again
+    storage.local_path('one')
+    assert storage.cache.misses == 4
+
+
+def test_delete(s3, tmp_path):
+    storage = make_storage(tmp_path)
+    storage.put_file('ab/cd/blob', staged_file(tmp_path, 'upload', b'data'), 'image/png')
+    cached = storage.local_path('ab/cd/blob')
+
+    storage.delete('ab/cd/blob')
+
+    assert s3.list_objects_v2(Bucket=BUCKET)['KeyCount'] == 0
+    assert not os.path.exists(cached)
+
+
+def test_delete_prefix(s3, tmp_path):
+    prefix = 'derived/ab/cd/hash'
+    # More keys than one delete_objects call accepts
+    for i in range(1001):
+        s3.put_object(Bucket=BUCKET, Key=f"{prefix}/thumbnail-{i}x{i}.png", Body=b'v')
+    s3.put_object(Bucket=BUCKET, Key='derived/ab/cd/other/thumbnail-1x1.png', Body=b'v')
+    storage = make_storage(tmp_path)
+    assert len(storage.list(prefix)) == 1001
+    cached = storage.local_path(f"{prefix}/thumbnail-0x0.png")
+
+    storage.delete_prefix(prefix)
+
+    remaining = [item['Key'] for item in s3.list_objects_v2(Bucket=BUCKET)['Contents']]
+    assert remaining == ['derived/ab/cd/other/thumbnail-1x1.png']
+    assert storage.list(prefix) == []
+    assert not os.path.exists(cached)
+
+
+def test_listings_are_cached(s3, tmp_path, monkeypatch):
+    storage = make_storage(tmp_path)
+    storage.empty_listing_ttl = 60
+    requests = []
+    iter_objects = storage._iter_objects
+    monkeypatch.setattr(storage, '_iter_objects', lambda prefix: requests.append(prefix) or iter_objects(prefix))
+    prefix = 'derived/ab/cd/hash'
+
+    assert storage.list(prefix) == []
+    assert storage.list(prefix) == []
+    assert len(requests) == 1
+
+    # Writing under the prefix drops the empty listing
+    storage.put_file(f"{prefix}/thumbnail-1x1.png", staged_file(tmp_path, 'upload', b'v'), 'image/png')
+    assert storage.list(prefix) == ['thumbnail-1x1.png']
+    assert storage.list(prefix) == ['thumbnail-1x1.png']
+    assert len(requests) == 2
+
+
+def test_empty_listings_expire(s3, tmp_path):
+    storage = make_storage(tmp_path)
+    storage.empty_listing_ttl = 0
+    prefix = 'derived/ab/cd/hash'
+
+    assert storage.list(prefix) == []
+    # Variants written by another worker show up once the empty listing expires
+    s3.put_object(Bucket=BUCKET, Key=f"{prefix}/thumbnail-1x1.png", Body=b'v')
+    assert storage.list(prefix) == ['thumbnail-1x1.png']
@@ -0,0 +1,125 @@
+"""
+TemplateCache against an in-memory Redis
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+import uuid
+
+import fakeredis.aioredis
+import pytest
+
+from app.core.redis import set_redis
+from app.services.cache.template_cache import ROW_FIELDS, TemplateCache
+
+
+def make_template(template_id=None, version=1, **fields):
+    values = {field: None for field in ROW_FIELDS}
+    values.update(
+        id=template_id or uuid.uuid4(),
+        name='Invoice',
+        content={'pages': []},
+        owner_id=uuid.uuid4(),
+        version=version,
+        created_at=datetime(2024, 1, 1),
+        updated_at=datetime(2024, 1, 1),
+    )
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+@pytest.fixture
+def cache(redis):
+    return TemplateCache(ttl=60)
+
+
+async def test_read_through(cache):
+    template = make_template()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return template
+
+    assert await cache.get_row_or_load(template.id, load) is template
+    row = await cache.get_row_or_load(template.id, load)
+
+    assert len(loads) == 1
+    assert row['id'] == str(template.id)
+    assert row['content'] == {'pages': []}
+    assert row['version'] == 1
+    assert cache.stats()['hits'] == 1
+
+
+async def test_missing_template_is_not_cached(cache):
+    async def load():
+        return None
+
+    assert await cache.get_row_or_load(uuid.uuid4(), load) is None
+    assert cache.stats()['misses'] == 1
+
+
+async def test_write_drops_row(cache):
+    template = make_template()
+    await cache.set_row(template)
+
+    await cache.invalidate(template.id, 2)
+
+    assert await cache.get_row(template.id) is None
+
+
+async def test_reader_racing_a_write_does_not_cache_old_row(cache):
+    old = make_template(version=1)
+
+    async def load():
+        # The writer commits version 2 and invalidates while the reader
+        # still holds version 1
+        await cache.invalidate(old.id, 2)
+        return old
+
+    assert await cache.get_row_or_load(old.id, load) is old
+    assert await cache.get_row(old.id) is None
+
+    # The current version is cached normally
+    assert await cache.set_row(make_template(old.id, version=2))
+    assert (await cache.get_row(old.id))['version'] == 2
+
+
+async def test_delete_drops_compiled_and_blocks_rows(cache):
+    template = make_template()
+    await cache.set_row(template)
+    await cache.set_compiled(template.id, 1, 'xml', b'<xml/>')
+
+    await cache.invalidate(template.id, compiled=True)
+
+    assert await cache.get_row(template.id) is None
+    assert await cache.get_compiled(template.id, 1, 'xml') is None
+    assert not await cache.set_row(template)
+
+
+async def test_compiled_is_keyed_by_version(cache):
+    template_id = uuid.uuid4()
+    await cache.set_compiled(template_id, 1, 'xml', b'v1')
+    await cache.invalidate(template_id, 2)
+
+    assert await cache.get_compiled(template_id, 1, 'xml') == b'v1'
+    assert await cache.get_compiled(template_id, 2, 'xml') is None
+
+
+async def test_redis_errors_are_misses():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    set_redis(fakeredis.aioredis.FakeRedis(server=server))
+    cache = TemplateCache(ttl=60)
+    template = make_template()
+
+    async def load():
+        return template
+
+    try:
+        assert await cache.get_row_or_load(template.id, load) is template
+        await cache.invalidate(template.id, 2)
+    finally:
+        set_redis(None)
+
+    assert cache.stats()['errors'] == 3
@@ -0,0 +1,104 @@
+"""
+Template history: snapshots, delta chains, materialization and restore
+"""
+
+import pytest
+
+from app.models.template import Template, TemplateType
+from app.models.user import User
+from app.services.versioning.version_store import VersionStore, field_attribute, snapshot_document
+
+INTERVAL = 3
+
+
+def document(title, elements=20):
+    return {'title': title, 'pages': [{'elements': [{'id': f"e{i}", 'x': i} for i in range(elements)]}]}
+
+
+@pytest.fixture
+async def db(sessions):
+    async with sessions() as session:
+        yield session
+
+
+@pytest.fixture
+async def template(db):
+    user = User(email='ana@example.com', name='Ana', hashed_password='x')
+    db.add(user)
+    await db.flush()
+    template = Template(
+        name='Invoice', type=TemplateType.PDF, content=document('v1'), owner_id=user.id,
+        variables=[], styles=[], tags=['finance'], meta={'locale': 'es'},
+    )
+    db.add(template)
+    await db.flush()
+    await VersionStore(db, INTERVAL).record(template, snapshot_document(template), user.id)
+    await db.commit()
+    return template
+
+
+async def change(db, template, **fields):
+    """Apply field changes as a new version, as the API does"""
+    previous = snapshot_document(template)
+    for field, value in fields.items():
+        setattr(template, field_attribute(field), value)
+    template.version += 1
+    await VersionStore(db, INTERVAL).record(template, previous, template.owner_id)
+    await db.commit()
+    return snapshot_document(template)
+
+
+async def versions(db, template):
+    return {v.version: v for v in await VersionStore(db).list_versions(template.id)}
+
+
+async def test_snapshot_includes_metadata(template):
+    snapshot = snapshot_document(template)
+
+    assert snapshot['metadata'] == {'locale': 'es'}
+    assert snapshot['content'] == document('v1')
+
+
+async def test_deltas_between_snapshots(db, template):
+    documents = {1: snapshot_document(template)}
+    for version in range(2, 8):
+        documents[version] = await change(
+            db, template, content=document(f"v{version}"), metadata={'locale': 'es', 'rev': version},
+        )
+
+    history = await versions(db, template)
+    assert [v for v in sorted(history) if history[v].is_snapshot] == [1, 4, 7]
+    assert history[5].delta is not None and history[5].base_version == 4
+
+    store = VersionStore(db, INTERVAL)
+    for version, expected in documents.items():
+        assert await store.materialize(template.id, version) == expected
+
+
+async def test_large_change_falls_back_to_snapshot(db, template):
+    await change(db, template, content=document('v2'))
+    await change(db, template, content={'rewritten': ['x' * 40] * 20})
+
+    history = await versions(db, template)
+    assert not history[2].is_snapshot
+    assert history[3].is_snapshot and history[3].base_version == 3
+
+
+async def test_restore(db, template):
+    original = snapshot_document(template)
+    for version in range(2, 6):
+        await change(db, template, name=f"Invoice {version}", metadata={'rev': version}, tags=[])
+
+    store = VersionStore(db, INTERVAL)
+    restored = await store.materialize(template.id, 1)
+    await change(db, template, **restored)
+
+    assert template.version == 6
+    assert template.name == 'Invoice'
+    assert template.meta == {'locale': 'es'}
+    assert await store.materialize(template.id, 6) == original
+
+
+async def test_unknown_version(db, template):
+    with pytest.raises(ValueError):
+        await VersionStore(db).materialize(template.id, 9)
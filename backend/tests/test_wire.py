@@ -0,0 +1,120 @@
+"""
+MessagePack wire format of collaboration batches
+"""
+
+import msgpack
+import pytest
+
+from app.services.realtime.wire import OPCODES, REF_EXT, WIRE_VERSION, WireCodec
+
+
+def unpack(codec, payload):
+    """Decode a packed batch back into its JSON shape, as a client does"""
+    version, strings, body = msgpack.unpackb(payload, raw=False)
+    assert version == WIRE_VERSION
+
+    def value(item):
+        if isinstance(item, msgpack.ExtType):
+            assert item.code == REF_EXT
+            return strings[msgpack.unpackb(item.data)]
+        if isinstance(item, dict):
+            return {k: value(v) for k, v in item.items()}
+        if isinstance(item, list):
+            return [value(v) for v in item]
+        return item
+
+    return strings, body, value
+
+
+def decode_cursors(codec, payload):
+    strings, body, value = unpack(codec, payload)
+    cursors = []
+    for user, x, y, *extra in body:
+        if x is None:
+            position = extra[0]
+        else:
+            position = {**codec.dequantize([x, y]), **(value(extra[0]) if extra else {})}
+        cursors.append({'userId': strings[user], 'position': position})
+    return {'cursors': cursors}
+
+
+def decode_changes(codec, payload):
+    strings, body, value = unpack(codec, payload)
+    changes = []
+    for user, seq, packed_ops in body:
+        ops = []
+        for opcode, path, *rest in packed_ops:
+            op = {'op': OPCODES[opcode], 'path': strings[path]}
+            if op['op'] in ('move', 'copy'):
+                op['from'] = strings[rest[0]]
+            elif op['op'] != 'remove':
+                op['value'] = value(rest[0])
+            ops.append(op)
+        changes.append({'change': {'seq': seq, 'ops': ops}, 'userId': strings[user]})
+    return {'changes': changes}
+
+
+@pytest.fixture
+def codec():
+    return WireCodec(precision=0.1)
+
+
+def test_cursor_updates_round_trip(codec):
+    batch = {'cursors': [
+        {'userId': 'user-1', 'position': {'x': 120.4, 'y': 33.0}},
+        {'userId': 'user-2', 'position': {'x': 0.0, 'y': 841.9, 'elementId': 'title'}},
+        {'userId': 'user-3', 'position': 'outside'},
+    ]}
+
+    assert decode_cursors(codec, codec.encode('cursor_updates', batch)) == batch
+
+
+def test_cursor_positions_are_quantized(codec):
+    batch = {'cursors': [{'userId': 'user-1', 'position': {'x': 10.04, 'y': 10.06}}]}
+
+    decoded = decode_cursors(codec, codec.encode('cursor_updates', batch))
+
+    assert decoded['cursors'][0]['position'] == {'x': 10.0, 'y': 10.1}
+
+
+def test_template_changes_round_trip(codec):
+    element = {'id': 'e1', 'type': 'Text', 'text': 'e1', 'style': {'elementId': 'e2', 'size': 12}, 'selectedIds': ['e1', 'e3']}
+    batch = {'changes': [
+        {'userId': 'user-1', 'change': {'seq': 7, 'ops': [
+            {'op': 'add', 'path': '/pages/0/elements/-', 'value': element},
+            {'op': 'replace', 'path': '/pages/0/elements/0/x', 'value': 12.5},
+        ]}},
+        {'userId': 'user-2', 'change': {'seq': 8, 'ops': [
+            {'op': 'move', 'from': '/pages/0/elements/0', 'path': '/pages/0/elements/1'},
+            {'op': 'copy', 'from': '/pages/0/elements/1', 'path': '/pages/0/elements/-'},
+            {'op': 'test', 'path': '/pages/0/elements/0/x', 'value': 12.5},
+            {'op': 'remove', 'path': '/pages/0/elements/0/x'},
+        ]}},
+    ]}
+
+    payload = codec.encode('template_changes', batch)
+
+    assert decode_changes(codec, payload) == batch
+    # Repeated ids and pointers are sent once; plain text values are not interned
+    strings = msgpack.unpackb(payload, raw=False)[1]
+    assert strings.count('e1') == 1
+    assert 'user-1' in strings and 'Text' not in strings
+
+
+def test_other_events_are_not_packed(codec):
+    with pytest.raises(ValueError):
+        codec.encode('user_joined', {'userId': 'user-1'})
+
+
+def test_incoming_payloads(codec):
+    packed = msgpack.packb({'templateId': 't1', 'position': [104, 33]})
+
+    data = codec.decode(packed)
+
+    assert codec.dequantize(data['position']) == {'x': 10.4, 'y': 3.3}
+    with pytest.raises(ValueError):
+        codec.decode(msgpack.packb([1, 2]))
+    with pytest.raises(ValueError):
+        codec.decode(b'\xc1')
+    with pytest.raises(ValueError):
+        WireCodec(precision=0.1, enabled=False).decode(packed)
@@ -0,0 +1,48 @@
+"""
+XMLGenerator round-trip: parse -> generate -> parse keeps the structure
+"""
+
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from app.services.xml.xml_generator import XMLGenerator
+from app.services.xml.xml_parser import XMLParser
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+SAMPLES = [
+    REPO_ROOT / 'Scheme_Simplified.xml',
+    REPO_ROOT / 'examples' / 'pdf-templates' / 'invoice.xml',
+]
+
+
+@pytest.fixture(params=SAMPLES, ids=lambda path: path.name)
+def parsed(request):
+    return XMLParser().parse(request.param.read_text(encoding='utf-8'))
+
+
+@pytest.mark.parametrize('pretty_print', [True, False])
+def test_roundtrip(parsed, pretty_print):
+    xml = XMLGenerator().generate(parsed, pretty_print=pretty_print)
+
+    assert XMLParser().parse(xml) == parsed
+
+
+def test_roundtrip_stream_parser(parsed):
+    buffer = BytesIO()
+    XMLGenerator().write(parsed, buffer)
+    buffer.seek(0)
+
+    assert XMLParser().parse_stream(buffer) == parsed
+
+
+def test_output_modes_match(parsed):
+    xml = XMLGenerator().generate(parsed).encode('utf-8')
+
+    buffer = BytesIO()
+    XMLGenerator().write(parsed, buffer)
+
+    assert buffer.getvalue() == xml
+    assert b''.join(XMLGenerator().iter_chunks(parsed)) == xml